@@ -2,7 +2,10 @@
 
 
 
-from api._API import _API
+"""
+API is created at the first access(PEP 562), so "import api" or "from api.state import BenchState" does not start any
+device, "from api import API" initializes all modules once
+"""
 
 
 __all__ = [
@@ -10,11 +13,16 @@ __all__ = [
 ]
 
 
-class API(
-    _API,
-):
-    def __init__(self):
-        super().__init__()
+def __getattr__(name):
+    if name != "API":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from api._api import _API
 
+    class API(
+        _API,
+    ):
+        def __init__(self):
+            super().__init__()
 
-API = API()
+    globals()["API"] = API()
+    return globals()["API"]
@@ -2,12 +2,14 @@
 
 
 from api.base import Base
+from api.state import BenchState
+from common.metrics import metrics, timed
 try:
     from common import logger
 except (ImportError, ):
     import logging as logger
 import os
-import re
+import contextlib
 import time
 import allure
 import numpy
@@ -18,12 +20,15 @@ import cv2 as cv
 class _API(Base):
     def __init__(self):
         super().__init__()
+        self._vc_pending = {}
+        self._vc_batch = 0
         self._update_vehicle_config()
 
     def _update_vehicle_config(self):
         logger.info(f"update vehicle config based on CAN project")
         vcs = self.can.vehicle_config_values(*self.vc.names)
         self.vc.update(*vcs)
+        self.state.update_vehicle_config(*vcs)
 
     def reset_measurement(self):
         reset = self.config.reset_measurement
@@ -38,19 +43,90 @@ class _API(Base):
         logger.info(f"attach file to allure report: {_mig}")
         allure.attach.file(_mig, name, allure.attachment_type.PNG)
 
+    def finish_test(self):
+        """
+        called at teardown of every test case, wait for evidences(photos of image comparison and OCR) saved in
+        background and attach them to allure report together with metrics of the test case
+        """
+        with metrics.timer("evidence.flush"):
+            self.evidence.flush()
+        metrics.attach()
+        metrics.start_test()
+
+    @timed("api.set_vehicle_config")
     def set_vehicle_config(self, *pairs):
-        logger.info(f"check vehicle config and set")
-        pairs = [(name, int(value, 2) if isinstance(value, str) else value) for name, value in pairs]
-        update_pairs = self.vc.exists(*pairs)
-        if update_pairs:
-            success = self.can.vehicle_config(self.check_cluster, *update_pairs)
-            if success:
-                self.vc.update(*success)
+        """
+        set vehicle config, written at once if not in a batch(see self.vehicle_config_batch), else written when the
+        batch ends
+        @param:
+            pairs: (name, value) pairs, value is a binary string or int
+        """
+        self.stage_vehicle_config(*pairs)
+        if not self._vc_batch:
+            self.commit_vehicle_config()
+
+    def stage_vehicle_config(self, *pairs):
+        """
+        collect vehicle config to be written by self.commit_vehicle_config, a later value of the same name wins
+        """
+        for name, value in pairs:
+            self._vc_pending[name] = int(value, 2) if isinstance(value, str) else value
+
+    def commit_vehicle_config(self):
+        """
+        write all staged vehicle config in one diagnostic session, the cluster is restarted and checked only once.
+        nothing is written if the config after writing would be the same as the config written last time
+        @return:
+            bool: True if vehicle config was written
+        """
+        pending, self._vc_pending = self._vc_pending, {}
+        if not pending:
+            return False
+        logger.info(f"check vehicle config and set: {pending}")
+        target = dict(self.state.vehicle_config, **pending)
+        if self.state.vehicle_config and BenchState.fingerprint(target) == BenchState.fingerprint(self.state.vehicle_config):
+            logger.info(f"vehicle config is already the same, fingerprint: {BenchState.fingerprint(target)}")
+            return False
+        update_pairs = self.vc.exists(*pending.items())
+        if not update_pairs:
+            self.state.update_vehicle_config(*pending.items())
+            return False
+        success = self.can.vehicle_config(self.check_cluster, *update_pairs)
+        if success:
+            self.vc.update(*success)
+            self.state.update_vehicle_config(*success)
+            logger.info(f"{len(success)} vehicle config written, fingerprint: {BenchState.fingerprint(self.state.vehicle_config)}")
+        return bool(success)
+
+    @contextlib.contextmanager
+    def vehicle_config_batch(self):
+        """
+        collect all vehicle config set in this context and write them once when leaving it, nothing is written if an
+        exception is raised in it. batches can be nested, only the outermost one writes
+        how to use:
+            with API.vehicle_config_batch():
+                API.set_vehicle_config(("ENGINE_CONTROL_UNIT", "00001"))
+                API.set_vehicle_config(("DRIVER_SIDE", "1"))
+        """
+        self._vc_batch += 1
+        try:
+            yield self
+        except BaseException:
+            if self._vc_batch == 1:
+                self._vc_pending.clear()
+            raise
+        else:
+            if self._vc_batch == 1:
+                self.commit_vehicle_config()
+        finally:
+            self._vc_batch -= 1
 
+    @timed("api.button")
     def button(self, action: str, key_: str):
         logger.info(f"press button(SWC): {action} {key_}")
         self.can.swc(key_, action)
 
+    @timed("can.send")
     def send(self, msgId: (str, int), sigName: str, sigData: str):
         """
         send signal or CtlFlag
@@ -66,20 +142,28 @@ class _API(Base):
             result = self.can.send(**self.get_message(msgId=msgId, sigName=sigName, sigData=sigData))
             if result == 0:
                 self.dbc.store_current_signal_value(msgId, sigName, sigData)
+                self.state.signal(msgId, sigName, sigData)
+            if sigName.lower() == "syspowermod":
+                # KL15 changed by a signal directly, read it again next time
+                self.state.invalidate("kl15", "display")
 
+    @timed("can.reset_signals")
     def reset_signals(self):
         """
         reset signal values
         """
+        # only signals changed by self.send are returned, signals still in default value are not sent again
         signals = self.dbc.get_default_signal_values()
         if signals:
-            logger.info(f"reset signal values to initial value")
+            logger.info(f"reset {len(signals)} signal values to initial value")
             for sig in signals:
                 try:
                     self.can.send(**self.get_message(msgId=sig["msgId"], sigName=sig["sigName"], sigData=sig["sigData"]))
+                    self.state.signal(sig["msgId"], sig["sigName"], sig["sigData"], default=True)
                 except (RuntimeError, ) as e:
                     logger.error(f"can not reset signal: <{sig}> because of some errors: {e}")
 
+    @timed("can.get")
     def get(self, msgId: (str, int), sigName: str):
         """
         get signal value
@@ -89,53 +173,101 @@ class _API(Base):
         """
         return self.can.get(**self.get_message(msgId=msgId, sigName=sigName))
 
+    @timed("api.battery")
     def battery(self, status: str, check: bool = True):
         """
-        perform battery on or off
+        perform battery on or off, nothing is done if battery is known to be in this status already(see api.state)
         @param:
             status: 'on': battery on
                     'off': battery off
             check: True for detect display on, False for no detecting
         """
         logger.info(f"current threading status = <{threading.enumerate()}>")
-        sta = self.ps.get_status()
-        if not sta:
-            logger.error(f"no programmable power supply connected")
-            return
+        if self.state.fresh("power"):
+            output_on = self.state.power
+        else:
+            sta = self.ps.get_status()
+            if not sta:
+                logger.error(f"no programmable power supply connected")
+                self.state.invalidate("power")
+                return
+            output_on = bool(sta['output on'])
+            self.state.set("power", output_on)
         logger.info(f"set battery: {status}")
         if status.lower() == "on":
-            if not sta['output on']:
+            if not output_on:
                 self.ps.power_on()
+                self.state.set("power", True)
+                # cluster and ECUs are restarted, KL15 and display must be read again
+                self.state.invalidate("kl15", "display")
                 if check:
                     self.check_cluster(status="start")
             else:
                 logger.info(f"battery has already on")
         else:
-            if sta['output on']:
+            if output_on:
                 self.ps.power_off()
+                self.state.set("power", False)
+                self.state.set("display", False)
+                self.state.invalidate("kl15")
             else:
                 logger.info(f"battery has already off")
 
+    @timed("api.set_voltage")
+    def set_voltage(self, voltage: float):
+        """
+        set voltage of power supply, nothing is done if voltage is known to be the same
+        @param:
+            voltage: voltage(V)
+        """
+        voltage = float(voltage)
+        if self.state.fresh("voltage") and self.state.voltage == voltage:
+            logger.info(f"voltage has already been {voltage}V")
+            return
+        logger.info(f"set voltage: {voltage}V")
+        self.ps.set_voltage(voltage)
+        self.state.set("voltage", voltage)
+        # display may be off because of under voltage or over voltage
+        self.state.invalidate("display")
+
+    def _kl15_status(self):
+        """
+        @return:
+            str: "on", "off" or raw value of SysPowerMod, from state if it's fresh else from CAN
+        """
+        if self.state.fresh("kl15"):
+            return self.state.kl15
+        current_status = int(self.can.get(**self.get_message(msgId="0x295", sigName="SysPowerMod")))
+        status = {2: "on", 0: "off"}.get(current_status, str(current_status))
+        self.state.set("kl15", status)
+        return status
+
     # modify by jianglianye 2020-05-19
+    @timed("api.reset_battery")
     def reset_battery(self, voltage: float = 13.5):
         """
-        reset voltage to normal and check display status
+        reset voltage to normal and check display status, nothing is done if the bench is known to be in this state
         """
+        diff = self.state.diff(power=True, voltage=float(voltage), kl15="on", display=True)
+        if not diff:
+            logger.info(f"battery, voltage, kl15 and display are already in default state, reset skipped")
+            return
+        logger.info(f"reset battery, differences from default state: {diff}")
         # set BAT on,voltage
         # get PowerMod status,if KL15 on, check screen is light;else set KL15 on,then check screen is light
         self.battery('on', check=False)
         time.sleep(1)
-        self.ps.set_voltage(voltage)
+        self.set_voltage(voltage)
         # start measurement of CANOE/CANAlyzer if it's off
         self.can.app.start_Measurement()
         # Two cycles to check Power Mod status
         for i in range(2):
             try:
-                current_status = int(self.can.get(**self.get_message(msgId="0x295", sigName="SysPowerMod")))
+                current_status = self._kl15_status()
             except RuntimeError as e:
                 logger.error(f"Power Mod value is not get,check it status,{e}")
                 continue
-            if current_status != 2:
+            if current_status != "on":
                 self.kl15(status='on', check=False)
             try:
                 self.check_cluster(status='start')
@@ -150,29 +282,35 @@ class _API(Base):
                 self.check_cluster(status='restart')
                 return
 
+    @timed("api.kl15")
     def kl15(self, status: str, check: bool = True):
         """
-        perform KL15 on or off
+        perform KL15 on or off, nothing is done if KL15 is known to be in this status already(see api.state)
         @param:
             status: 'on': KL15 on
                     'off': KL15 off
         """
         logger.info(f"set kl15: {status}")
-        current_status = int(self.can.get(**self.get_message(msgId="0x295", sigName="SysPowerMod")))
+        current_status = self._kl15_status()
         if status.lower() == "on":
-            if current_status == 2:
+            if current_status == "on":
                 logger.info(f"kl15 is already on")
             else:
                 self.can.send(**self.get_message(msgId="0x295", sigName="SysPowerMod", sigData="2"))
+                self.state.set("kl15", "on")
+                self.state.invalidate("display")
                 if check:
                     self.check_cluster(status="start")
                 time.sleep(3)  # sleep 3 seconds to skip self-checking
         else:
-            if current_status == 0:
+            if current_status == "off":
                 logger.info(f"kl15 is already off")
             else:
                 self.can.send(**self.get_message(msgId="0x295", sigName="SysPowerMod", sigData="0"))
+                self.state.set("kl15", "off")
+                self.state.set("display", False)
 
+    @timed("api.image_compare")
     def image_compare(
             self,
             templateImgName,
@@ -194,9 +332,7 @@ class _API(Base):
             iconExists(optional): check the icon exists if True, else check the icon not exists
         """
         # find template image and location
-        template_image = self.utils.template_image(templateImgName, searchList=[self.config.template, self.config.resource])
-        location = re.match(r".*?\((\d+),\s*?(\d+),\s*?(\d+),\s*?(\d+)\)", os.path.split(template_image)[1]).groups()
-        location = [int(x) for x in location]
+        template_image, location = self.utils.template_location(templateImgName, searchList=[self.config.template, self.config.resource])
         logger.info(f"template image found: path={template_image}, location={location}")
         template_image = cv.imdecode(numpy.fromfile(template_image, dtype=numpy.uint8), cv.IMREAD_COLOR)
         camera_type = str(self.config.camera).lower().strip()
@@ -211,32 +347,36 @@ class _API(Base):
             if time.time() - start_t < timeout:
                 target_image = self.cam.frame
                 if camera_type == "lvds":
-                    similarity, nlocation = self.img.compare2(
-                        target_image,
-                        template_image,
-                        location=location,
-                        threshold=100,
-                        gray=gray,
-                        mark=0,
-                        **kwargs
-                    )
+                    with metrics.timer("image.match"):
+                        similarity, nlocation = self.img.compare2(
+                            target_image,
+                            template_image,
+                            location=location,
+                            threshold=100,
+                            gray=gray,
+                            mark=0,
+                            **kwargs
+                        )
                 else:
-                    target_image = self.img.resize_display(target_image, self.config.display, self.find_display())
-                    similarity, label, nlocation = self.img.predict(target_image, template_image, location, factor=4, exists=iconExists)
-                logger.info(f"similarity is: {similarity} and location is: {nlocation} and label is: {label}")
+                    target_image = self.rectify_display(target_image)
+                    with metrics.timer("image.match"):
+                        similarity, label, nlocation = self.img.predict(target_image, template_image, location, factor=4, exists=iconExists)
+                logger.debug("similarity is: {} and location is: {} and label is: {}", similarity, nlocation, label)
                 if similarity * 100 >= threshold:
-                    logger.info(f"image detected, comparison passed")
+                    logger.info(f"image detected, comparison passed, similarity is: {similarity} and location is: "
+                                f"{nlocation} and label is: {label}")
                     break
             else:
-                logger.error(f"TimeoutError: image: <{templateImgName}> not detected within <{timeout}s>")
+                logger.error(f"TimeoutError: image: <{templateImgName}> not detected within <{timeout}s>, last similarity "
+                             f"is: {similarity} and location is: {nlocation} and label is: {label}")
                 break
 
-        if nlocation:
-            target_image = cv.rectangle(target_image, (nlocation[0] - 3, nlocation[1] - 3), (nlocation[2] + 3, nlocation[3] + 3), [0, 255, 255], 1)
-        fn = self.img.save(target_image, os.path.join(self.config.output, "camera", "photo"))
-        self.attachment(fn, template_image, fn)
+        # saved and attached in background, see self.finish_test
+        self.evidence.submit(target_image, template_image, folder=os.path.join(self.config.output, "camera", "photo"),
+                             location=nlocation, name=templateImgName)
         return similarity, nlocation, label
 
+    @timed("api.ocr_compare")
     def ocr_compare(
             self,
             templateImgName,
@@ -252,9 +392,7 @@ class _API(Base):
             ocrExpect: directly return result if text appear else waiting until timeout
         """
         # find template image and location
-        template_image = self.utils.template_image(templateImgName, searchList=[self.config.template, self.config.resource])
-        location = re.match(r".*?\((\d+),\s*?(\d+),\s*?(\d+),\s*?(\d+)\)", os.path.split(template_image)[1]).groups()
-        location = [int(x) for x in location]
+        template_image, location = self.utils.template_location(templateImgName, searchList=[self.config.template, self.config.resource])
         logger.info(f"template image found: path={template_image}, location={location}")
         camera_type = str(self.config.camera).lower().strip()
 
@@ -269,27 +407,29 @@ class _API(Base):
                 if camera_type == "lvds":
                     target_image_ocr = self.img.cut(target_image, *location)
                     result = self.image_to_string(target_image_ocr)
-                    logger.info(f"result of OCR: {result}")
+                    logger.debug("result of OCR: {}", result)
                     if result.strip() == ocrExpect.strip():
-                        logger.debug(f"characters in image: '{templateImgName}' found, comparison passed")
+                        logger.info(f"characters in image: '{templateImgName}' found, comparison passed, result of OCR: {result}")
                         break
                 else:
-                    target_image = self.img.resize_display(target_image, self.config.display, self.find_display())
-                    locs = self.img.object_detect(target_image, location, factor=4)
+                    target_image = self.rectify_display(target_image)
+                    with metrics.timer("image.object_detect"):
+                        locs = self.img.object_detect(target_image, location, factor=4)
                     for x1, y1, x2, y2 in locs:
                         result = self.image_to_string(target_image[y1:y2, x1:x2])
-                        logger.info(f"result of OCR: {result}")
+                        logger.debug("result of OCR: {}", result)
                         if result.strip() == ocrExpect.strip():
-                            logger.debug(f"characters in image: '{templateImgName}' found, comparison passed")
+                            logger.info(f"characters in image: '{templateImgName}' found, comparison passed, result of OCR: {result}")
                             nlocation = [x1, y1, x2, y2]
                             break
             else:
-                logger.error(f"TimeoutError: characters in image: <{templateImgName}> not detected within <{timeout}s>")
+                logger.error(f"TimeoutError: characters in image: <{templateImgName}> not detected within <{timeout}s>, "
+                             f"last result of OCR: {result}")
                 break
 
-        target_image = cv.rectangle(target_image, (nlocation[0] - 3, nlocation[1] - 3), (nlocation[2] + 3, nlocation[3] + 3), [0, 255, 255], 1)
-        fn = self.img.save(target_image, os.path.join(self.config.output, "camera", "photo"))
-        self.attachment(fn, template_image, fn)
+        # saved and attached in background, see self.finish_test
+        self.evidence.submit(target_image, template_image, folder=os.path.join(self.config.output, "camera", "photo"),
+                             location=nlocation, name=templateImgName)
         return result, nlocation
 
 
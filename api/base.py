@@ -13,6 +13,12 @@ from common import PowerSupply
 from common import Config
 from common import DLT
 from common import DBC
+from common import Calibration
+from api.state import BenchState
+from api.evidence import Evidence
+from common.metrics import metrics, timed
+from concurrent.futures import ThreadPoolExecutor
+import atexit
 import time
 import numpy
 import os
@@ -34,51 +40,132 @@ class Base:
             self.__class__.__first_initialize = False
             logger.info(f"initialize all modules: <camera, dbc, can, image, ocr, dlt, ...>")
             self.config = Config()
-            self.cam = Camera(
-                outputPath=os.path.join(self.config.output, "camera"),
-                resolution=self.config.display
-            )
-            self.dbc = DBC(
-                file=self.config.dbc,
-                searchList=[self.config.config]
-            )
-            self.can = CANOE(
+            self.state = BenchState(ttl=self.config.state_ttl if self.config.state_ttl is not None else 60)
+            start_t = time.perf_counter()
+            # every module is started on its own thread and resolved at the first access(see self.__getattr__), so
+            # starting takes as long as the slowest module instead of the sum of all modules
+            self._futures = {}
+            pool = ThreadPoolExecutor(max_workers=len(self._modules()), thread_name_prefix="initialize")
+            for name, factory in self._modules().items():
+                self._futures[name] = pool.submit(self._start, name, factory)
+            pool.shutdown(wait=False)
+            # COM objects can only be used on the thread which created them, CANoe is created here while other
+            # modules are starting
+            self.can = self._start("can", lambda: CANOE(
                 driver=self.config.driver,
                 channel=self.config.canoe_channel,
                 cfgFileOe=self.config.cfg_canoe,
                 cfgFileLyzer=self.config.cfg_canalyzer
-            )
-            self.vc = VehicleConfig(
+            ))
+            logger.info(f"can started, other modules are starting in background, time used: "
+                        f"<{round(time.perf_counter() - start_t, 3)}>")
+            # summary of the run is written when test process exits
+            atexit.register(metrics.export, self.config.metrics)
+        else:
+            logger.warning(f"all modules have been initialized once")
+
+    def _modules(self):
+        """
+        @return:
+            dict: {attribute name: function creating module}, modules created in background
+        """
+        return {
+            "cam": lambda: Camera(
+                outputPath=os.path.join(self.config.output, "camera"),
+                camera_id=self.config.camera_id if self.config.camera_id is not None else 0,
+                resolution=self.config.display
+            ),
+            "dbc": lambda: DBC(
+                file=self.config.dbc,
+                searchList=[self.config.config]
+            ),
+            "vc": lambda: VehicleConfig(
                 file="vehicle_config.json",
                 searchList=[self.config.config, self.config.root],
                 vehicleConfigSourceFile=self.config.vehicle_config,
                 vehicleConfigDest=os.path.join(self.config.config, "vehicle_config")
-            )
-
-            self.img = Image(
+            ),
+            "img": lambda: Image(
                 train_data_path=os.path.join(self.config.resource, "train"),
                 model_path=self.config.config
-            )
-            self.ps = PowerSupply(
+            ),
+            "evidence": lambda: Evidence(
+                self.img,
+                workers=self.config.evidence_workers if self.config.evidence_workers else 2,
+                fmt=self.config.evidence_format if self.config.evidence_format else "png",
+                level=self.config.evidence_level if self.config.evidence_level is not None else 3
+            ),
+            "calibration": lambda: Calibration(
+                file=self._rig_file(self.config.calibration if self.config.calibration else os.path.join(self.config.config, "calibration.json")),
+                resolution=self.config.display
+            ),
+            "ps": lambda: PowerSupply(
                 type_=self.config.power,
                 port=self.config.power_port
-            )
-
-            self.utils = Utils()
-            self.ocr = Ocr(
+            ),
+            "utils": lambda: Utils(templateIndex=self.config.template_index),
+            "ocr": lambda: Ocr(
                 tmpFolder=os.path.join(self.config.output, "tmp"),
-                baiduOcrAccountSearchList=[self.config.config]
-            )
-            self.image_to_string = self.ocr.image_to_string
-
-            self.dlt = DLT(
+                baiduOcrAccountSearchList=[self.config.config],
+                cacheSize=self.config.ocr_cache
+            ),
+            "dlt": lambda: DLT(
                 path=self.config.output,
                 host=self.config.host,
                 port=self.config.port
-            )
-        else:
-            logger.warning(f"all modules have been initialized once")
+            ),
+        }
 
+    def _rig_file(self, file: str):
+        """
+        files written by a rig(e.g. calibration of its camera) must not be shared by other rigs
+        @return:
+            str: name of rig appended to the file name, e.g. calibration_rig1.json, or file itself if no rig is set
+        """
+        if not self.config.rig:
+            return file
+        root, ext = os.path.splitext(file)
+        return f"{root}_{self.config.rig}{ext}"
+
+    @staticmethod
+    def _start(name: str, factory):
+        start_t = time.perf_counter()
+        try:
+            module = factory()
+        except Exception as e:
+            logger.error(f"{name} could not be started: {e}")
+            raise
+        metrics.record(f"startup.{name}", time.perf_counter() - start_t)
+        logger.info(f"{name} started, time used: <{round(time.perf_counter() - start_t, 3)}>")
+        return module
+
+    def __getattr__(self, item):
+        # only called if attribute not found, wait for a module starting in background
+        futures = self.__dict__.get("_futures")
+        if futures and item in futures:
+            module = futures[item].result()
+            setattr(self, item, module)
+            return module
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{item}'")
+
+    def ready(self, timeout: (int, float) = None):
+        """
+        wait until all modules started, an exception of starting is raised here
+        @param:
+            timeout: seconds to wait, None for waiting forever
+        """
+        start_t = time.perf_counter()
+        for future in self._futures.values():
+            future.result(timeout=timeout)
+        logger.info(f"all modules started, time waited: <{round(time.perf_counter() - start_t, 3)}>")
+
+    def image_to_string(self, image, lang=None, **kwargs):
+        """
+        see common.OCR.Ocr.image_to_string
+        """
+        return self.ocr.image_to_string(image, lang, **kwargs)
+
+    @timed("api.check_cluster")
     def check_cluster(self, status: str = "start"):
         """
         check if cluster has started/restarted successfully or not
@@ -144,6 +231,7 @@ class Base:
                     #     logger.debug(f"var={var}")
                     if len([x for x in var if x < 1]) / len(var) >= 0.9:
                         logger.info(f"display should started, time used: <{round(time.time() - start_time, 3)}>")
+                        self.state.set("display", True)
                         return True
                     frame_buffer.pop(0)
                 else:
@@ -158,6 +246,7 @@ class Base:
                     start_time = time.time()
             time.sleep(0.1)
         logger.error(f"checking display status timeout")
+        self.state.invalidate("display")
         raise TimeoutError(f"checking display status timeout")
 
     def get_message(
@@ -213,12 +302,14 @@ class Base:
         return items
 
     def close(self):
+        self.evidence.close()
         self.can.close()
         self.cam.close()
         self.ps.disconnect()
         self.dlt.dlt.quit()
 
     @staticmethod
+    @timed("api.wait")
     def wait(t: int):
         """
         wait 't' ms
@@ -231,17 +322,29 @@ class Base:
     def find_display(self, refresh: bool = False):
         """
         find coordinates of top-left corner and bottom-right corner of display from camera vision
+        the corners of display are saved as a calibration file, detection is skipped if camera and resolutions have not
+        been changed since last calibration
         @param:
             refresh: force refresh the coordinates
         @return:
             tuple: for integers as a tuple
         """
-        if self.__class__.Coordinate is None:
-            refresh = True
-        if not refresh:
+        if not refresh and self.__class__.Coordinate is not None:
             logger.debug(f"coordinates for display have been found and saved: {self.__class__.Coordinate}")
             return self.__class__.Coordinate
 
+        frame = self.cam.frame
+        # camera type and resolutions are the same for cameras of several rigs, the device and rig tell them apart
+        fingerprint = self.calibration.make_fingerprint(
+            camera=self.config.camera,
+            frameShape=frame.shape,
+            camera_id=self.config.camera_id if self.config.camera_id is not None else 0,
+            rig=self.config.rig
+        )
+        if not refresh and self.calibration.load(fingerprint):
+            self.__class__.Coordinate = self.calibration.box
+            return self.__class__.Coordinate
+
         brightness = self.config.CAP_PROP_BRIGHTNESS
         contrast = self.config.CAP_PROP_CONTRAST
         gain = self.config.CAP_PROP_GAIN
@@ -256,7 +359,8 @@ class Base:
             "CAP_PROP_SHARPNESS": sharpness[0]
         })
         time.sleep(1)
-        sx, sy, ex, ey = self.img.detect_display(self.cam.frame, self.config.display)
+        frame = self.cam.frame
+        quad = self.img.detect_display_quad(frame, self.config.display)
         self.cam.write_settings({
             "CAP_PROP_BRIGHTNESS": brightness[1],
             "CAP_PROP_CONTRAST": contrast[1],
@@ -265,6 +369,25 @@ class Base:
             "CAP_PROP_SHARPNESS": sharpness[1]
         })
         time.sleep(1)
-        self.__class__.Coordinate = (sx, sy, ex, ey)
+        if quad is None:
+            # display not found, use full frame and do not save it, so display will be detected again next time
+            height, width = frame.shape[:2]
+            self.calibration.compute([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], fingerprint)
+        else:
+            self.calibration.compute(quad, fingerprint)
+            self.calibration.save()
+        self.__class__.Coordinate = self.calibration.box
 
-        return sx, sy, ex, ey
+        return self.__class__.Coordinate
+
+    def rectify_display(self, imageMat):
+        """
+        warp a camera frame to a front view of display with resolution of display, camera tilt is corrected
+        @param:
+            imageMat: matrix object of camera frame
+        @return:
+            matrix object of display
+        """
+        if not self.calibration.valid:
+            self.find_display()
+        return self.calibration.rectify(imageMat)
@@ -0,0 +1,170 @@
+#! /usr/bin/env python
+
+
+
+"""
+evidence of image comparison and OCR(camera photo, merged with template image) saved and attached to allure report
+without blocking test thread
+
+drawing, merging, encoding and writing files are done by a small pool of worker threads, the test thread only copies
+the frame. at most "queueSize" evidences are waiting, a test thread submitting more is blocked until one is done, so
+memory does not grow if disk is slow. encoded bytes are attached to allure report from memory by flush(), which is
+called on test thread at teardown of every test case(API.finish_test), so attachments always belong to the right test.
+
+how to use:
+    evidence = Evidence(Image(), workers=2, fmt="jpg", quality=90)
+    evidence.submit(frame, templateImage, folder="D:/xxx/test/camera/photo", location=[10, 10, 50, 50])
+    ...
+    evidence.flush()  # wait and attach all evidences of current test case
+"""
+
+try:
+    from common.logger.logger import logger
+except (ImportError, ModuleNotFoundError) as e:
+    import logging as logger
+try:
+    import allure
+except (ImportError, ModuleNotFoundError) as e:
+    allure = None
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import cv2 as cv
+import numpy
+import time
+import os
+
+
+__all__ = [
+    "Evidence",
+]
+
+
+class Evidence:
+    def __init__(
+            self,
+            img,
+            workers: int = 2,
+            queueSize: int = 16,
+            fmt: str = "png",
+            level: int = 3,
+            quality: int = 90
+    ):
+        """
+        class init
+        @param:
+            img: Image object, for saving and merging images
+            workers: number of worker threads
+            queueSize: max number of evidences waiting for workers
+            fmt: format of attachment, "png" or "jpg", photos saved to disk are always .png
+            level: compression level of png, 0-9, lower is faster and larger
+            quality: quality of jpg, 0-100
+        """
+        self.img = img
+        self.fmt = "jpg" if str(fmt).lower() in ("jpg", "jpeg") else "png"
+        if self.fmt == "jpg":
+            self._params = [int(cv.IMWRITE_JPEG_QUALITY), int(quality)]
+        else:
+            self._params = [int(cv.IMWRITE_PNG_COMPRESSION), int(level)]
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="evidence")
+        self._slots = threading.BoundedSemaphore(max(1, int(queueSize)))
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def submit(self, image, template=None, folder: str = None, location: (list, tuple) = None, name: str = "Image"):
+        """
+        save and attach evidence in background, blocked only if too many evidences are waiting
+        @param:
+            image: matrix object of camera frame, it's copied, so caller may change it afterwards
+            template(optional): matrix object or absolute path of template image, merged to the right side of image
+            folder(optional): folder for saving a .png photo of image(with location marked), not saved if None
+            location(optional): [x1, y1, x2, y2] marked by a rectangle
+            name: name of attachment if photo is not saved, else name of photo file
+        @return:
+            Future: result is (path of photo, encoded bytes of attachment)
+        """
+        if not isinstance(image, numpy.ndarray):
+            logger.error(f"no image for evidence: {name}")
+            return None
+        self._slots.acquire()
+        try:
+            future = self._pool.submit(self._work, image.copy(), template, folder, location, name)
+        except RuntimeError:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda x: self._slots.release())
+        with self._lock:
+            self._pending.append((future, name))
+        return future
+
+    def _work(self, image, template, folder, location, name):
+        if location:
+            cv.rectangle(image, (location[0] - 3, location[1] - 3), (location[2] + 3, location[3] + 3), [0, 255, 255], 1)
+        photo = self.img.save(image, folder) if folder else None
+        merged = self.img.merge(image, template) if template is not None else image
+        if merged is None:
+            merged = image
+        success, buffer = cv.imencode(f".{self.fmt}", merged, self._params)
+        if not success:
+            raise RuntimeError(f"evidence could not be encoded: {name}")
+        return photo, buffer.tobytes()
+
+    def flush(self, timeout: (int, float) = 30):
+        """
+        wait for all submitted evidences and attach them to allure report in order of submitting, call it on test thread
+        @param:
+            timeout: seconds to wait for all evidences
+        @return:
+            list: paths of photos saved
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return []
+        start_t = time.time()
+        photos = []
+        for future, name in pending:
+            try:
+                photo, body = future.result(timeout=max(0.0, timeout - (time.time() - start_t)))
+            except Exception as e:
+                logger.error(f"evidence <{name}> could not be saved: {e}")
+                continue
+            if photo:
+                photos.append(photo)
+            if allure is not None:
+                attachment_type = allure.attachment_type.JPG if self.fmt == "jpg" else allure.attachment_type.PNG
+                allure.attach(body, photo if photo else name, attachment_type)
+        logger.info(f"{len(photos)} evidences saved and {len(pending)} attached in {time.time() - start_t:.3f}s")
+        return photos
+
+    def close(self):
+        self.flush()
+        self._pool.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    class _Img:
+        @staticmethod
+        def save(image, path):
+            fn = os.path.join(path, f"image-{time.time_ns()}.png")
+            cv.imencode(".png", image)[1].tofile(fn)
+            return fn
+
+        @staticmethod
+        def merge(image, template):
+            return numpy.hstack((image, cv.resize(template, (image.shape[1], image.shape[0]))))
+
+    frame = numpy.random.randint(0, 255, (720, 1920, 3), numpy.uint8)
+    folder = tempfile.mkdtemp()
+    t1 = time.time()
+    for _ in range(10):
+        _Img.save(_Img.merge(frame, frame[:100, :100]), folder)
+    print(f"synchronous: {(time.time() - t1) * 100:.1f} ms per evidence on test thread")
+    evidence = Evidence(_Img(), fmt="jpg")
+    t1 = time.time()
+    for _ in range(10):
+        evidence.submit(frame, frame[:100, :100], folder=folder, location=[10, 10, 50, 50])
+    print(f"asynchronous: {(time.time() - t1) * 100:.1f} ms per evidence on test thread")
+    print(f"{len(evidence.flush())} photos saved")
+    evidence.close()
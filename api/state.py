@@ -0,0 +1,139 @@
+#! /usr/bin/env python
+
+
+
+"""
+state of test bench: power output, voltage, KL15, display, vehicle config and signals not in default value
+
+every action of API updates the state, so an action which does not change anything(e.g. "BAT ON" when battery is
+already on) is skipped without reading power supply or CAN. a value is trusted for "ttl" seconds after it has been
+set or read from device, after that the device is read again, so changes made outside of API are found out soon.
+
+how to use:
+    state = BenchState(ttl=60)
+    state.set("power", True)
+    state.fresh("power")  # True within 60s
+    state.diff(power=True, kl15="on")  # {"kl15": (None, "on")}, kl15 is unknown
+"""
+
+import threading
+import hashlib
+import json
+import time
+
+
+__all__ = [
+    "BenchState",
+]
+
+
+class BenchState:
+
+    FIELDS = ("power", "voltage", "kl15", "display")
+
+    def __init__(self, ttl: (int, float) = 60):
+        """
+        class init
+        @param:
+            ttl: seconds a value is trusted without reading device again, 0 for always reading device
+        """
+        self.ttl = ttl
+        self._values = {}
+        self._lock = threading.Lock()
+        self.vehicle_config = {}
+        self.signals = {}
+
+    def __getattr__(self, item):
+        if item in self.FIELDS:
+            value = self.__dict__["_values"].get(item)
+            return value[0] if value else None
+        raise AttributeError(item)
+
+    def set(self, field: str, value):
+        """
+        set a value which has just been set to or read from device
+        @param:
+            field: one of self.FIELDS
+            value: power: bool, voltage: float, kl15: "on"/"off"/raw value of SysPowerMod, display: bool
+        """
+        if field not in self.FIELDS:
+            raise KeyError(f"unknown field of bench state: {field}, available fields: {self.FIELDS}")
+        with self._lock:
+            self._values[field] = (value, time.monotonic())
+
+    def fresh(self, *fields):
+        """
+        @return:
+            bool: True if all fields are known and not older than ttl
+        """
+        now = time.monotonic()
+        with self._lock:
+            return all(x in self._values and now - self._values[x][1] <= self.ttl for x in fields)
+
+    def invalidate(self, *fields):
+        """
+        forget values, device will be read next time, all fields(including vehicle config and signals) if no field given
+        """
+        with self._lock:
+            if not fields:
+                self._values.clear()
+                self.vehicle_config.clear()
+                self.signals.clear()
+            for field in fields:
+                self._values.pop(field, None)
+
+    def diff(self, **expected):
+        """
+        compare expected values with current state
+        @param:
+            expected: field=value
+        @return:
+            dict: {field: (current value, expected value)} for fields which are different or not fresh
+        """
+        return {
+            k: (getattr(self, k), v) for k, v in expected.items()
+            if not self.fresh(k) or getattr(self, k) != v
+        }
+
+    def signal(self, msgId: (int, str), sigName: str, sigData, default: bool = False):
+        """
+        record a signal sent
+        @param:
+            default: True if sigData is the default value of signal, then it's removed from state
+        """
+        with self._lock:
+            if default:
+                self.signals.pop((str(msgId), sigName), None)
+            else:
+                self.signals[(str(msgId), sigName)] = sigData
+
+    def update_vehicle_config(self, *pairs):
+        """
+        record vehicle config written to cluster
+        @param:
+            pairs: (name, value) pairs
+        """
+        with self._lock:
+            self.vehicle_config.update({name: value for name, value in pairs})
+
+    @staticmethod
+    def fingerprint(config: dict):
+        """
+        @param:
+            config: {name: value} of vehicle config
+        @return:
+            str: fingerprint of vehicle config, the same for the same names and values in any order
+        """
+        content = json.dumps(sorted((str(k), str(v)) for k, v in config.items()), ensure_ascii=False)
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()[:16]
+
+    def snapshot(self):
+        """
+        @return:
+            dict: all values of state, for logging
+        """
+        with self._lock:
+            result = {k: v[0] for k, v in self._values.items()}
+            result["vehicle_config"] = dict(self.vehicle_config)
+            result["signals"] = {f"{k[0]}:{k[1]}": v for k, v in self.signals.items()}
+        return result
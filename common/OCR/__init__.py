@@ -15,12 +15,19 @@ example:
 
 	from common import image_to_string
 	res2 = image_to_string(r"D:/xxx/xxx/xxx.png")
+
+results for images(matrix objects) are cached, an image with the same shape and the same pixels(except noise of camera)
+gets the cached result, so the same text is only recognized once while the screen is not changed, hits and misses could
+be checked by ocr.cache.stats()
 """
 
 from common.OCR.tesseractOcr.tesseractOcr import TesseractOcr
 from common.OCR.baiduOcr.baiduOcr import BaiduOcr
 from common.OCR.language import Lang as Language
 from common.OCR.language import BaiDuLang as BaiduLanguage
+from common.OCR.cache import OcrCache
+from common.metrics import metrics, timed
+import numpy
 try:
 	from common.logger.logger import logger
 except (ImportError, ModuleNotFoundError) as e:
@@ -30,6 +37,7 @@ except (ImportError, ModuleNotFoundError) as e:
 __all__ = [
 	"Ocr",
 	"Language",
+	"OcrCache",
 ]
 
 
@@ -51,29 +59,53 @@ class Ocr:
 	def __init__(
 			self,
 			tmpFolder: str = None,
-			baiduOcrAccountSearchList: (list, tuple) = None
+			baiduOcrAccountSearchList: (list, tuple) = None,
+			cacheSize: int = 256
 	):
 		"""
 		class init
 		@param:
 			tmpFolder: tmp folder used for storing tmp image
 			baiduOcrAccountSearchList: a list of dirs used for searching config file(.json) for baidu OCR accounts
+			cacheSize: max number of results cached, 0 for disabling cache
 		"""
 		logger.info(f"initialize OCR")
 		self._insTesseractOcr = TesseractOcr(tmpFolder=tmpFolder)
 		self._insBaiduOcr = BaiduOcr(tmpFolder=tmpFolder, searchList=baiduOcrAccountSearchList)
+		self.cache = OcrCache(maxsize=cacheSize if cacheSize is not None else 256)
 
 	def image_to_string(self, image, lang: (str, Language) = None, **kwargs):
 		"""
 		recognize a image and output string, using Baidu OCR cloud engine and TesseractOcr local engine
+		results of matrix objects are cached, see OcrCache
 		@param:
 			image: absolute path of input image with characters for recognition or matrix object loaded by opencv
 			lang(optional): languages used for recognition, default is Chinese and English, for available languages please
 				check module doc above
+			cache(optional): False for skipping cache, default to True
 		@return:
 			str, result of recognition
 			None, can not recognize because of some error
 		"""
+		if not kwargs.pop("cache", True) or self.cache.maxsize <= 0 or not isinstance(image, numpy.ndarray) or image.size == 0:
+			return self._image_to_string(image, lang, **kwargs)
+		key = self.cache.key(
+			image, lang.value if isinstance(lang, Language) else lang, kwargs.get("psm"), kwargs.get("oem")
+		)
+		result = self.cache.get(key)
+		if result is not None:
+			logger.debug(f"OCR result found in cache: {result}")
+			metrics.count("ocr.cache_hit")
+			return result
+		result = self._image_to_string(image, lang, **kwargs)
+		self.cache.put(key, result)
+		return result
+
+	@timed("ocr.image_to_string")
+	def _image_to_string(self, image, lang: (str, Language) = None, **kwargs):
+		"""
+		recognize a image without cache, see self.image_to_string
+		"""
 		if lang is None:
 			lang = Language.Chinese
 			logger.info(f"OCR language has been set: {lang.value}")
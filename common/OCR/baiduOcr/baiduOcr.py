@@ -32,12 +32,19 @@ support languages:
 support file extension:
 	jpg/jpeg/png/bmp
 
+concurrency:
+	one requests.Session with a pool of connections is shared by all recognitions, concurrent requests are limited by
+	a semaphore(baidu limits QPS of each account), a batch of images could be recognized at once:
+	BaiduOcr().image_to_strings([image1, image2, image3])
+	access token is kept in memory and refreshed by a background thread before it expires, so recognitions never wait
+	for a token except the first one.
+	base url of baidu could be changed for testing with a local stub server, see __main__ below
+
 recognition times:
 	9000 per day for personal authentication(currently in use, but we can register many accounts to enlarge the number, please write new account to account.json)
 	49000 per day for company authentication
 """
 
-import json
 try:
 	from common.logger.logger import logger
 except (ImportError, ModuleNotFoundError) as e:
@@ -45,66 +52,184 @@ except (ImportError, ModuleNotFoundError) as e:
 from common.OCR.ocr import Ocr
 from common.OCR.language import BaiDuLang as Language
 # from common.config.config import Config
-import os
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+import threading
 import requests
 import base64
+import numpy
+import json
 import time
+import os
 import cv2 as cv
 
 
 current_path = os.path.split(os.path.abspath(__file__))[0]
-request_url = "https://aip.baidubce.com/rest/2.0/ocr/v1/general_basic"
-request_url_acc = "https://aip.baidubce.com/rest/2.0/ocr/v1/accurate_basic"
+base_url = "https://aip.baidubce.com"
+token_path = "/oauth/2.0/token"
+request_path = "/rest/2.0/ocr/v1/general_basic"
+request_path_acc = "/rest/2.0/ocr/v1/accurate_basic"
+request_url = base_url + request_path
+request_url_acc = base_url + request_path_acc
+
+# error codes of baidu OCR: token invalid or expired, and QPS limit reached
+TOKEN_ERRORS = (110, 111)
+QPS_ERRORS = (18, )
+# min seconds between two checks of background refresher, a failed refresh is tried again after this time
+REFRESH_INTERVAL = 60.0
 
 
 class BaiduOcr(Ocr):
-	def __init__(self, tmpFolder: str = None, searchList: (list, tuple) = None):
+	def __init__(
+			self,
+			tmpFolder: str = None,
+			searchList: (list, tuple) = None,
+			baseUrl: str = None,
+			timeout: (int, float) = 5,
+			concurrency: int = 4,
+			retries: int = 3,
+			refreshBefore: (int, float) = 24 * 3600
+	):
 		"""
 		class init
 		@param:
-			tmpFolder: tmp folder used for storing tmp image
+			tmpFolder: not used any more, images are encoded in memory, kept for compatibility
 			searchList: a list of dirs used for searching config file(.json) for baidu OCR accounts
+			baseUrl: base url of baidu OCR, e.g. "http://127.0.0.1:8000" for a local stub server
+			timeout: timeout(s) of each http request
+			concurrency: max number of requests at the same time, also size of connection pool
+			retries: max number of tries for each recognition if connection failed or QPS limit reached
+			refreshBefore: access token is refreshed in background this time(s) before it expires
 		"""
-		self.__tmpFolder = tmpFolder if tmpFolder else os.path.join(os.path.split(os.path.abspath(__file__))[0], "tmp")
+		self.__tmpFolder = tmpFolder
 		self.jsonPath = os.path.join(current_path, "baidu_ocr_accounts.json")
 		if not os.path.exists(self.jsonPath):
 			self.jsonPath = self.find_ocr_config(searchList=searchList)
 		self.account = None
+		self.baseUrl = (baseUrl or base_url).rstrip("/")
+		self.timeout = timeout
+		self.concurrency = max(1, concurrency)
+		self.retries = max(1, retries)
+		self.refreshBefore = refreshBefore
+
+		self.session = requests.Session()
+		adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+		self.session.mount("http://", adapter)
+		self.session.mount("https://", adapter)
+		self._limiter = threading.BoundedSemaphore(self.concurrency)
+		self._executor = None
+		self._token = None
+		self._tokenExpires = 0
+		# _tokenLock only guards reading and swapping the token, _refreshLock serializes requests for a new token, so
+		# recognitions are not blocked while a token is requested from baidu
+		self._tokenLock = threading.Lock()
+		self._refreshLock = threading.Lock()
+		self._refresher = None
+		self._stop = threading.Event()
+		# tokens rejected by baidu, never loaded from account.json again
+		self._rejected = set()
 
 	def access_token(self):
 		"""
-		load access token and expired time from account.json, if access token expired or not exists, then update it
+		get access token from memory, it's loaded from account.json or requested from baidu at the first call, then
+		refreshed by a background thread before it expires
 		@return:
 			str, access token requested from baidu OCR cloud engine
 			None, no access token available(the times for recognition expired for all users or some other problem)
 		"""
+		token = self._token
+		if token and self._tokenExpires - time.time() > 0:
+			return token
+		with self._refreshLock:
+			if not self._token or self._tokenExpires - time.time() <= 0:
+				self.__refresh_token(force=False)
+			if self._refresher is None and self._token:
+				self._refresher = threading.Thread(target=self.__refresh_loop, name="baidu-ocr-token", daemon=True)
+				self._refresher.start()
+			return self._token
+
+	def invalidate_token(self, token: str):
+		"""
+		drop an access token rejected by baidu, a new token is requested at the next recognition
+		"""
+		with self._tokenLock:
+			self._rejected.add(token)
+			if self._token == token:
+				self._token = None
+				self._tokenExpires = 0
+
+	def __refresh_loop(self):
+		"""
+		background thread, refresh access token self.refreshBefore seconds before it expires
+		"""
+		while not self._stop.is_set():
+			wait = max(REFRESH_INTERVAL, self._tokenExpires - self.refreshBefore - time.time())
+			if self._stop.wait(wait):
+				break
+			with self._refreshLock:
+				if self._tokenExpires - self.refreshBefore - time.time() <= 0:
+					self.__refresh_token(force=True)
+
+	def __refresh_token(self, force: bool = False):
+		"""
+		load access token from account.json, if access token expired or not exists(or force is True), then request a new
+		one from baidu and write it back to account.json, must be called with self._refreshLock, the token in use is only
+		replaced(with self._tokenLock) after the request is finished
+		"""
 		with open(self.jsonPath, 'r') as f:
 			self.account = json.load(f)
 		for name, item in self.account.items():
-			if item["expiresIn"] - time.time() > 0 and item["accessToken"]:
+			if not force and item.get("expiresIn", 0) - time.time() > 0 and item.get("accessToken") and item["accessToken"] not in self._rejected:
 				logger.debug(f"access token for user '{name}' is still available with expires in: {item['expiresIn'] - time.time()} s, directly use this")
-				return item["accessToken"]
+				self.__set_token(item["accessToken"], item["expiresIn"])
+				return
+			params = {"grant_type": "client_credentials", "client_id": item["APIkey"], "client_secret": item["secretKey"]}
+			try:
+				response = self.session.get(self.baseUrl + token_path, params=params, timeout=self.timeout)
+				result = response.json()
+			except (requests.exceptions.RequestException, ValueError) as e:
+				logger.error(f"could not get access token for user '{name}' from baidu: {e}")
+				continue
+			if "access_token" in result and "expires_in" in result:
+				self.account[name]["accessToken"] = result["access_token"]
+				self.account[name]["expiresIn"] = result["expires_in"] + time.time()
+				tmp_file = self.jsonPath + ".tmp"
+				with open(tmp_file, 'w') as f:
+					json.dump(self.account, f)
+				os.replace(tmp_file, self.jsonPath)
+				logger.debug(f"get new access token for user '{name}' from baidu and update json")
+				self.__set_token(self.account[name]["accessToken"], self.account[name]["expiresIn"])
+				return
+			elif result.get("error") == "invalid_client" and result.get("error_description") == "unknown client id":
+				logger.error(f"APIkey for user '{name}' is not correct, please check and correct it")
+			elif result.get("error") == "invalid_client" and result.get("error_description") == "Client authentication failed":
+				logger.error(f"Secret key for user '{name}' is not correct, please check and correct it")
 			else:
-				host = f'https://aip.baidubce.com/oauth/2.0/token?grant_type=client_credentials&client_id={item["APIkey"]}&client_secret={item["secretKey"]}'
-				response = requests.get(host)
-				if response:
-					result = response.json()
-					if "access_token" in result and "expires_in" in result:
-						self.account[name]["accessToken"] = result["access_token"]
-						self.account[name]["expiresIn"] = result["expires_in"] + time.time()
-						with open(self.jsonPath, 'w') as f:
-							json.dump(self.account, f)
-						logger.debug(f"access token for user '{name}' has expired, get new access token from baidu and update json")
-						return result["access_token"]
-					elif "error" in result and "error_description" in result:
-						if result["error"] == "invalid_client" and result["error_description"] == "unknown client id":
-							logger.error(f"APIkey for user '{name}' is not correct, please check and correct it")
-							continue
-						elif result["error"] == "invalid_client" and result["error_description"] == "Client authentication failed":
-							logger.error(f"Secret key for user '{name}' is not correct, please check and correct it")
-							continue
-				else:
-					continue
+				logger.error(f"could not get access token for user '{name}' from baidu: {result}")
+		if force and self._token and self._tokenExpires - time.time() > 0:
+			logger.warning(f"access token could not be refreshed, keep using the current one")
+		else:
+			self.__set_token(None, 0)
+
+	def __set_token(self, token: str, expires: (int, float)):
+		with self._tokenLock:
+			self._token, self._tokenExpires = token, expires
+
+	@staticmethod
+	def encode(image):
+		"""
+		encode an image to base64 in memory
+		@param:
+			image: absolute path of image or matrix object loaded by opencv
+		@return:
+			bytes, base64 of image file, None if image not available
+		"""
+		if isinstance(image, numpy.ndarray):
+			ret, buffer = cv.imencode(".png", image)
+			return base64.b64encode(buffer.tobytes()) if ret else None
+		if isinstance(image, str) and os.path.exists(image):
+			with open(image, "rb") as f:
+				return base64.b64encode(f.read())
 		return None
 
 	def image_to_string(self, image, lang: (str, Language) = None, acc: bool = False, **kwargs):
@@ -119,17 +244,10 @@ class BaiduOcr(Ocr):
 			str, result of recognition
 			None, can not recognize because of some error
 		"""
-		tmpPng = None
-		# read image
-		if not isinstance(image, str) or not os.path.exists(image):
-			tmpFolder = self.__tmpFolder
-			if not os.path.exists(tmpFolder):
-				os.makedirs(tmpFolder)
-			tmpPng = os.path.join(tmpFolder, f"tmp_{time.time()}.png")
-			cv.imwrite(tmpPng, image)
-			image = tmpPng
-		with open(image, "rb") as f:
-			img = base64.b64encode(f.read())
+		img = self.encode(image)
+		if img is None:
+			logger.error(f"image could not be read or encoded, recognition skipped")
+			return None
 
 		# prepare params for Baidu OCR http POST request
 		if not lang:
@@ -137,36 +255,63 @@ class BaiduOcr(Ocr):
 		elif isinstance(lang, Language):
 			lang = lang.value
 		param = {"image": img, "language_type": lang}
-		access_token = self.access_token()
-		if access_token is None:
-			logger.error(f"no available access token found from account.json")
-			return None
-		if acc:
-			url = request_url_acc + "?access_token=" + access_token
-		else:
-			url = request_url + "?access_token=" + access_token
+		url = self.baseUrl + (request_path_acc if acc else request_path)
 		headers = {'content-type': 'application/x-www-form-urlencoded'}
 
-		# remove tmp image
-		if tmpPng and os.path.exists(tmpPng):
-			os.remove(tmpPng)
-
 		# send post request and get response for Baidu OCR
-		response = None
-		for _ in range(3):
+		for index in range(self.retries):
+			access_token = self.access_token()
+			if access_token is None:
+				logger.error(f"no available access token found from account.json")
+				return None
 			try:
-				response = requests.post(url, data=param, headers=headers)
-				break
-			except (requests.exceptions.SSLError, requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as e:
+				with self._limiter:
+					response = self.session.post(
+						url, params={"access_token": access_token}, data=param, headers=headers, timeout=self.timeout
+					)
+				result = response.json()
+			except (requests.exceptions.RequestException, ValueError) as e:
 				logger.error(f"Baidu OCR can not perform recognition because of error: {e}")
-				response = None
-		if response:
-			result = response.json()
+				continue
 			if "words_result" in result:
 				return "".join([x["words"].replace(" ", "") for x in result["words_result"] if "words" in x])
+			if result.get("error_code") in TOKEN_ERRORS:
+				logger.warning(f"access token rejected by baidu, request a new one: {result}")
+				self.invalidate_token(access_token)
+			elif result.get("error_code") in QPS_ERRORS:
+				logger.warning(f"QPS limit of baidu OCR reached, try again later: {result}")
+				time.sleep(0.5 * (index + 1))
+			else:
+				logger.error(f"Baidu OCR can not perform recognition: {result}")
+				return None
 
 		return None
 
+	def image_to_strings(self, images: (list, tuple), lang: (str, Language) = None, acc: bool = False, **kwargs):
+		"""
+		recognize a batch of images concurrently, see self.image_to_string
+		@param:
+			images: a list of absolute paths of images or matrix objects loaded by opencv
+		@return:
+			list, results of recognition in the same order as images, None for the failed ones
+		"""
+		if self._executor is None:
+			with self._tokenLock:
+				if self._executor is None:
+					self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="baidu-ocr")
+		futures = [self._executor.submit(self.image_to_string, image, lang, acc, **kwargs) for image in images]
+		return [future.result() for future in futures]
+
+	def close(self):
+		"""
+		stop token refresher and close connections
+		"""
+		self._stop.set()
+		if self._executor is not None:
+			self._executor.shutdown(wait=True)
+			self._executor = None
+		self.session.close()
+
 	def find_ocr_config(self, searchList: (list, tuple) = None):
 		"""
 		search config file for baidu ocr: baidu_ocr_accounts.json
@@ -206,9 +351,38 @@ class BaiduOcr(Ocr):
 
 
 if __name__ == "__main__":
-	test_ocr = r"D:\Bruce\003_GIT\ACT\output\images\bg.jpg"
-	bdOcr = BaiduOcr()
+	# recognize against a local stub server, no baidu account needed
+	from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+	import tempfile
+
+	class Stub(BaseHTTPRequestHandler):
+		def do_GET(self):
+			self.reply({"access_token": "stub-token", "expires_in": 2592000})
+
+		def do_POST(self):
+			self.rfile.read(int(self.headers["Content-Length"]))
+			time.sleep(0.05)
+			self.reply({"words_result": [{"words": "胎压 过低"}]})
+
+		def reply(self, data):
+			body = json.dumps(data).encode("utf-8")
+			self.send_response(200)
+			self.send_header("Content-Length", str(len(body)))
+			self.end_headers()
+			self.wfile.write(body)
+
+		def log_message(self, *args):
+			pass
+
+	server = ThreadingHTTPServer(("127.0.0.1", 0), Stub)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	folder = tempfile.mkdtemp()
+	with open(os.path.join(folder, "baidu_ocr_accounts.json"), "w") as f:
+		json.dump({"stub": {"APIkey": "key", "secretKey": "secret", "accessToken": "", "expiresIn": 0}}, f)
+	bdOcr = BaiduOcr(searchList=[folder], baseUrl=f"http://127.0.0.1:{server.server_port}")
+	crops = [numpy.full((40, 200, 3), 255, numpy.uint8) for _ in range(40)]
 	t1 = time.time()
-	res = bdOcr.image_to_string(test_ocr)
-	print(time.time() - t1)
-	print(res)
+	res = bdOcr.image_to_strings(crops)
+	print(f"{len(crops)} crops in {time.time() - t1:.3f}s, result: {res[0]}")
+	bdOcr.close()
+	server.shutdown()
@@ -0,0 +1,216 @@
+#! /usr/bin/env python
+
+
+
+"""
+cache for results of OCR, so the same text on a static screen is only recognized once
+
+a cached result is only returned for an image of the same shape and options of recognition(language, psm, oem) whose
+pixels are the same as the cached image: both gray images are blurred a little(3x3) to remove pixel noise of camera, and
+no pixel may differ by more than "tolerance" gray levels, so a changed character(e.g. "345 km" and "346 km") is always
+recognized again. a perceptual hash(DCT hash of the content cropped and padded to a square, so its aspect is kept) is
+used for finding candidates quickly, cached images whose hash differs in at most "distance" bits are checked pixel by
+pixel. least recently used results are dropped if cache is full.
+
+example:
+	from common.OCR.cache import OcrCache
+
+	cache = OcrCache(maxsize=256)
+	key = cache.key(imageMat, "chi_sim", psm=6, oem=2)
+	result = cache.get(key)
+	if result is None:
+		result = Ocr().image_to_string(imageMat, "chi_sim")
+		cache.put(key, result)
+	print(cache.stats())  # {"size": 1, "maxsize": 256, "hits": 0, "misses": 1, "hit_rate": 0.0}
+"""
+
+from collections import OrderedDict
+import threading
+import hashlib
+import numpy
+import cv2 as cv
+
+
+__all__ = [
+	"OcrCache",
+	"CacheKey",
+	"phash",
+]
+
+
+def _gray(imageMat):
+	if imageMat.ndim == 3:
+		if imageMat.shape[2] == 1:
+			return imageMat[:, :, 0]
+		return cv.cvtColor(imageMat, cv.COLOR_BGRA2GRAY if imageMat.shape[2] == 4 else cv.COLOR_BGR2GRAY)
+	return imageMat
+
+
+def phash(imageMat, hash_size: int = 16):
+	"""
+	perceptual hash of an image: the content(pixels different from the background, i.e. the median gray level) of gray
+	image is cropped and padded with background to a square, so the aspect is kept, then resized to
+	(4 * hash_size) x (4 * hash_size), the lowest hash_size x hash_size frequencies of DCT are compared with their median
+	@param:
+		imageMat: matrix object loaded by opencv
+		hash_size: hash_size * hash_size bits in hash
+	@return:
+		bytes: hash
+	"""
+	gray = _gray(imageMat)
+	background = int(numpy.median(gray))
+	points = cv.findNonZero((cv.absdiff(gray, background) > 32).astype(numpy.uint8))
+	if points is not None:
+		x, y, w, h = cv.boundingRect(points)
+		gray = gray[y: y + h, x: x + w]
+	h, w = gray.shape
+	side = max(h, w)
+	square = numpy.full((side, side), background, numpy.uint8)
+	square[(side - h) // 2: (side - h) // 2 + h, (side - w) // 2: (side - w) // 2 + w] = gray
+	size = hash_size * 4
+	small = cv.resize(square, (size, size), interpolation=cv.INTER_AREA).astype(numpy.float32)
+	low = cv.dct(small)[:hash_size, :hash_size]
+	return numpy.packbits(low > numpy.median(low)).tobytes()
+
+
+class CacheKey:
+	def __init__(self, options: tuple, hash_: int, image):
+		"""
+		key of cache, see OcrCache.key
+		@param:
+			options: (shape of image, language, psm, oem), must be equal for sharing a result
+			hash_: perceptual hash of image as int
+			image: blurred gray image for checking pixels
+		"""
+		self.options = options
+		self.hash = hash_
+		self.image = image
+		self.id = (options, hash_, hashlib.blake2b(image.tobytes(), digest_size=16).digest())
+
+
+class OcrCache:
+	def __init__(self, maxsize: int = 256, hash_size: int = 16, distance: int = 8, tolerance: int = 32):
+		"""
+		class init
+		@param:
+			maxsize: max number of results in cache, 0 for disabling cache
+			hash_size: see phash
+			distance: max number of different bits between hashes of cached images checked pixel by pixel
+			tolerance: max difference of gray level of blurred pixels between images sharing a result
+		"""
+		self.maxsize = maxsize
+		self.hash_size = hash_size
+		self.distance = distance
+		self.tolerance = tolerance
+		self.hits = 0
+		self.misses = 0
+		self._data = OrderedDict()
+		self._lock = threading.Lock()
+
+	def key(self, imageMat, lang, psm: int = None, oem: int = None):
+		"""
+		create key of cache for an image and options of recognition
+		@param:
+			imageMat: matrix object loaded by opencv
+			lang: language used for recognition
+			psm: page segmentation mode
+			oem: OCR engine mode
+		@return:
+			CacheKey: key of cache
+		"""
+		image = cv.blur(_gray(imageMat), (3, 3))
+		options = (tuple(imageMat.shape), str(lang), psm, oem)
+		return CacheKey(options, int.from_bytes(phash(imageMat, self.hash_size), "big"), image)
+
+	def _same(self, a, b):
+		return not numpy.any(cv.absdiff(a, b) > self.tolerance)
+
+	def _find(self, key: CacheKey):
+		"""
+		@return:
+			id of cached image in self._data with the same pixels, the nearest hash first, None if not found
+		"""
+		if key.id in self._data:
+			return key.id
+		candidates = []
+		for id_, (cached, value) in self._data.items():
+			if cached.options != key.options:
+				continue
+			distance = bin(cached.hash ^ key.hash).count("1")
+			if distance <= self.distance:
+				candidates.append((distance, id_, cached))
+		for distance, id_, cached in sorted(candidates, key=lambda x: x[0]):
+			if self._same(cached.image, key.image):
+				return id_
+		return None
+
+	def get(self, key):
+		"""
+		get result from cache
+		@return:
+			result of OCR, None if not in cache
+		"""
+		with self._lock:
+			found = self._find(key)
+			if found is not None:
+				self._data.move_to_end(found)
+				self.hits += 1
+				return self._data[found][1]
+			self.misses += 1
+			return None
+
+	def put(self, key: CacheKey, value):
+		"""
+		put result into cache, None is never cached so failed recognitions are retried
+		"""
+		if value is None or self.maxsize <= 0:
+			return
+		with self._lock:
+			self._data[key.id] = (key, value)
+			self._data.move_to_end(key.id)
+			while len(self._data) > self.maxsize:
+				self._data.popitem(last=False)
+
+	def clear(self):
+		with self._lock:
+			self._data.clear()
+			self.hits = 0
+			self.misses = 0
+
+	def stats(self):
+		"""
+		@return:
+			dict: size, maxsize, hits, misses and hit_rate
+		"""
+		with self._lock:
+			total = self.hits + self.misses
+			return {
+				"size": len(self._data),
+				"maxsize": self.maxsize,
+				"hits": self.hits,
+				"misses": self.misses,
+				"hit_rate": round(self.hits / total, 4) if total else 0.0,
+			}
+
+
+if __name__ == "__main__":
+	import time
+
+	def crop(text, noise=0):
+		# light text on a dark wide strip, like a line of the cluster display
+		image = numpy.full((50, 1200, 3), 20, numpy.uint8)
+		cv.putText(image, text, (20, 36), cv.FONT_HERSHEY_SIMPLEX, 1, (230, 230, 230), 2)
+		if noise:
+			image = numpy.clip(image + numpy.random.normal(0, noise, image.shape), 0, 255).astype(numpy.uint8)
+		return image
+
+	cache = OcrCache()
+	image = crop("Range 345 km")
+	cache.put(cache.key(image, "eng"), "Range345km")
+	hits = sum(cache.get(cache.key(crop("Range 345 km", 8), "eng")) is not None for _ in range(50))
+	print(f"noisy frames found in cache: {hits} of 50")
+	print(f"changed digit not found in cache: {cache.get(cache.key(crop('Range 346 km'), 'eng')) is None}")
+	t1 = time.time()
+	for _ in range(1000):
+		cache.get(cache.key(image, "eng"))
+	print(f"key and lookup: {time.time() - t1:.3f} ms per crop")
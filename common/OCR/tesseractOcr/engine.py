@@ -0,0 +1,480 @@
+#! /usr/bin/env python
+
+
+
+"""
+in-process engine for tesseract OCR
+
+language models are loaded once and kept in a pool of tesseract handles, one pool per (tessdata, language, oem), so
+images(numpy arrays) are recognized directly in memory without temp file and without starting a new process.
+three backends are supported, the first available one is used:
+	tesserocr: python binding of tesseract, pip install tesserocr
+	capi: C API of libtesseract loaded by ctypes, e.g. libtesseract.so.5 installed by "apt install tesseract-ocr" on linux
+		or libtesseract-5.dll next to tesseract.exe on windows
+	process: tesseract executable, image is encoded in memory and sent by stdin, used when library is not available
+
+each handle is only used by one thread at the same time, several threads could recognize in parallel up to the pool
+size. throughput and latency of recognitions could be checked by self.stats()
+
+how to use:
+	from common.OCR.tesseractOcr.engine import TesseractEngine
+
+	engine = TesseractEngine(executable="/usr/bin/tesseract", tessdata=None)
+	engine.preload("chi_sim+eng")  # optional, load language models before the first recognition
+	text = engine.recognize(imageMat, "chi_sim+eng", psm=6)
+	print(engine.stats())  # {"backend": "capi", "calls": 1, "throughput": ..., "latency_p50": ..., ...}
+"""
+try:
+	from common.logger.logger import logger
+except (ImportError, ModuleNotFoundError) as e:
+	import logging as logger
+import ctypes.util
+import subprocess
+import threading
+import ctypes
+import collections
+import queue
+import numpy
+import cv2 as cv
+import glob
+import time
+import sys
+import os
+
+
+__all__ = [
+	"TesseractEngine",
+]
+
+
+BACKENDS = ("tesserocr", "capi", "process")
+
+# tesseract uses 70 dpi with a warning if resolution is unknown, which is the case for images written by opencv
+DEFAULT_DPI = 70
+
+# OEM_DEFAULT, based on what is available. language data installed by linux distributions normally only contains
+# LSTM models, then legacy modes(0 and 2) could not be initialized
+OEM_DEFAULT = 3
+
+
+def _to_rgb(imageMat):
+	"""
+	tesseract expects RGB(A) order, opencv uses BGR(A)
+	@return:
+		tuple: (contiguous uint8 matrix, bytes per pixel)
+	"""
+	if imageMat.ndim == 2:
+		return numpy.ascontiguousarray(imageMat), 1
+	channels = imageMat.shape[2]
+	if channels == 1:
+		return numpy.ascontiguousarray(imageMat[:, :, 0]), 1
+	if channels == 3:
+		return cv.cvtColor(imageMat, cv.COLOR_BGR2RGB), 3
+	return cv.cvtColor(imageMat, cv.COLOR_BGRA2RGBA), 4
+
+
+def _load_library(library: str = None, executable: str = None):
+	"""
+	load libtesseract and declare the functions of C API which are used here
+	@param:
+		library: absolute path or name of libtesseract, searched automatically if None
+		executable: absolute path of tesseract executable, libraries next to it are also tried(windows installer)
+	@return:
+		ctypes.CDLL object, None if libtesseract not found
+	"""
+	candidates = [library] if library else []
+	if not library:
+		if executable:
+			candidates.extend(sorted(glob.glob(os.path.join(os.path.dirname(executable), "libtesseract*.dll")), reverse=True))
+		name = ctypes.util.find_library("tesseract")
+		if name:
+			candidates.append(name)
+		candidates.extend(["libtesseract.so.5", "libtesseract.so.4", "libtesseract.5.dylib", "libtesseract-5.dll"])
+
+	lib = None
+	for candidate in candidates:
+		try:
+			lib = ctypes.CDLL(candidate)
+			logger.debug(f"libtesseract loaded: <{candidate}>")
+			break
+		except OSError:
+			continue
+	if lib is None:
+		return None
+
+	handle = ctypes.c_void_p
+	lib.TessVersion.restype = ctypes.c_char_p
+	lib.TessVersion.argtypes = []
+	lib.TessBaseAPICreate.restype = handle
+	lib.TessBaseAPICreate.argtypes = []
+	lib.TessBaseAPIInit2.restype = ctypes.c_int
+	lib.TessBaseAPIInit2.argtypes = [handle, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int]
+	lib.TessBaseAPISetPageSegMode.restype = None
+	lib.TessBaseAPISetPageSegMode.argtypes = [handle, ctypes.c_int]
+	lib.TessBaseAPISetImage.restype = None
+	lib.TessBaseAPISetImage.argtypes = [handle, ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int]
+	lib.TessBaseAPISetSourceResolution.restype = None
+	lib.TessBaseAPISetSourceResolution.argtypes = [handle, ctypes.c_int]
+	# return value must be released by TessDeleteText, so do not let ctypes convert it to bytes
+	lib.TessBaseAPIGetUTF8Text.restype = ctypes.c_void_p
+	lib.TessBaseAPIGetUTF8Text.argtypes = [handle]
+	lib.TessDeleteText.restype = None
+	lib.TessDeleteText.argtypes = [ctypes.c_void_p]
+	lib.TessBaseAPIClear.restype = None
+	lib.TessBaseAPIClear.argtypes = [handle]
+	lib.TessBaseAPIEnd.restype = None
+	lib.TessBaseAPIEnd.argtypes = [handle]
+	lib.TessBaseAPIDelete.restype = None
+	lib.TessBaseAPIDelete.argtypes = [handle]
+	return lib
+
+
+class _CApiHandle:
+	def __init__(self, lib, tessdata: str, lang: str, oem: int):
+		self._lib = lib
+		self._api = lib.TessBaseAPICreate()
+		if not self._api:
+			raise RuntimeError(f"TessBaseAPICreate failed")
+		ret = lib.TessBaseAPIInit2(self._api, tessdata.encode("utf-8") if tessdata else None, lang.encode("utf-8"), oem)
+		if ret != 0:
+			lib.TessBaseAPIDelete(self._api)
+			self._api = None
+			raise RuntimeError(f"tesseract could not be initialized with tessdata<{tessdata}>, language<{lang}>, oem<{oem}>")
+
+	def recognize(self, imageMat, psm: int, dpi: int, **kwargs):
+		data, bpp = _to_rgb(imageMat)
+		height, width = data.shape[:2]
+		lib = self._lib
+		lib.TessBaseAPISetPageSegMode(self._api, psm)
+		# image data is copied by tesseract, data only has to be alive during this call
+		lib.TessBaseAPISetImage(self._api, data.ctypes.data, width, height, bpp, data.strides[0])
+		lib.TessBaseAPISetSourceResolution(self._api, dpi)
+		text = lib.TessBaseAPIGetUTF8Text(self._api)
+		try:
+			return ctypes.string_at(text).decode("utf-8") if text else ""
+		finally:
+			if text:
+				lib.TessDeleteText(text)
+			lib.TessBaseAPIClear(self._api)
+
+	def close(self):
+		if self._api:
+			self._lib.TessBaseAPIEnd(self._api)
+			self._lib.TessBaseAPIDelete(self._api)
+			self._api = None
+
+
+class _TesserocrHandle:
+	def __init__(self, tesserocr, tessdata: str, lang: str, oem: int):
+		kwargs = {"lang": lang, "oem": oem}
+		if tessdata:
+			kwargs["path"] = tessdata
+		try:
+			self._api = tesserocr.PyTessBaseAPI(**kwargs)
+		except RuntimeError as e:
+			raise RuntimeError(f"tesseract could not be initialized with tessdata<{tessdata}>, language<{lang}>, oem<{oem}>: {e}")
+
+	def recognize(self, imageMat, psm: int, dpi: int, **kwargs):
+		data, bpp = _to_rgb(imageMat)
+		height, width = data.shape[:2]
+		self._api.SetPageSegMode(psm)
+		self._api.SetImageBytes(data.tobytes(), width, height, bpp, width * bpp)
+		self._api.SetSourceResolution(dpi)
+		try:
+			return self._api.GetUTF8Text()
+		finally:
+			self._api.Clear()
+
+	def close(self):
+		self._api.End()
+
+
+class _ProcessHandle:
+	def __init__(self, executable: str, tessdata: str, lang: str, oem: int):
+		if not executable:
+			raise RuntimeError(f"executable of tesseract not found")
+		self.executable = executable
+		self.tessdata = tessdata
+		self.lang = lang
+		self.oem = oem
+
+	def recognize(self, imageMat, psm: int, dpi: int, timeout: (int, float) = 3, user_words: str = None,
+				user_patterns: str = None, **kwargs):
+		# png without compression is encoded fast and could be read by all versions of leptonica
+		ret, buffer = cv.imencode(".png", imageMat, [cv.IMWRITE_PNG_COMPRESSION, 0])
+		if not ret:
+			raise RuntimeError(f"image could not be encoded")
+		cmd = [self.executable, "stdin", "stdout", "-l", self.lang, "--psm", str(psm), "--oem", str(self.oem), "--dpi", str(dpi)]
+		if self.tessdata:
+			cmd.extend(["--tessdata-dir", self.tessdata])
+		if user_words:
+			cmd.extend(["--user-words", user_words])
+		if user_patterns:
+			cmd.extend(["--user-patterns", user_patterns])
+		logger.debug(f"cmd for tesseract OCR is: <{cmd}>")
+		result = subprocess.run(cmd, input=buffer.tobytes(), capture_output=True, timeout=timeout)
+		if result.returncode != 0 and self.oem != OEM_DEFAULT:
+			logger.warning(f"tesseract failed with oem<{self.oem}>, use oem<{OEM_DEFAULT}> instead: {result.stderr.decode('utf-8', 'ignore').strip()}")
+			self.oem = OEM_DEFAULT
+			return self.recognize(imageMat, psm, dpi, timeout=timeout, user_words=user_words, user_patterns=user_patterns)
+		if result.returncode != 0:
+			raise RuntimeError(f"tesseract exit with code {result.returncode}: {result.stderr.decode('utf-8', 'ignore').strip()}")
+		return result.stdout.decode("utf-8")
+
+	def close(self):
+		pass
+
+
+class TesseractEngine:
+	def __init__(self, executable: str = None, tessdata: str = None, library: str = None, backend: str = None,
+				size: int = None):
+		"""
+		class init
+		@param:
+			executable: absolute path of tesseract executable, only needed by backend "process" or for searching library
+			tessdata: folder of language data, None for the default one of installed tesseract
+			library: absolute path or name of libtesseract, searched automatically if None
+			backend: one of "tesserocr", "capi" and "process", the first available one is used if None
+			size: max number of handles for each language, default to half of cpu count but at most 4
+		"""
+		self.executable = executable
+		self.tessdata = tessdata
+		self.size = size if size else max(1, min(4, (os.cpu_count() or 2) // 2))
+		self._tesserocr = None
+		self._lib = None
+		self.backend = self.__select_backend(backend, library)
+		self._pools = {}
+		self._lock = threading.Lock()
+		self._latencies = collections.deque(maxlen=2000)
+		self._calls = 0
+		self._errors = 0
+		self._started = None
+		logger.info(f"tesseract engine initialized, backend: {self.backend}, pool size: {self.size}")
+
+	def __select_backend(self, backend: str, library: str):
+		"""
+		select the first available backend
+		@return:
+			str: name of backend, None if no one is available
+		"""
+		if backend is not None and backend not in BACKENDS:
+			raise ValueError(f"backend of tesseract must be one of {BACKENDS}, not {backend}")
+		if backend in (None, "tesserocr"):
+			try:
+				import tesserocr
+				self._tesserocr = tesserocr
+				return "tesserocr"
+			except ImportError:
+				if backend:
+					logger.error(f"tesserocr is not installed, try: pip install tesserocr")
+		if backend in (None, "capi"):
+			self._lib = _load_library(library, self.executable)
+			if self._lib is not None:
+				logger.info(f"libtesseract version: {self._lib.TessVersion().decode('utf-8')}")
+				return "capi"
+			if backend:
+				logger.error(f"libtesseract could not be loaded, please check if tesseract is installed")
+		if backend in (None, "process") and self.executable:
+			return "process"
+		logger.error(f"no backend available for tesseract OCR, error might occurs if you are trying to use tesseract OCR")
+		return None
+
+	def __create(self, tessdata: str, lang: str, oem: int):
+		if self.backend == "tesserocr":
+			return _TesserocrHandle(self._tesserocr, tessdata, lang, oem)
+		if self.backend == "capi":
+			return _CApiHandle(self._lib, tessdata, lang, oem)
+		return _ProcessHandle(self.executable, tessdata, lang, oem)
+
+	def __acquire(self, key: tuple, timeout: (int, float)):
+		"""
+		get a free handle from pool, a new handle is created if pool is not full
+		@return:
+			handle object, None if no handle is free before timeout
+		"""
+		with self._lock:
+			pool = self._pools.setdefault(key, {"queue": queue.Queue(), "created": 0})
+			try:
+				return pool["queue"].get_nowait()
+			except queue.Empty:
+				create = pool["created"] < self.size
+				if create:
+					pool["created"] += 1
+		if create:
+			tessdata, lang, oem = key
+			try:
+				try:
+					return self.__create(tessdata, lang, oem)
+				except RuntimeError as e:
+					if oem == OEM_DEFAULT:
+						raise
+					logger.warning(f"{e}, use oem<{OEM_DEFAULT}> instead")
+					return self.__create(tessdata, lang, OEM_DEFAULT)
+			except Exception:
+				with self._lock:
+					pool["created"] -= 1
+				raise
+		try:
+			return pool["queue"].get(timeout=timeout)
+		except queue.Empty:
+			return None
+
+	def __release(self, key: tuple, handle, broken: bool = False):
+		pool = self._pools[key]
+		if broken:
+			handle.close()
+			with self._lock:
+				pool["created"] -= 1
+		else:
+			pool["queue"].put(handle)
+
+	def preload(self, lang: str, oem: int = OEM_DEFAULT, count: int = 1, tessdata: str = None):
+		"""
+		load language models before the first recognition, which takes some hundred milliseconds for each handle
+		@param:
+			lang: languages, e.g. "chi_sim+eng"
+			oem: OCR engine mode
+			count: number of handles to create, limited by pool size
+			tessdata: folder of language data, default to self.tessdata
+		"""
+		key = (tessdata or self.tessdata, lang, oem)
+		handles = []
+		try:
+			for _ in range(min(count, self.size)):
+				handle = self.__acquire(key, timeout=0)
+				if handle is None:
+					break
+				handles.append(handle)
+		finally:
+			for handle in handles:
+				self.__release(key, handle)
+
+	def recognize(self, image, lang: str, psm: int = 6, oem: int = OEM_DEFAULT, dpi: int = None,
+				timeout: (int, float) = 3, tessdata: str = None, **kwargs):
+		"""
+		recognize an image and return raw text of tesseract
+		@param:
+			image: matrix object loaded by opencv, or absolute path of image
+			lang: languages, e.g. "chi_sim+eng"
+			psm: page segmentation mode
+			oem: OCR engine mode
+			dpi: resolution of image
+			timeout: for in-process backends it's the max time to wait for a free handle, for backend "process" it's
+				also the max time of recognition
+			tessdata: folder of language data, default to self.tessdata
+			user_words(optional): user words file, only supported by backend "process"
+			user_patterns(optional): user patterns file, only supported by backend "process"
+		@return:
+			str: result of recognition
+			None: can not recognize because of some error
+		"""
+		if self.backend is None:
+			logger.error(f"no backend available for tesseract OCR, recognition skipped")
+			return None
+		if isinstance(image, str):
+			# imdecode instead of imread for non-ascii path on windows
+			imageMat = cv.imdecode(numpy.fromfile(image, dtype=numpy.uint8), cv.IMREAD_COLOR)
+		else:
+			imageMat = image
+		if imageMat is None or imageMat.size == 0 or imageMat.dtype != numpy.uint8:
+			logger.error(f"image must be a non empty uint8 matrix, recognition skipped")
+			return None
+
+		options = {k: v for k, v in kwargs.items() if k in ("user_words", "user_patterns") and v}
+		if options and self.backend != "process":
+			if self.executable:
+				return _ProcessHandle(self.executable, tessdata or self.tessdata, lang, oem).recognize(
+					imageMat, psm, dpi or DEFAULT_DPI, timeout=timeout, **options)
+			logger.warning(f"{list(options)} are only supported by tesseract executable and will be ignored")
+
+		key = (tessdata or self.tessdata, lang, oem)
+		try:
+			handle = self.__acquire(key, timeout)
+		except Exception as e:
+			logger.error(f"tesseract OCR could not be initialized: {e}")
+			self._record(None)
+			return None
+		if handle is None:
+			logger.warning(f"no free tesseract handle within {timeout}s, <None> will be returned")
+			self._record(None)
+			return None
+
+		t1 = time.perf_counter()
+		broken = False
+		try:
+			result = handle.recognize(imageMat, psm, dpi or DEFAULT_DPI, timeout=timeout, **options)
+		except subprocess.TimeoutExpired as e:
+			result = None
+			logger.warning(f"tesseractOCR can not recognize image and <None> will be returned, error message: {e}")
+		except Exception as e:
+			result = None
+			broken = True
+			logger.error(f"tesseractOCR can not recognize image and <None> will be returned, error message: {e}")
+		finally:
+			self.__release(key, handle, broken)
+		self._record(None if result is None else time.perf_counter() - t1)
+		return result
+
+	def _record(self, latency: float = None):
+		with self._lock:
+			if self._started is None:
+				self._started = time.perf_counter()
+			self._calls += 1
+			if latency is None:
+				self._errors += 1
+			else:
+				self._latencies.append(latency)
+
+	def stats(self):
+		"""
+		statistics of recognitions
+		@return:
+			dict: backend, calls, errors, handles(loaded in pools), throughput(recognitions per second since first call)
+				and latency(ms, of the latest 2000 successful recognitions)
+		"""
+		with self._lock:
+			latencies = sorted(self._latencies)
+			elapsed = time.perf_counter() - self._started if self._started else 0
+			handles = {"+".join(map(str, k[1:])): v["created"] for k, v in self._pools.items()}
+			calls, errors = self._calls, self._errors
+
+		def percentile(p):
+			return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 3) if latencies else None
+
+		return {
+			"backend": self.backend,
+			"calls": calls,
+			"errors": errors,
+			"handles": handles,
+			"throughput": round(calls / elapsed, 3) if elapsed else None,
+			"latency_mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+			"latency_p50": percentile(0.5),
+			"latency_p95": percentile(0.95),
+		}
+
+	def close(self):
+		"""
+		release all handles and language models
+		"""
+		with self._lock:
+			pools, self._pools = self._pools, {}
+		for pool in pools.values():
+			while True:
+				try:
+					pool["queue"].get_nowait().close()
+				except queue.Empty:
+					break
+
+
+if __name__ == "__main__":
+	from concurrent.futures import ThreadPoolExecutor
+	image = numpy.full((60, 400, 3), 255, numpy.uint8)
+	cv.putText(image, "Cluster 12V Battery", (10, 40), cv.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+	import shutil
+	engine = TesseractEngine(executable=shutil.which("tesseract"), backend=sys.argv[1] if len(sys.argv) > 1 else None)
+	engine.preload("eng", count=engine.size)
+	with ThreadPoolExecutor(max_workers=engine.size) as executor:
+		results = list(executor.map(lambda _: engine.recognize(image, "eng", psm=7), range(100)))
+	print(repr(results[0]))
+	print(engine.stats())
+	engine.close()
@@ -35,8 +35,9 @@ except (ImportError, ModuleNotFoundError) as e:
 	import logging as logger
 from common.OCR.ocr import Ocr
 from common.OCR.language import Lang as Language
-import subprocess
-import cv2 as cv
+from common.OCR.tesseractOcr.engine import TesseractEngine
+import threading
+import shutil
 import time
 import os
 
@@ -44,22 +45,67 @@ import os
 current_path = os.path.split(os.path.abspath(__file__))[0]
 # ENGINE = os.path.join(current_path, "engine", "Tesseract-OCR", "tesseract.exe")
 # LANGUAGE_DATA = os.path.join(current_path, "engine", "Tesseract-OCR", "tessdata", "tessdata")
+EXECUTABLES = ("tesseract.exe", "tesseract")
 
 
 class TesseractOcr(Ocr):
-	def __init__(self, tmpFolder: str = None, searchList: (list, tuple) = None):
+	def __init__(self, tmpFolder: str = None, searchList: (list, tuple) = None, backend: str = None, size: int = None):
 		"""
 		class init
 		@param:
-			tmpFolder: tmp folder used for storing tmp image
+			tmpFolder: not used any more, images are recognized in memory, kept for compatibility
+			searchList: a list of dirs for searching tesseract if it's not in PATH
+			backend: backend of TesseractEngine, "tesserocr", "capi" or "process", the first available one if None
+			size: max number of tesseract handles for each language, see TesseractEngine
 		"""
-		self.__tmpFolder = tmpFolder if tmpFolder else os.path.join(os.path.split(os.path.abspath(__file__))[0], "tmp")
+		self.__tmpFolder = tmpFolder
+		self.__searchList = searchList
+		self.__backend = backend
+		self.__size = size
+		self.__lock = threading.Lock()
+		self.__found = False
+		self.__engine = None
+		self.__language_data = None
+		self.__pool = None
 		self.languages = [str(x.value) for x in Language._member_map_.values()]
-		self.engine, self.language_data = self.__find_engine(searchList)
+
+	@property
+	def engine(self):
+		"""
+		absolute path of tesseract executable, searched at the first access
+		"""
+		if not self.__found:
+			with self.__lock:
+				if not self.__found:
+					self.__engine, self.__language_data = self.__find_engine(self.__searchList)
+					self.__found = True
+		return self.__engine
+
+	@property
+	def language_data(self):
+		"""
+		absolute path of language data, None for the default one of installed tesseract
+		"""
+		_ = self.engine
+		return self.__language_data
+
+	@property
+	def pool(self):
+		"""
+		TesseractEngine object, created at the first recognition
+		"""
+		if self.__pool is None:
+			engine, language_data = self.engine, self.language_data
+			with self.__lock:
+				if self.__pool is None:
+					self.__pool = TesseractEngine(executable=engine, tessdata=language_data, backend=self.__backend,
+												size=self.__size)
+		return self.__pool
 
 	def __find_engine(self, searchList: (list, tuple) = None):
 		"""
-		search root dir of tesseract OCR, and location "tesseract.exe" and language data
+		search tesseract in PATH first(system tesseract on linux), then search root dir of tesseract OCR, and locate
+		"tesseract.exe" and language data
 		@param:
 			searchList: a list of dirs for searching tesseract
 		@return:
@@ -69,6 +115,15 @@ class TesseractOcr(Ocr):
 		language_data_dir = None
 
 		if not searchList:
+			engine = shutil.which("tesseract")
+			if engine:
+				# windows installer puts tessdata next to tesseract.exe, linux packages use the compiled-in default
+				language_data_dir = os.path.join(os.path.dirname(engine), "tessdata")
+				if not os.path.isdir(language_data_dir):
+					language_data_dir = None
+				logger.info(f"engine of tesseract OCR found in PATH: <{engine}>, language data dir: <{language_data_dir}>")
+				return engine, language_data_dir
+
 			searchList = [current_path]
 			tmp_path = current_path
 			for _ in range(8):
@@ -82,14 +137,15 @@ class TesseractOcr(Ocr):
 		for p in searchList:
 			logger.debug(f"trying to search engine of tesseract OCR('tesseract.exe') from path: <{p}>")
 			for root, dirs, files in os.walk(p):
-				if "tesseract.exe" in files:
+				name = next((x for x in EXECUTABLES if x in files), None)
+				if name:
 					engine_dir = root
 					break
 			if engine_dir:
 				language_data_dir = os.path.join(engine_dir, "tessdata", "tessdata")
 				logger.info(f"language data dir of tesseract OCR found: <{language_data_dir}>")
-				engine_dir = os.path.join(engine_dir, "tesseract.exe")
-				logger.info(f"engine of tesseract OCR('tesseract.exe') found: <{engine_dir}>")
+				engine_dir = os.path.join(engine_dir, name)
+				logger.info(f"engine of tesseract OCR('{name}') found: <{engine_dir}>")
 				break
 		else:
 			logger.error(f"could not find available engine('tesseract.exe') and language data for tesseract OCR, error"
@@ -99,13 +155,13 @@ class TesseractOcr(Ocr):
 
 	def image_to_string(self, image, lang: (str, Language) = Language.Chinese + Language.English, **kwargs):
 		"""
-		use tesseract5.0 as OCR engine
+		use tesseract5.0 as OCR engine, language models are kept loaded between calls, see TesseractEngine
 		recognize a image and output string
 		@param:
 			image: absolute path of input image with characters for recognition or matrix object loaded by opencv
 			lang(optional): languages used for recognition, examples: "chi_sim" or "chi_sim+eng"(means recognize with two languages
 				and the main language is chi_sim), there's a Enum class which could be used: from automated import Language
-			timeout(optional): recognition will stopped if timeout, default to 2s
+			timeout(optional): max time to wait for a free tesseract handle(or for the tesseract process), default to 3s
 			tessdata(optional): Specify the location of tessdata path(language's trained data path)
 			user_words(optional): Specify the location of user words file
 			user_patterns(optional): Specify the location of user patterns file
@@ -125,7 +181,7 @@ class TesseractOcr(Ocr):
 						# 11 Sparse text.Find as much	text as possible in no	particular	order.
 						# 12 Sparse	text with OSD.
 						# 13 Raw line.Treat the image as a single text line, bypassing hacks that	are	Tesseract - specific.
-			oem(optional): Specify OCR Engine mode, default to 3:
+			oem(optional): Specify OCR Engine mode, default to 2, 3 is used if legacy engine is not available:
 						# 0 Legacy engine only.
 						# 1 Neural nets LSTM engine only.
 						# 2 Legacy + LSTM engines.
@@ -133,7 +189,6 @@ class TesseractOcr(Ocr):
 		@return:
 			str, result of recognition
 		"""
-		cmd = [self.engine]
 		# check if all languages are available
 		if isinstance(lang, Language):
 			lang = lang.value
@@ -142,61 +197,45 @@ class TesseractOcr(Ocr):
 			if lang_ not in self.languages:
 				logger.error(f"language type: {lang_} not supported, recognition skipped")
 				return None
+		if isinstance(image, str) and not os.path.exists(image):
+			logger.error(f"image <{image}> not exists, recognition skipped")
+			return None
 
-		tmpPng = None
-		if isinstance(image, str) and os.path.exists(image):
-			cmd.extend([image, "stdout", "-l", lang])
-		else:
-			tmpFolder = self.__tmpFolder
-			if not os.path.exists(tmpFolder):
-				os.makedirs(tmpFolder)
-			tmpPng = os.path.join(tmpFolder, f"tmp_{time.time()}.png")
-			cv.imwrite(tmpPng, image)
-			cmd.extend([tmpPng, "stdout", "-l", lang])
-
-		# terminate the subprocess if timeout
-		if "timeout" in kwargs and isinstance(kwargs["timeout"], (int, float)):
-			timeout = kwargs["timeout"]
-		else:
-			timeout = 3
-
+		options = {}
+		# terminate the recognition if timeout
+		options["timeout"] = kwargs["timeout"] if isinstance(kwargs.get("timeout"), (int, float)) else 3
 		# Specify the location of tessdata path
 		if "tessdata" in kwargs and os.path.exists(kwargs["tessdata"]):
-			cmd.extend(["--tessdata-dir", kwargs["tessdata"]])
-		else:
-			cmd.extend(["--tessdata-dir", self.language_data])
+			options["tessdata"] = kwargs["tessdata"]
 		# Specify the location of user words file
 		if "user_words" in kwargs and os.path.exists(kwargs["user_words"]):
-			cmd.extend(["--user-words", kwargs["user_words"]])
+			options["user_words"] = kwargs["user_words"]
 		# Specify the location of user patterns file
 		if "user_patterns" in kwargs and os.path.exists(kwargs["user_patterns"]):
-			cmd.extend(["--user-patterns", kwargs["user_patterns"]])
+			options["user_patterns"] = kwargs["user_patterns"]
 		# Specify DPI for input image
 		if "dpi" in kwargs and isinstance(kwargs["dpi"], (int, float)):
-			cmd.extend(["--dpi", f'{kwargs["dpi"]}'])
+			options["dpi"] = int(kwargs["dpi"])
 		# Specify page segmentation mode:
 		if "psm" in kwargs and isinstance(kwargs["psm"], int) and 0 <= kwargs["psm"] <= 13:
-			cmd.extend(["--psm", f'{kwargs["psm"]}'])
+			options["psm"] = kwargs["psm"]
 		else:
-			cmd.extend(["--psm", '6'])
+			options["psm"] = 6
 		# Specify OCR Engine mode:
 		if "oem" in kwargs and isinstance(kwargs["oem"], int) and 0 <= kwargs["oem"] <= 3:
-			cmd.extend(["--oem", f'{kwargs["oem"]}'])
+			options["oem"] = kwargs["oem"]
 		else:
-			cmd.extend(["--oem", '2'])
-		logger.debug(f"cmd for tesseract OCR is: <{cmd}>")
-
-		# start a subprocess to call tesseract and stop subprocess after recognition finished or timeout
-		try:
-			result = subprocess.check_output(cmd, timeout=timeout)
-		except (subprocess.TimeoutExpired, ) as e:
-			result = None
-			logger.warning(f"tesseractOCR can not recognize image and <None> will be returned, error message: {e}")
+			options["oem"] = 2
 
-		if tmpPng and os.path.exists(tmpPng):
-			os.remove(tmpPng)
+		result = self.pool.recognize(image, lang, **options)
+		# lines of multi-line text are kept, only the ending line break and form feed of tesseract are stripped
+		return result.replace(" ", "").replace("\r\n", "\n").strip() if result is not None else None
 
-		return result.decode("utf-8").replace(" ", "").replace("\r\n", "")[:-1] if result else None
+	def stats(self):
+		"""
+		throughput and latency of recognitions, see TesseractEngine.stats
+		"""
+		return self.pool.stats()
 
 
 if __name__ == "__main__":
@@ -206,3 +245,4 @@ if __name__ == "__main__":
 	res = o.image_to_string(test_ocr)
 	print(time.time() - t1)
 	print(res)
+	print(o.stats())
@@ -21,24 +21,48 @@ how to use:
 		img.compare(XXXXX)
 """
 
+import importlib
+# logger and metrics are light, and imported eagerly because they have the same names as their sub-packages
 from common.logger.logger import logger
-from common.image.image import Image
-from common.OCR import Language, Ocr
-from common.camera import Camera
-from common.camera import Camera2
-from common.config.config import Config
-from common.can import CANoe
-# from common.power import PowerSupply
-from common.utils.utils import Utils
-from common.tc import TestCaseGenerator as TestCaseGenerate
-from common.dbc.dbc import DBC
-from common.excel import Excel
+from common.metrics import metrics
 
 
+# attribute: (module, name in module), modules are imported at the first access of attribute(PEP 562), so
+# "from common import logger" does not import opencv, tensorflow, win32com, ...
+_lazy = {
+	"Image": ("common.image.image", "Image"),
+	"Calibration": ("common.image.calibration", "Calibration"),
+	"Language": ("common.OCR", "Language"),
+	"Ocr": ("common.OCR", "Ocr"),
+	"Camera": ("common.camera", "Camera"),
+	"Camera2": ("common.camera", "Camera2"),
+	"Config": ("common.config.config", "Config"),
+	"CANoe": ("common.can", "CANoe"),
+	# "PowerSupply": ("common.power", "PowerSupply"),
+	"Utils": ("common.utils.utils", "Utils"),
+	"TestCaseGenerate": ("common.tc", "TestCaseGenerator"),
+	"DBC": ("common.dbc.dbc", "DBC"),
+	"Excel": ("common.excel", "Excel"),
+}
+
+
+def __getattr__(name):
+	if name not in _lazy:
+		raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+	module, attr = _lazy[name]
+	value = getattr(importlib.import_module(module), attr)
+	globals()[name] = value
+	return value
+
+
+def __dir__():
+	return sorted(set(globals()) | set(_lazy))
+
 
 __all__ = [
 	"logger",           # logger module for all other modules
 	"Image",            # image comparison
+	"Calibration",      # perspective calibration of display captured by camera, saved to disk and reused
 	"Language",         # language Enum for OCR
 	"Ocr",              # Ocr
 	# "image_to_string",  # Ocr's most useful function and only one for now
@@ -49,5 +73,6 @@ __all__ = [
 	"Utils",            # some common interfaces such as find a file, remove file and etc.
 	"TestCaseGenerate",  # generate test case script
 	"DBC",              # DBC parser
-	"Excel"            # read and write excel file
+	"Excel",            # read and write excel file
+	"metrics",          # counters and latency histograms of API actions, summary attached to allure report
 ]
\ No newline at end of file
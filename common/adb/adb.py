@@ -1,7 +1,7 @@
 import subprocess
 from datetime import datetime
 from common.logger.logger import logger
-import time
+from common.adb.shell import pool, serial, android_session, qnx_session
 
 class adb():
     """
@@ -11,9 +11,10 @@ class adb():
     def adb_root(devices:str)-> None:
         """
         导出安卓文件
-        parame: devices: 设备地址通过adb devices获得
+        parame: devices: 设备地址通过adb devices获得,为None时使用当前台架的设置adb_serial
         """
         try:
+            devices = serial(devices)
             command = "adb -s {} root".format(devices)
             process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
             process.stdin.close()
@@ -21,6 +22,7 @@ class adb():
             status_code=process.returncode  #执行状态码，为0表示执行成功，为1表示执行失败
             #cmd_result=process.communicate() #以元组的形式返回执行命令的输出
             logger.info("{}执行成功,执行状态码为{}".format(command,status_code))
+            pool.discard(devices + "/") #adbd重启后已有的shell会话失效
         except Exception as e:
             logger.error(e)
             raise
@@ -29,11 +31,12 @@ class adb():
     def adb_pull(devices:str,source:str,dest:str)-> None:
         """
         导出安卓文件
-        parame: devices: 设备地址通过adb devices获得
+        parame: devices: 设备地址通过adb devices获得,为None时使用当前台架的设置adb_serial
         parame: source: 安卓路径
         parame: dest: 本地路径
         """
         try:
+            devices = serial(devices)
             command = "adb -s {} pull {} {}".format(devices,source,dest)
             process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
             process.stdin.close()
@@ -48,7 +51,7 @@ class adb():
     def adb_pull_image(devices:str,source:str,dest:str,)-> str:
         """
         导出安卓下图片,主要用于导出仪表截图
-        parame: devices: 设备地址通过adb devices获得
+        parame: devices: 设备地址通过adb devices获得,为None时使用当前台架的设置adb_serial
         parame: source: 安卓路径
         parame: dest: 本地路径
         return: dest_path: 返回截图存放路径
@@ -57,6 +60,7 @@ class adb():
             current_time = datetime.now()
             formatted_time = current_time.strftime("%Y%m%d-%H%M%S")
             dest_path = dest+'/'+ 'screenshot_'+ formatted_time+'.bmp'
+            devices = serial(devices)
             command = "adb -s {} pull {} {}".format(devices,source,dest_path)
             process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
             process.stdin.close()
@@ -82,45 +86,36 @@ class adb():
             raise
 
     @staticmethod
-    def del_qnximage():
+    def del_qnximage(devices:str=None,ip:str="192.168.118.2",user:str="root",passwd:str="")-> int:
         """
-        删除qnx仪表截图
+        删除qnx仪表截图,复用已登录的qnx会话,命令执行完成即返回
+        parame: devices: 设备地址通过adb devices获得,为None时使用当前台架的设置adb_serial
+        parame: ip: qnx的ip地址
+        parame: user: qnx登录账号
+        parame: passwd: qnx登录密码
+        return: status_code: 执行状态码
         """
         try: #删除qnx路径下截图
-            del_command = ("adb -s 192.168.7.16:5555 shell\n")
-            proc = subprocess.Popen(del_command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            proc.stdin.write("busybox telnet 192.168.118.2\n"
-                             "root\n"
-                             "rm /var/share/screenshot.bmp\n")
-            proc.stdin.flush()
-            time.sleep(4)
-            proc.stdin.close()
-            proc.wait()
-            status_code = proc.returncode  # 执行状态码，为0表示执行成功，为1表示执行失败
+            with qnx_session(devices, ip, user, passwd) as session:
+                output, status_code = session.run("rm -f /var/share/screenshot.bmp")
             logger.info("执行成功,执行状态码为{}".format(status_code))
+            return status_code
         except Exception as e:
             logger.error(e)
             raise
 
     @staticmethod
-    def del_iviimage():
+    def del_iviimage(devices:str=None)-> int:
         """
-        删除android仪表截图
+        删除android仪表截图,复用已切换root的android会话,命令执行完成即返回
+        parame: devices: 设备地址通过adb devices获得,为None时使用当前台架的设置adb_serial
+        return: status_code: 执行状态码
         """
         try: #删除android路径下截图
-            del_command = ("adb -s 192.168.7.16:5555 shell\n")
-            proc = subprocess.Popen(del_command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-                                        stderr=subprocess.PIPE, text=True)
-            proc.stdin.write("su\n"
-                             "rm /data/nfs/nfs_share/screenshot.bmp\n"
-                             "y\n")
-            proc.stdin.flush()
-            time.sleep(4)
-            proc.stdin.close()
-            proc.wait()
-            status_code = proc.returncode  # 执行状态码，为0表示执行成功，为1表示执行失败
+            with android_session(devices, root=True) as session:
+                output, status_code = session.run("rm -f /data/nfs/nfs_share/screenshot.bmp")
             logger.info("执行成功,执行状态码为{}".format(status_code))
-
+            return status_code
         except Exception as e:
             logger.error(e)
-            raise    
\ No newline at end of file
+            raise
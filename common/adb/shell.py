@@ -0,0 +1,384 @@
+#! /usr/bin/env python
+
+
+
+"""
+long-lived shell sessions(adb shell, busybox telnet into qnx, su, ...) reused by all test cases, commands are finished
+by reading output until a prompt or a sentinel appears instead of sleeping for a fixed time
+
+every command sent by ShellSession.run is followed by an "echo" of a unique sentinel and the exit code, output before the
+sentinel is the output of the command. ShellSession.expect waits for any pattern(e.g. "login:") like expect does.
+sessions are kept in a pool by name and created again if the process died.
+
+how to use:
+    from common.adb.shell import qnx_session, android_session, pool
+
+    session = qnx_session("192.168.7.16:5555", "192.168.118.2", "root")  # logged in once, reused later
+    with session:  # exclusive use of the session by this thread
+        output, code = session.run("rm -f /var/share/screenshot.bmp")
+    android_session("192.168.7.16:5555", root=True).run("ls /data")
+    data = android_session("192.168.7.16:5555", raw=True).read_file("/data/xxx.bmp")  # bytes of a binary file
+    pool.discard("192.168.7.16:5555/")  # close all sessions of a device, e.g. after "adb root"
+    android_session(None).run("ls /data")  # device of setting "adb_serial"(overridden by rig, see common.rig)
+
+    any local process with a shell works the same way, e.g. for debugging without a device:
+    session = ShellSession(["sh"])
+    print(session.run("echo hello"))  # ("hello", 0)
+"""
+
+try:
+    from common.logger.logger import logger
+except (ImportError, ModuleNotFoundError) as e:
+    import logging as logger
+from common.config.config import Config
+import subprocess
+import threading
+import atexit
+import uuid
+import os
+import time
+import re
+
+
+__all__ = [
+    "ShellSession",
+    "SessionPool",
+    "pool",
+    "serial",
+    "adb_shell",
+    "telnet_login",
+    "android_session",
+    "qnx_session",
+]
+
+
+class ShellSession:
+    def __init__(self, command: (list, tuple), encoding: str = "utf-8", name: str = None, echo: bool = False):
+        """
+        start a process and read its output in background
+        @param:
+            command: command line of the process, e.g. ["adb", "-s", "xxx", "shell"]
+            encoding: encoding of input and output
+            name: name for logging, default to command line
+            echo: True if the process echoes every command line(e.g. a terminal of telnet), the echo is removed from
+                output of run
+        """
+        self.command = list(command)
+        self.encoding = encoding
+        self.name = name if name else " ".join(self.command)
+        self.echo = echo
+        self.lock = threading.RLock()
+        self._buffer = bytearray()
+        self._condition = threading.Condition()
+        self._eof = False
+        self._proc = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self._reader = threading.Thread(target=self._read, name=f"shell-{self._proc.pid}", daemon=True)
+        self._reader.start()
+        logger.info(f"shell session started: {self.name}")
+
+    def __enter__(self):
+        self.lock.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.lock.release()
+
+    def _read(self):
+        stream = self._proc.stdout
+        while True:
+            chunk = stream.read1(4096) if hasattr(stream, "read1") else stream.read(1)
+            with self._condition:
+                if not chunk:
+                    self._eof = True
+                    self._condition.notify_all()
+                    return
+                self._buffer.extend(chunk)
+                self._condition.notify_all()
+
+    @property
+    def alive(self):
+        return self._proc.poll() is None and not self._eof
+
+    def send(self, text: str):
+        """
+        write text to the process, a line break is not added
+        """
+        if self._proc.poll() is not None:
+            raise EOFError(f"shell session exited with code {self._proc.returncode}: {self.name}")
+        self._proc.stdin.write(text.encode(self.encoding))
+        self._proc.stdin.flush()
+
+    def expect(self, patterns: (str, list, tuple), timeout: (int, float) = 10):
+        """
+        wait until one of patterns appears in output, output before and including the match is consumed
+        @param:
+            patterns: a regular expression or a list of regular expressions
+            timeout: seconds to wait
+        @return:
+            tuple: (index of pattern matched, output before match, match object)
+        """
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        compiled = [re.compile(x.encode(self.encoding)) for x in patterns]
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                # search a copy, a match object refers to the searched buffer
+                data = bytes(self._buffer)
+                found = [(m.start(), i, m) for i, m in enumerate(x.search(data) for x in compiled) if m]
+                if found:
+                    start, index, match = min(found, key=lambda x: (x[0], x[1]))
+                    before = data[:start].replace(b"\r", b"").decode(self.encoding, "replace")
+                    del self._buffer[:match.end()]
+                    return index, before, match
+                if self._eof:
+                    raise EOFError(f"shell session exited while waiting for {patterns}: {self.name}, output: "
+                                   f"{data.decode(self.encoding, 'replace')}")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"{patterns} not found within {timeout}s: {self.name}, output: "
+                                       f"{data.decode(self.encoding, 'replace')}")
+                self._condition.wait(remaining)
+
+    def run(self, command: str, timeout: (int, float) = 30, check: bool = False):
+        """
+        run a command and wait until it's finished
+        @param:
+            command: one line of shell command
+            timeout: seconds to wait
+            check: True for raising RuntimeError if exit code is not 0
+        @return:
+            tuple: (output of command, exit code)
+        """
+        with self.lock:
+            marker = f"__ACT_{uuid.uuid4().hex[:12]}__"
+            # quotes split the sentinel in the command line, so an echo of the command line by terminal is not matched
+            quoted = f'"{marker[:6]}""{marker[6:]}"'
+            self.send(f"{command}\necho {quoted} $?\n")
+            index, before, match = self.expect(re.escape(marker) + r" (\d+)", timeout)
+            code = int(match.group(1).decode())
+            lines = [x for x in before.split("\n") if quoted not in x]
+            if self.echo:
+                # the first line is the echo of command, after a prompt(e.g. "# ") if there is one
+                while lines and not lines[0].strip():
+                    lines.pop(0)
+                if lines and re.fullmatch(r"(?:.*?[#$>%] ?)?" + re.escape(command), lines[0].rstrip()):
+                    lines.pop(0)
+            output = "\n".join(lines).strip()
+        logger.debug("shell: {}, command: {}, exit code: {}, output: {}", self.name, command, code, output)
+        if check and code != 0:
+            raise RuntimeError(f"command <{command}> failed with exit code {code}: {output}")
+        return output, code
+
+    def read(self, size: int, timeout: (int, float) = 30):
+        """
+        read exact number of bytes of output, e.g. content of a binary file, output is not changed
+        @return:
+            bytes
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while len(self._buffer) < size:
+                if self._eof:
+                    raise EOFError(f"shell session exited after {len(self._buffer)} of {size} bytes: {self.name}")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"{len(self._buffer)} of {size} bytes read within {timeout}s: {self.name}")
+                self._condition.wait(remaining)
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            return data
+
+    def read_file(self, path: str, remove: bool = False, timeout: (int, float) = 30):
+        """
+        read a file through the output of the shell, the size is sent before content, so no end of content is searched.
+        the output must not be changed by a terminal(e.g. "adb exec-out", not "adb shell" with a pty)
+        @param:
+            path: path of file in the system of shell
+            remove: True for removing the file after reading
+            timeout: seconds to wait
+        @return:
+            bytes: content of file, None if file does not exist
+        """
+        with self.lock:
+            marker = f"__ACT_{uuid.uuid4().hex[:12]}__"
+            quoted = f'"{marker[:6]}""{marker[6:]}"'
+            self.send(f"echo {quoted} $(stat -c %s {path} 2>/dev/null || echo -1); cat {path} 2>/dev/null"
+                      f"{f'; rm -f {path}' if remove else ''}\n")
+            index, before, match = self.expect(re.escape(marker) + r" (-?\d+)\r?\n", timeout)
+            size = int(match.group(1).decode())
+            if size < 0:
+                return None
+            return self.read(size, timeout)
+
+    def close(self, timeout: (int, float) = 3):
+        """
+        exit the shell, the process is killed if it does not exit in time
+        """
+        if self._proc.poll() is None:
+            try:
+                self.send("exit\n")
+                self._proc.stdin.close()
+                self._proc.wait(timeout)
+            except (OSError, EOFError, subprocess.TimeoutExpired):
+                self._proc.kill()
+                self._proc.wait()
+        logger.info(f"shell session closed: {self.name}")
+
+
+class SessionPool:
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, factory):
+        """
+        get a session by key, created by factory if there's no session or the session exited
+        @param:
+            key: name of session, e.g. "qnx-192.168.7.16:5555"
+            factory: a function creating a logged in ShellSession
+        """
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None or not session.alive:
+                if session is not None:
+                    logger.warning(f"shell session <{key}> exited, starting a new one")
+                session = factory()
+                self._sessions[key] = session
+            return session
+
+    def discard(self, prefix: str):
+        """
+        close and remove sessions of which key starts with prefix, e.g. all sessions of a device after it rebooted
+        """
+        with self._lock:
+            keys = [x for x in self._sessions if x.startswith(prefix)]
+            sessions = [self._sessions.pop(x) for x in keys]
+        for session in sessions:
+            session.close()
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            session.close()
+
+
+pool = SessionPool()
+atexit.register(pool.close)
+
+
+def adb_shell(devices: str, shell: str = None, adb: str = "adb", raw: bool = False):
+    """
+    @param:
+        devices: serial of device from "adb devices"
+        shell: shell started by adb instead of the default one, e.g. "su", it reads the input directly, commands sent
+            to a shell switched by "su" later may be read by the first shell and never reach the second one
+        adb: path of adb executable
+        raw: True for "adb exec-out", binary output(e.g. ShellSession.read_file) is not changed
+    @return:
+        ShellSession: a shell of android
+    """
+    command = [adb, "-s", devices, "exec-out" if raw else "shell"] + ([shell] if shell else ["sh"] if raw else [])
+    session = ShellSession(command, name=" ".join(command[1:]))
+    # the shell is ready when the first command returns
+    session.run("true", timeout=20)
+    return session
+
+
+def telnet_login(
+        session: ShellSession,
+        ip: str,
+        user: str,
+        passwd: str = "",
+        timeout: (int, float) = 20,
+        telnet: str = "busybox telnet"
+):
+    """
+    log in to another system(e.g. qnx) by "busybox telnet" in a session
+    @param:
+        session: a ShellSession, e.g. from adb_shell
+        ip: ip address of target system
+        user: user name
+        passwd: password, "" if no password is asked
+        timeout: seconds to wait for every prompt
+        telnet: telnet command, ip is appended to it
+    @return:
+        ShellSession: the same session, logged in
+    """
+    session.send(f"{telnet} {ip}\n")
+    session.expect(r"(?i)login:\s*$", timeout)
+    session.send(f"{user}\n")
+    if passwd:
+        session.expect(r"(?i)password:\s*$", timeout)
+        session.send(f"{passwd}\n")
+    session.name = f"{session.name} > telnet {ip}"
+    # a terminal of telnet echoes command lines
+    session.echo = True
+    session.run("true", timeout=timeout)
+    return session
+
+
+def serial(devices: str = None):
+    """
+    @param:
+        devices: serial of device from "adb devices", None for setting "adb_serial" of current rig
+    @return:
+        str: serial of device
+    """
+    devices = devices or Config().adb_serial
+    if not devices:
+        raise ValueError("serial of android device is not given and setting 'adb_serial' is not found")
+    return str(devices)
+
+
+def android_session(devices: (str, None), root: bool = False, raw: bool = False):
+    """
+    @param:
+        devices: serial of device from "adb devices", None for setting "adb_serial"
+        root: True for a session switched to root by su
+        raw: True for a session of "adb exec-out", see adb_shell
+    @return:
+        ShellSession: a pooled shell of android
+    """
+    devices = serial(devices)
+    key = f"{devices}/{'su' if root else 'sh'}{'-raw' if raw else ''}"
+    return pool.get(key, lambda: adb_shell(devices, "su" if root else None, raw=raw))
+
+
+def qnx_session(devices: (str, None), ip: str, user: str, passwd: str = "", timeout: (int, float) = 20):
+    """
+    @param:
+        devices: serial of android device from "adb devices", None for setting "adb_serial"
+        ip: ip address of qnx
+        user: user name of qnx
+        passwd: password of qnx, "" if no password is asked
+        timeout: seconds to wait for every prompt of logging in
+    @return:
+        ShellSession: a pooled shell of qnx, logged in by telnet from android
+    """
+    devices = serial(devices)
+    return pool.get(f"{devices}/qnx/{ip}/{user}", lambda: telnet_login(adb_shell(devices), ip, user, passwd, timeout))
+
+
+if __name__ == "__main__":
+    import tempfile
+    # a fake telnet: asks for user and password, then starts a shell with echo of commands like a terminal
+    fake = os.path.join(tempfile.mkdtemp(), "telnet.sh")
+    with open(fake, 'w') as f:
+        f.write("printf 'login: '; read user; printf 'Password: '; read passwd; echo \"welcome $user\"; exec sh -v 2>&1\n")
+    shell = ShellSession(["sh"], name="local sh")
+    t1 = time.time()
+    for i in range(100):
+        shell.run(f"echo {i}")
+    print(f"100 commands in {time.time() - t1:.3f}s, {shell.run('echo hello; false')}")
+    content = os.urandom(1 << 20) + b"\r\n"
+    with open(fake + ".bin", 'wb') as f:
+        f.write(content)
+    t1 = time.time()
+    data = shell.read_file(fake + ".bin")
+    print(f"1MB file read in {time.time() - t1:.3f}s: {data == content}")
+    t1 = time.time()
+    telnet_login(shell, "127.0.0.1", "root", "passwd", telnet=f"sh {fake}")
+    print(f"logged in within {time.time() - t1:.3f}s: {shell.run('echo $((1 + 2)) && cd /tmp && pwd')}")
+    shell.close()
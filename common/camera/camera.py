@@ -13,6 +13,7 @@ import cv2 as cv
 import numpy
 import os
 from common.logger.logger import logger
+from common.metrics import metrics
 from common.camera.cameraProcess import CameraProcess
 from common.camera.cameraSetting import SETTINGS
 
@@ -83,11 +84,12 @@ class Camera:
         @return:
             cv.mat: a numpy.ndarray object of image
         """
-        path = self.shot()
-        if isinstance(path, str) and os.path.exists(path):
-            img = cv.imdecode(numpy.fromfile(path, dtype=numpy.uint8), cv.IMREAD_COLOR)
-            return img
-        return None
+        with metrics.timer("camera.frame"):
+            path = self.shot()
+            if isinstance(path, str) and os.path.exists(path):
+                img = cv.imdecode(numpy.fromfile(path, dtype=numpy.uint8), cv.IMREAD_COLOR)
+                return img
+            return None
 
     def shot(self, path: str = None):
         """
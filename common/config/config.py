@@ -17,6 +17,7 @@ example:
 """
 
 import os
+import json
 import shutil
 import configparser
 
@@ -66,6 +67,14 @@ class Config:
 			# load config file settings.ini and read all configs
 			conf = configparser.ConfigParser(defaults={"ROOT_DIR": self.root})
 			conf.read(_config_path, encoding="utf-8")
+			# settings overridden for the rig of current process(see common.rig), applied before interpolation so
+			# settings like %(output)s follow the overridden ones
+			if os.environ.get("ACT_RIG"):
+				for name, value in json.loads(os.environ["ACT_RIG"]).items():
+					if value is None:
+						continue
+					section = next((x for x in conf.sections() if conf.has_option(x, name)), conf.sections()[0])
+					conf.set(section, name, str(value).replace("%", "%%"))
 			# set all configs as attributes of instance
 			self.all = {}
 			for section in conf.sections():
@@ -280,7 +280,6 @@ class DBC:
                 msgId = int(msgId, 16)
             else:
                 msgId = int(msgId)
-        logger.debug(f"message id is: {msgId}, message name: {msgName}, signal name: {sigName}")
 
         msgId = str(msgId)
         if msgId != "None" and msgId in self.messages:
@@ -315,7 +314,8 @@ class DBC:
                     elif newSigName.lower() in signal_keys_mapping:
                         msg_bak.update(self.messages[msgId]['signals'][signal_keys_mapping[newSigName.lower()]])
         del msg_bak['signals']
-        logger.debug(f"msg found: {msg_bak}")
+        # called for every signal sent or read, only formatted if debug log is written
+        logger.debug("msg found for message id: {}, message name: {}, signal name: {}: {}", msgId, msgName, sigName, msg_bak)
         return msg_bak
 
     def write_json_file(self):
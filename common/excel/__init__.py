@@ -2,9 +2,18 @@
 
 
 
-from common.excel.excel import Excel
+try:
+    from common.excel.excel import Excel
+except (ImportError, ModuleNotFoundError) as e:
+    # Excel application(COM) is only available on Windows with pywin32, reader works without it
+    Excel = None
+from common.excel.reader import read_sheets, read_records, case_table, CaseTable
 
 
 __all__ = [
-    "Excel"
+    "Excel",
+    "read_sheets",
+    "read_records",
+    "case_table",
+    "CaseTable",
 ]
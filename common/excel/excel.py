@@ -68,6 +68,15 @@ usage:
         or
         sht.write_range([3, 3], [5, 5], val)
 
+        # read all data of used range by one call, as dicts, columns or an array(header row excluded)
+        d = sht.to_records()
+        d = sht.to_columns()
+        d = sht.to_numpy()
+
+        # write a list of dicts(header row included) or a large table in blocks of 5000 rows
+        sht.from_records([{"name": "a", "value": 1}, {"name": "b", "value": 2}])
+        sht.write_matrix([1, 1], val, chunk=5000)
+
         # delete row 3
         sht.delete_row(3)
 
@@ -1,46 +1,69 @@
 import json
-from common.excel.excel import Excel
+from common.excel.reader import read_sheets, _trim
 import os
 from common.logger.logger import logger
 import codecs
 
 class Excel_To_JSON:
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, com: bool = False):
+        """
+        @param:
+            file_path: 测试用例excel路径
+            com: True: 通过Excel应用(COM)逐个单元格读取, False: 不打开Excel, 一次读取整个sheet页(默认, 快很多)
+        """
         self.file_path = file_path
-        self.app = Excel(self.file_path)
+        self.app = None
+        if com:
+            from common.excel.excel import Excel
+            self.app = Excel(self.file_path)
 
     def close_excel(self):
         """
         关闭已经打开的excel
         """
-        self.app.close()
+        if self.app is not None:
+            self.app.close()
+
+    def read_sheets(self):
+        """
+        读取所有sheet页的数据
+        @return:
+            dict: {sheet页名称: [[cell, ...], ...]}, 末尾的空行和空单元格已去掉
+        """
+        if self.app is None:
+            return read_sheets(self.file_path)
+        result = {}
+        for i in self.app.sheets.names:
+            sht = self.app.sheets.activate(i)
+            rows = sht.read_range([1, 1], [sht.max_row, sht.max_column])
+            # UsedRange包含只有格式的空行和空列, 与不打开Excel读取时一样去掉
+            result[i] = _trim(rows if isinstance(rows, (list, tuple)) else [[rows]])
+        return result
 
     def excel2json(self):
         """
         将测试用例excel转换成json格式
         """
-        n = self.app.sheets.names
+        sheets = self.read_sheets()
         logger.info("获取所有sheet页")
-        for i in n:
-            sht = self.app.sheets.activate(i)            
-            max_colum = sht.max_column
+        for i, rows in sheets.items():
+            max_colum = max((len(x) for x in rows), default=0)
             logger.info(f"sheet页_{i}有{max_colum}列")
-            max_row = sht.max_row
+            max_row = len(rows)
             logger.info(f"sheet页_{i}有{max_row}行")
+            rows = [list(x) + [None] * (max_colum - len(x)) for x in rows]
+            heads = rows[0] if rows else []
             result = []
-            heads = []
-            for col in range(max_colum):
-                heads.append(sht.read_cell(1, col+1))
-            for row in range(max_row-1):
-                if row == 0:
+            # 跳过表头和空行, 数字都是float(与逐个单元格读取时相同)
+            for row in rows[1:]:
+                if all(x is None for x in row):
                     continue
                 one_line = {}
-                for col in range(max_colum-2):
-                    k = heads[col]
-                    cell = sht.read_cell(row + 1, col + 1)
-                    one_line[k] = cell
-                    logger.info(f"one_line={one_line}")
+                for col in range(max_colum):
+                    cell = row[col]
+                    one_line[heads[col]] = float(cell) if isinstance(cell, int) and not isinstance(cell, bool) else cell
                 result.append(one_line)
+            logger.info(f"sheet页_{i}读取了{len(result)}条用例")
             json_str = json.dumps(result, indent=2, ensure_ascii=False)
             with codecs.open(os.path.join(os.path.dirname(self.file_path), "test"+i+".json"), "w", "utf-8") as json_file:
                 json_file.write(json_str)
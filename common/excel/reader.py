@@ -0,0 +1,184 @@
+#! /usr/bin/env python
+
+
+
+"""
+read Excel file without Excel application(COM), whole sheets are streamed in one pass by openpyxl(read_only) for
+.xlsx/.xlsm or xlrd for .xls, much faster than reading cell by cell through COM and works without Excel installed
+
+test data tables are indexed by case name and cached until the file is modified, so looking up test data of one test
+case does not read the file again.
+
+how to use:
+    from common.excel.reader import read_sheets, read_records, case_table
+
+    sheets = read_sheets("D:/xxx/test.xlsx")  # {sheet name: [(cell, cell, ...), ...]}
+    records = read_records("D:/xxx/test.xlsx", sheet="test")  # [{header: cell, ...}, ...]
+    data = case_table("D:/xxx/test.xlsx").get("case_001")  # {header: cell, ...} of test case "case_001"
+"""
+
+try:
+    from common.logger.logger import logger
+except (ImportError, ModuleNotFoundError) as e:
+    import logging as logger
+import threading
+import os
+
+
+__all__ = [
+    "read_sheets",
+    "read_records",
+    "CaseTable",
+    "case_table",
+]
+
+
+def _trim(rows: list):
+    """
+    remove empty rows at the end and empty cells at the end of rows, read_only sheets may report a larger dimension
+    """
+    rows = [list(x) for x in rows]
+    for row in rows:
+        while row and row[-1] is None:
+            row.pop()
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+
+def read_sheets(file: str, sheets: (list, tuple) = None):
+    """
+    read all values of sheets in one pass
+    @param:
+        file: path of Excel file
+        sheets: names of sheets to read, all sheets if None
+    @return:
+        dict: {sheet name: [[cell, ...], ...]}, empty cells are None, in order of sheets in workbook
+    """
+    if str(file).lower().endswith(".xls"):
+        import xlrd
+        book = xlrd.open_workbook(file, on_demand=True)
+        try:
+            result = {}
+            for name in book.sheet_names():
+                if sheets is not None and name not in sheets:
+                    continue
+                sht = book.sheet_by_name(name)
+                result[name] = _trim(
+                    [None if c.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK) else c.value for c in sht.row(r)]
+                    for r in range(sht.nrows)
+                )
+            return result
+        finally:
+            book.release_resources()
+
+    import openpyxl
+    book = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        return {
+            sht.title: _trim(sht.iter_rows(values_only=True))
+            for sht in book.worksheets if sheets is None or sht.title in sheets
+        }
+    finally:
+        book.close()
+
+
+def read_records(file: str, sheet: (str, int) = 0, header: int = 1):
+    """
+    read a sheet as a list of dicts, keys are values of header row
+    @param:
+        file: path of Excel file
+        sheet: name or index of sheet
+        header: index(from 1) of header row, rows above it are ignored
+    @return:
+        list: [{header: cell, ...}, ...]
+    """
+    sheets = read_sheets(file) if isinstance(sheet, int) else read_sheets(file, [sheet])
+    names = list(sheets)
+    if isinstance(sheet, int):
+        if sheet >= len(names):
+            raise IndexError(f"sheet index {sheet} out of range, {len(names)} sheets in {file}")
+        sheet = names[sheet]
+    if sheet not in sheets:
+        raise KeyError(f"sheet <{sheet}> not found in {file}, available sheets: {names}")
+    rows = sheets[sheet]
+    if len(rows) < header:
+        return []
+    heads = rows[header - 1]
+    return [{k: (row[i] if i < len(row) else None) for i, k in enumerate(heads)} for row in rows[header:]]
+
+
+class CaseTable:
+    def __init__(self, file: str, key: str = "测试用例名称", sheet: (str, int) = 0):
+        """
+        test data of a sheet indexed by case name, reloaded if the file is modified
+        @param:
+            file: path of Excel file
+            key: header of the column with case names
+            sheet: name or index of sheet
+        """
+        self.file = os.path.abspath(file)
+        self.key = key
+        self.sheet = sheet
+        self._mtime = None
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        mtime = os.stat(self.file).st_mtime_ns
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            index = {}
+            for record in read_records(self.file, self.sheet):
+                # the same as reading by xlrd: numbers are float, empty cells are ''
+                record = {k: float(v) if isinstance(v, int) and not isinstance(v, bool) else ("" if v is None else v)
+                          for k, v in record.items()}
+                # the first row wins for duplicated case names
+                index.setdefault(record.get(self.key), record)
+            self._index = index
+            self._mtime = mtime
+            logger.info(f"{len(index)} test cases loaded from <{self.file}>")
+
+    def get(self, case: str):
+        """
+        @param:
+            case: case name
+        @return:
+            dict: test data of case, None if not found
+        """
+        self._load()
+        return self._index.get(case)
+
+    def __contains__(self, case):
+        self._load()
+        return case in self._index
+
+    def __len__(self):
+        self._load()
+        return len(self._index)
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def case_table(file: str, key: str = "测试用例名称", sheet: (str, int) = 0):
+    """
+    @return:
+        CaseTable: shared table of a file, created once for each (file, key, sheet)
+    """
+    name = (os.path.abspath(file), key, sheet)
+    with _tables_lock:
+        if name not in _tables:
+            _tables[name] = CaseTable(file, key, sheet)
+        return _tables[name]
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    for fn in sys.argv[1:]:
+        t1 = time.time()
+        data = read_sheets(fn)
+        print(f"{fn}: {sum(len(x) for x in data.values())} rows of {len(data)} sheets in {time.time() - t1:.3f}s")
@@ -6,6 +6,7 @@ try:
     from common.logger.logger import logger
 except (ImportError, ModuleNotFoundError) as e:
     import logging as logger
+import numpy
 
 
 class Sheet:
@@ -176,6 +177,114 @@ class Sheet:
                 return
             self.__sheet.Range(self.__sheet.Cells(*start), self.__sheet.Cells(*end)).Value = values
 
+    @property
+    def values(self):
+        """
+        return all values of used range by one call
+        @return:
+            list: [[cell, ...], ...], empty cells are None
+        """
+        values = self.__sheet.UsedRange.Value
+        if not isinstance(values, (list, tuple)):
+            return [[values]]
+        return [list(x) for x in values]
+
+    @staticmethod
+    def _typed(column: list):
+        """
+        convert a column to one type: int if all values are integral numbers, float if all values are numbers, else
+        keep values, empty cells(None) are kept
+        """
+        numbers = [x for x in column if x is not None]
+        if not numbers or not all(isinstance(x, (int, float)) and not isinstance(x, bool) for x in numbers):
+            return column
+        if all(float(x).is_integer() for x in numbers):
+            return [None if x is None else int(x) for x in column]
+        return [None if x is None else float(x) for x in column]
+
+    def to_columns(self, header: int = 1, types: dict = None):
+        """
+        read used range by one call and return it by columns
+        @param:
+            header: index(from 1) of header row in used range, rows above it are ignored
+            types(optional): {header: callable}, convert values of a column, columns not in it are typed automatically
+        @return:
+            dict: {header: [value, ...]}
+        """
+        values = self.values
+        if len(values) < header:
+            return {}
+        heads = values[header - 1]
+        rows = values[header:]
+        result = {}
+        for index, head in enumerate(heads):
+            column = [row[index] for row in rows]
+            if types and head in types:
+                result[head] = [None if x is None else types[head](x) for x in column]
+            else:
+                result[head] = self._typed(column)
+        return result
+
+    def to_records(self, header: int = 1, types: dict = None):
+        """
+        read used range by one call and return it by rows
+        @param:
+            see self.to_columns
+        @return:
+            list: [{header: value, ...}, ...]
+        """
+        columns = self.to_columns(header, types)
+        heads = list(columns)
+        return [dict(zip(heads, row)) for row in zip(*columns.values())]
+
+    def to_numpy(self, header: int = 1, dtype=None):
+        """
+        read used range by one call and return data rows as an array
+        @param:
+            header: index(from 1) of header row in used range, 0 for no header
+            dtype(optional): dtype of array, e.g. numpy.float64, empty cells must be converted by caller if it's numeric
+        @return:
+            numpy.ndarray: 2-D array of data rows
+        """
+        values = self.values[header:]
+        return numpy.array(values, dtype=dtype if dtype is not None else object)
+
+    def write_matrix(self, start: (tuple, list), values, chunk: int = 5000):
+        """
+        write a 2-D table in blocks of rows, one call for each block, a very large range written by one call may fail
+        @param:
+            start: position of top-left cell, [row, column]
+            values: list of rows or 2-D numpy.ndarray
+            chunk: number of rows written by one call
+        """
+        if isinstance(values, numpy.ndarray):
+            values = values.tolist()
+        values = [list(x) for x in values]
+        if not values:
+            return
+        width = max(len(x) for x in values)
+        values = [x + [None] * (width - len(x)) for x in values]
+        row, col = start
+        for index in range(0, len(values), chunk):
+            block = values[index:index + chunk]
+            self.write_range([row + index, col], [row + index + len(block) - 1, col + width - 1], block)
+
+    def from_records(self, records: (list, tuple), start: (tuple, list) = (1, 1), header: bool = True, chunk: int = 5000):
+        """
+        write a list of dicts, keys of the first record are header
+        @param:
+            records: [{header: value, ...}, ...]
+            start: position of top-left cell, [row, column]
+            header: True for writing header row
+            chunk: see self.write_matrix
+        """
+        if not records:
+            return
+        heads = list(records[0])
+        values = [heads] if header else []
+        values.extend([record.get(x) for x in heads] for record in records)
+        self.write_matrix(start, values, chunk)
+
 
 if __name__ == "__main__":
     pass
@@ -3,8 +3,10 @@
 
 
 from common.image.image import Image
+from common.image.calibration import Calibration
 
 
 __all__ = [
-    "Image"
+    "Image",
+    "Calibration",
 ]
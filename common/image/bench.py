@@ -0,0 +1,122 @@
+#! /usr/bin/env python
+
+
+
+"""
+micro benchmarks of image preprocessing primitives and color classification on frames of cluster display(1920x720),
+the implementation before lookup tables is kept here as baseline and results of both are checked to be equal
+
+how to use:
+	python -m common.image.bench
+	python -m common.image.bench --repeat 50 --width 1920 --height 720
+"""
+
+import argparse
+import timeit
+import cv2 as cv
+import numpy
+from common.image.image import Image
+
+
+__all__ = [
+	"baseline_multi_threshold",
+	"baseline_histogram",
+	"frame",
+	"run",
+]
+
+
+def baseline_multi_threshold(imgMat, thresholdStep: int = 64, graySet: int = 0):
+	"""
+	Image._multi_threshold before lookup tables, one full image numpy.where for every band
+	"""
+	gray_levels = list(range(256))
+	thresholds = gray_levels[::thresholdStep]
+	for thd1, thd2 in zip(thresholds, thresholds[1:] + [255]):
+		if graySet == 0:
+			if thd1 >= 128:
+				imgMat = numpy.where((imgMat > thd1) & (imgMat <= thd2), thd2, imgMat)
+			elif thd1 < 128 <= thd2:
+				imgMat = numpy.where((imgMat >= thd1) & (imgMat < thd2), (thd1 + thd2) // 2, imgMat)
+			else:
+				imgMat = numpy.where((imgMat >= thd1) & (imgMat < thd2), thd1, imgMat)
+		else:
+			if thd2 == 255:
+				imgMat = numpy.where((imgMat >= thd1) & (imgMat <= thd2), (thd1 + thd2) // 2, imgMat)
+			else:
+				imgMat = numpy.where((imgMat >= thd1) & (imgMat < thd2), (thd1 + thd2) // 2, imgMat)
+	return imgMat
+
+
+def baseline_histogram(img):
+	"""
+	Image.histogram before returning numpy.ndarray, gray level 255 was not counted
+	"""
+	Histogram = cv.calcHist([img], [0], None, [256], [0, 255])
+	return [int(x) for x in Histogram.ravel()]
+
+
+def frame(width: int = 1920, height: int = 720, seed: int = 0):
+	"""
+	a synthetic frame like a cluster display: dark background, smooth gradients and bright telltales with noise
+	@return:
+		numpy.ndarray: BGR image
+	"""
+	rng = numpy.random.default_rng(seed)
+	x = numpy.linspace(0, 1, width, dtype=numpy.float32)
+	y = numpy.linspace(0, 1, height, dtype=numpy.float32)[:, None]
+	base = (40 + 120 * x * y)[..., None] * numpy.array([1.0, 0.8, 0.6], numpy.float32)
+	img = numpy.clip(base + rng.normal(0, 8, (height, width, 3)), 0, 255).astype(numpy.uint8)
+	for _ in range(40):
+		cx, cy, r = int(rng.integers(0, width)), int(rng.integers(0, height)), int(rng.integers(10, 40))
+		cv.circle(img, (cx, cy), r, [int(v) for v in rng.integers(0, 256, 3)], -1)
+	return img
+
+
+def run(repeat: int = 20, width: int = 1920, height: int = 720):
+	"""
+	@param:
+		repeat: number of calls measured for every case, the best of 3 runs is reported
+		width: width of frame
+		height: height of frame
+	@return:
+		list: [(name, ms per call), ...]
+	"""
+	img = frame(width, height)
+	gray = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
+	engine = Image()
+	for step in (16, 32, 64, 100):
+		for graySet in (0, 1):
+			assert numpy.array_equal(engine._multi_threshold(gray, step, graySet), baseline_multi_threshold(gray, step, graySet))
+	hist = engine.histogram(img)
+	assert hist[:255].tolist() == baseline_histogram(gray)[:255] and hist.sum() == gray.size
+
+	cases = [
+		("cvtColor BGR2GRAY", lambda: cv.cvtColor(img, cv.COLOR_BGR2GRAY)),
+		("multi_threshold(64) baseline", lambda: baseline_multi_threshold(gray, 64, 0)),
+		("multi_threshold(64) lut", lambda: engine._multi_threshold(gray, 64, 0)),
+		("multi_threshold(16) baseline", lambda: baseline_multi_threshold(gray, 16, 1)),
+		("multi_threshold(16) lut", lambda: engine._multi_threshold(gray, 16, 1)),
+		("remove_background", lambda: engine.remove_background(img, 128)),
+		("remove_background reverse", lambda: engine.remove_background(img, 128, True)),
+		("histogram baseline", lambda: baseline_histogram(gray)),
+		("histogram ndarray", lambda: engine.histogram(gray)),
+		("get_color", lambda: engine.get_color(img, method=1, rmBackground=False)),
+		("colored_match", lambda: engine.colored_match(img[:360, :360], img[:360, :360])),
+	]
+	results = []
+	for name, func in cases:
+		best = min(timeit.repeat(func, number=repeat, repeat=3)) / repeat
+		results.append((name, best * 1e3))
+	return results
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="micro benchmarks of image preprocessing")
+	parser.add_argument("--repeat", type=int, default=20, help="calls measured for every case")
+	parser.add_argument("--width", type=int, default=1920)
+	parser.add_argument("--height", type=int, default=720)
+	args = parser.parse_args()
+	print(f"{'case':<32}{'ms':>10}")
+	for name, ms in run(args.repeat, args.width, args.height):
+		print(f"{name:<32}{ms:>10.3f}")
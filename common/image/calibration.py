@@ -0,0 +1,196 @@
+#! /usr/bin/env python
+
+
+
+"""
+perspective calibration for display captured by camera
+
+the display is detected once as a quadrangle, a homography from the quadrangle to the real display resolution is
+calculated and saved to disk together with a fingerprint of camera and resolutions. as long as the fingerprint does not
+change, the calibration is loaded from disk and display detection is skipped.
+a remap table is precomputed from the homography, so rectifying a frame costs one cv.remap call.
+
+how to use:
+    from common.image.calibration import Calibration
+
+    cal = Calibration(file="D:/xxx/calibration.json", resolution=(1920, 720))
+    fp = cal.make_fingerprint(camera="camera", frameShape=frame.shape)
+    if not cal.load(fp):
+        cal.compute(Image().detect_display_quad(frame, (1920, 720)), fp)
+        cal.save()
+    display = cal.rectify(frame)  # 1920 x 720 image of display
+"""
+
+try:
+    from common.logger.logger import logger
+except (ImportError, ModuleNotFoundError) as e:
+    import logging as logger
+import cv2 as cv
+import numpy
+import json
+import os
+import time
+
+
+__all__ = [
+    "Calibration"
+]
+
+
+# increase this version if the format of calibration file or the way to calculate homography changed
+CALIBRATION_VERSION = 1
+
+
+class Calibration:
+    def __init__(self, file: str, resolution: (list, tuple)):
+        """
+        class init
+        @param:
+            file: absolute path of calibration file(.json)
+            resolution: resolution of real display, not camera resolution
+        """
+        self.file = file
+        self.resolution = (int(resolution[0]), int(resolution[1]))
+        self.fingerprint = None
+        self.homography = None
+        self.quad = None
+        self._maps = None
+
+    def make_fingerprint(self, camera: (str, int), frameShape: (list, tuple), **kwargs):
+        """
+        create a fingerprint of camera and resolutions, calibration is only valid for the same fingerprint
+        @param:
+            camera: camera type or camera id
+            frameShape: shape of frame from camera, (height, width) or (height, width, channel)
+            kwargs: some other items which invalidate calibration if changed, e.g. camera settings
+        @return:
+            dict: fingerprint
+        """
+        fingerprint = {
+            "version": CALIBRATION_VERSION,
+            "camera": str(camera),
+            "frame": [int(frameShape[1]), int(frameShape[0])],
+            "display": list(self.resolution),
+        }
+        fingerprint.update({str(k): v for k, v in kwargs.items()})
+        return fingerprint
+
+    @property
+    def valid(self):
+        return self.homography is not None and self._maps is not None
+
+    @property
+    def box(self):
+        """
+        axis aligned bounding box of display in camera frame, used by code which still cuts display directly
+        @return:
+            tuple: (sx, sy, ex, ey)
+        """
+        if self.quad is None:
+            return None
+        xs, ys = self.quad[:, 0], self.quad[:, 1]
+        return int(numpy.min(xs)), int(numpy.min(ys)), int(numpy.max(xs)), int(numpy.max(ys))
+
+    def load(self, fingerprint: dict):
+        """
+        load calibration from file if fingerprint matched
+        @param:
+            fingerprint: current fingerprint, see self.make_fingerprint
+        @return:
+            bool: True for calibration loaded, False for calibration not available or out of date
+        """
+        if not self.file or not os.path.exists(self.file):
+            logger.info(f"calibration file <{self.file}> not exists, display must be detected")
+            return False
+        try:
+            with open(self.file, 'r', encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("fingerprint") != fingerprint:
+                logger.info(f"calibration <{self.file}> is out of date: saved={data.get('fingerprint')}, current={fingerprint}")
+                return False
+            homography = numpy.array(data["homography"], dtype=numpy.float64).reshape(3, 3)
+            quad = numpy.array(data["quad"], dtype=numpy.float32).reshape(4, 2)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"calibration file <{self.file}> could not be parsed and will be ignored: {e}")
+            return False
+
+        self._apply(homography, quad, fingerprint)
+        logger.info(f"calibration loaded from <{self.file}>, display corners: {self.quad.tolist()}")
+        return True
+
+    def save(self):
+        """
+        save current calibration to file, write to a temp file first then replace, so a broken file never exists
+        """
+        if not self.valid:
+            logger.error(f"no calibration to save, call self.compute first")
+            return
+        folder = os.path.dirname(self.file)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        data = {
+            "fingerprint": self.fingerprint,
+            "homography": self.homography.tolist(),
+            "quad": self.quad.tolist(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        tmp_file = self.file + ".tmp"
+        with open(tmp_file, 'w', encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_file, self.file)
+        logger.info(f"calibration saved to <{self.file}>")
+
+    def compute(self, quad, fingerprint: dict):
+        """
+        calculate homography from display corners to real display resolution
+        @param:
+            quad: 4x2 corners of display in camera frame, order: top-left, top-right, bottom-right, bottom-left
+            fingerprint: current fingerprint, see self.make_fingerprint
+        """
+        quad = numpy.array(quad, dtype=numpy.float32).reshape(4, 2)
+        width, height = self.resolution
+        target = numpy.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=numpy.float32)
+        homography = cv.getPerspectiveTransform(quad, target)
+        self._apply(homography, quad, fingerprint)
+        logger.info(f"calibration computed, display corners: {self.quad.tolist()}")
+
+    def rectify(self, imageMat):
+        """
+        warp a camera frame to a front view of display with real display resolution
+        @param:
+            imageMat: matrix object of camera frame
+        @return:
+            matrix object of display, in size of self.resolution
+        """
+        if not self.valid:
+            raise RuntimeError(f"display is not calibrated, call self.load or self.compute first")
+        return cv.remap(imageMat, self._maps[0], self._maps[1], cv.INTER_LINEAR)
+
+    def _apply(self, homography, quad, fingerprint: dict):
+        """
+        set homography and precompute remap table, for every pixel of display find the source pixel in camera frame
+        """
+        width, height = self.resolution
+        inverse = numpy.linalg.inv(homography)
+        xs, ys = numpy.meshgrid(numpy.arange(width, dtype=numpy.float64), numpy.arange(height, dtype=numpy.float64))
+        denominator = inverse[2, 0] * xs + inverse[2, 1] * ys + inverse[2, 2]
+        map_x = ((inverse[0, 0] * xs + inverse[0, 1] * ys + inverse[0, 2]) / denominator).astype(numpy.float32)
+        map_y = ((inverse[1, 0] * xs + inverse[1, 1] * ys + inverse[1, 2]) / denominator).astype(numpy.float32)
+        # fixed point maps are about twice as fast as float maps in cv.remap
+        self._maps = cv.convertMaps(map_x, map_y, cv.CV_16SC2)
+        self.homography = homography
+        self.quad = quad
+        self.fingerprint = fingerprint
+
+
+if __name__ == "__main__":
+    frame = numpy.zeros((1080, 1920, 3), numpy.uint8)
+    cv.fillConvexPoly(frame, numpy.array([[130, 210], [1790, 180], [1810, 850], [110, 880]], numpy.int32), (255, 255, 255))
+    cal = Calibration(file=os.path.join(os.path.dirname(os.path.abspath(__file__)), "tmp", "calibration.json"), resolution=(1920, 720))
+    fp = cal.make_fingerprint(camera=0, frameShape=frame.shape)
+    from common.image.process import ImageProcessing
+    cal.compute(ImageProcessing.detect_display_quad(frame, (1920, 720)), fp)
+    t1 = time.time()
+    for _ in range(100):
+        cal.rectify(frame)
+    print(f"rectify: {(time.time() - t1) * 10:.3f} ms per frame")
@@ -2,6 +2,37 @@
 
 
 
+"""
+color names of HSV ranges and a classifier labelling every pixel of an image in one pass
+
+every channel(H, S, V) is mapped by a lookup table to a bit mask of colors whose range contains the value, the color
+of a pixel is the first color of the table whose bit is set in all three masks, the same as checking COLOR item by item.
+colors split into several ranges(Red1, Red2) have one label(Red).
+
+how to use:
+    from common.image.color import classify, dominant_colors, LABELS
+
+    labels = classify(cv.cvtColor(imageMat, cv.COLOR_BGR2HSV))  # uint8 label of every pixel
+    LABELS[labels[10, 10]]  # "Red"
+    dominant_colors(labels, (10, 10))  # main color label of every 10x10 block
+"""
+
+import functools
+import cv2 as cv
+import numpy
+import re
+
+
+__all__ = [
+    "COLOR",
+    "LABELS",
+    "OTHER",
+    "classify",
+    "color_areas",
+    "dominant_colors",
+]
+
+
 # scope of H, S, V
 COLOR = {
     "Black":    {"H": (0, 180),     "S": (0, 255),      "V": (0, 59)},
@@ -16,3 +47,81 @@ COLOR = {
     "Blue":     {"H": (100, 124),   "S": (60, 255),     "V": (60, 255)},
     "Purple":   {"H": (125, 155),   "S": (60, 255),     "V": (60, 255)},
 }
+
+# names of labels, "Red1" and "Red2" are "Red", the last one is for pixels out of all ranges
+LABELS = list(dict.fromkeys(re.sub(r"\d+$", "", x) for x in COLOR)) + ["Other"]
+OTHER = len(LABELS) - 1
+
+
+@functools.lru_cache(maxsize=1)
+def _tables():
+    """
+    @return:
+        tuple: (bit masks of H, S, V values, label of every combination of bits)
+    """
+    masks = numpy.zeros((3, 256), numpy.uint16)
+    for index, scope in enumerate(COLOR.values()):
+        for channel, key in enumerate("HSV"):
+            masks[channel, scope[key][0]: scope[key][1] + 1] |= 1 << index
+    bits = numpy.arange(1 << len(COLOR), dtype=numpy.int64)
+    first = numpy.log2(bits & -bits, where=bits > 0, out=numpy.zeros(len(bits))).astype(numpy.int64)
+    names = [LABELS.index(re.sub(r"\d+$", "", x)) for x in COLOR]
+    labels = numpy.where(bits > 0, numpy.array(names)[first], OTHER).astype(numpy.uint8)
+    masks.flags.writeable = False
+    labels.flags.writeable = False
+    return masks, labels
+
+
+def classify(hsvMat):
+    """
+    label every pixel of an image in HSV
+    @param:
+        hsvMat: numpy.ndarray, uint8 image converted by cv.COLOR_BGR2HSV
+    @return:
+        numpy.ndarray: uint8 labels in the same height and width, index of LABELS
+    """
+    masks, labels = _tables()
+    H, S, V = cv.split(hsvMat)
+    bits = cv.bitwise_and(cv.bitwise_and(cv.LUT(H, masks[0]), cv.LUT(S, masks[1])), cv.LUT(V, masks[2]))
+    return numpy.take(labels, bits)
+
+
+def color_areas(labels):
+    """
+    areas of colors in order of their first pixel(row by row)
+    @param:
+        labels: numpy.ndarray, labels from classify()
+    @return:
+        list: [((x, y) of first pixel, name of color, area), ...]
+    """
+    flat = labels.ravel()
+    counts = numpy.bincount(flat, minlength=len(LABELS))
+    found = numpy.flatnonzero(counts).tolist()
+    first = [int(numpy.argmax(flat == c)) for c in found]
+    width = labels.shape[1]
+    areas = sorted(zip(first, found), key=lambda x: (x[1] == OTHER, x[0]))
+    return [((p % width, p // width), LABELS[c], int(counts[c])) for p, c in areas]
+
+
+def dominant_colors(labels, block: (list, tuple)):
+    """
+    main color of every block, the color with the largest area, the one found first(row by row) if areas are equal
+    @param:
+        labels: numpy.ndarray, labels from classify()
+        block: (height, width) of block, pixels out of whole blocks are ignored
+    @return:
+        numpy.ndarray: labels of blocks, shape is (rows of blocks, columns of blocks)
+    """
+    bh, bw = block
+    ny, nx = labels.shape[0] // bh, labels.shape[1] // bw
+    size = bh * bw
+    n = len(LABELS)
+    blocks = labels[:ny * bh, :nx * bw].reshape(ny, bh, nx, bw).swapaxes(1, 2).reshape(ny * nx, size)
+    index = (numpy.arange(ny * nx)[:, None] * n + blocks).ravel()
+    counts = numpy.bincount(index, minlength=ny * nx * n).reshape(ny * nx, n)
+    first = numpy.full(ny * nx * n, size, numpy.int64)
+    numpy.minimum.at(first, index, numpy.tile(numpy.arange(size), ny * nx))
+    first = first.reshape(ny * nx, n)
+    first[:, OTHER] = size
+    score = counts * (size + 1) - first
+    return numpy.argmax(score, axis=1).astype(numpy.uint8).reshape(ny, nx)
@@ -53,11 +53,11 @@ except (ImportError, ModuleNotFoundError) as e:
 	import logging as logger
 import cv2 as cv
 import numpy
+import functools
 import os
 import copy
 import datetime
 from common.image.process import ImageProcessing
-from common.image.tensor import Tensor
 
 
 class Image(ImageProcessing):
@@ -80,12 +80,24 @@ class Image(ImageProcessing):
 		"""
 		super().__init__()
 		if train_data_path and os.path.exists(train_data_path):
-			self.__tf = Tensor(train_data_path, model_path, project, train_pct, model_name)
+			# tensorflow is imported and model is loaded at the first prediction
+			self.__tfArgs = (train_data_path, model_path, project, train_pct, model_name)
 		else:
 			logger.warning(f"'train_data_path' must be set before initializing tensorflow engine")
-			self.__tf = None
+			self.__tfArgs = None
+		self.__tfEngine = None
 		self.templateMethods = [cv.TM_SQDIFF_NORMED, cv.TM_CCORR_NORMED, cv.TM_CCOEFF_NORMED]
 
+	@property
+	def __tf(self):
+		"""
+		tensorflow engine, created at the first use, None if 'train_data_path' not available
+		"""
+		if self.__tfEngine is None and self.__tfArgs is not None:
+			from common.image.tensor import Tensor
+			self.__tfEngine = Tensor(*self.__tfArgs)
+		return self.__tfEngine
+
 	def compare2(self, targetImg, tmpImg, gray: bool = True, **kwargs):
 		"""
 		compare two images using feature detect and some other algorithms, not pixel by pixel
@@ -470,12 +482,9 @@ class Image(ImageProcessing):
 		"""
 		img = cv.imdecode(numpy.fromfile(image, dtype=numpy.uint8), cv.IMREAD_COLOR) if isinstance(image, str) and os.path.exists(image) else image
 		shape = img.shape
-		img_mask = copy.deepcopy(img)
-		if len(shape) == 3 and shape[2] == 3:
-			img_mask = cv.cvtColor(img_mask, cv.COLOR_BGR2GRAY)
-		ret, img_mask = cv.threshold(img_mask, threshold, 255, cv.THRESH_BINARY)
-		if reverse:
-			img_mask = cv.bitwise_not(img_mask)
+		img_mask = cv.cvtColor(img, cv.COLOR_BGR2GRAY) if len(shape) == 3 and shape[2] == 3 else img
+		# THRESH_BINARY_INV is the same as bitwise_not of THRESH_BINARY, without one more pass
+		ret, img_mask = cv.threshold(img_mask, threshold, 255, cv.THRESH_BINARY_INV if reverse else cv.THRESH_BINARY)
 		img = cv.bitwise_and(img, img, mask=img_mask)
 
 		return img
@@ -768,7 +777,7 @@ class Image(ImageProcessing):
 			start_y = y - selectedTargetPoint[1]
 			end_x = start_x + tmpImgShape[1]
 			end_y = start_y + tmpImgShape[0]
-			if not self.__check_border(targetImgColor.shape, [start_x, start_y, end_x, end_y]):
+			if not self.__check_border(targetImgColor.shape, [start_x, start_y, end_x, end_y], warn=False):
 				continue
 			tmpImg = self.cut(targetImgColor, start_x, start_y, end_x, end_y)
 			matchRes = self._matrix_match(tmpImg, tmpImgColor, offset=offset)
@@ -835,7 +844,7 @@ class Image(ImageProcessing):
 		is 63 then it will be set to 0, and 2 to 0, 90 to 64, 127 to 64, 150 to 196, 200 to 255 and etc.
 		the main purpose of this method is to reduce the count of gray level and disperse original gray levels to newly created gray levels
 		@param:
-			imgMat: matrix object of image
+			imgMat: matrix object of image, gray levels are mapped by a cached lookup table in one pass
 			thresholdStep: step for threshold list, from 0 to 255
 			graySet: 0 for set gray value to the nearest lower threshold if the gray value was smaller than 128,
 						else set gray value to the nearest upper threshold
@@ -850,6 +859,20 @@ class Image(ImageProcessing):
 			logger.error(f"only image in gray scale could be used for calculating multi threshold")
 			return
 
+		lut = self._threshold_lut(thresholdStep, graySet)
+		if imgMat.dtype == numpy.uint8:
+			return cv.LUT(imgMat, lut)
+		return lut[numpy.clip(imgMat, 0, 255).astype(numpy.uint8)]
+
+	@staticmethod
+	@functools.lru_cache(maxsize=32)
+	def _threshold_lut(thresholdStep: int = 64, graySet: int = 0):
+		"""
+		lookup table of self._multi_threshold, gray levels are mapped band by band, the same as mapping images before
+		@return:
+			numpy.ndarray: 256 gray levels mapped, read only
+		"""
+		imgMat = numpy.arange(256, dtype=numpy.uint8)
 		gray_levels = list(range(256))
 		thresholds = gray_levels[::thresholdStep]
 		for thd1, thd2 in zip(thresholds, thresholds[1:] + [255]):
@@ -865,8 +888,9 @@ class Image(ImageProcessing):
 					imgMat = numpy.where((imgMat >= thd1) & (imgMat <= thd2), (thd1 + thd2) // 2, imgMat)
 				else:
 					imgMat = numpy.where((imgMat >= thd1) & (imgMat < thd2), (thd1 + thd2) // 2, imgMat)
-
-		return imgMat
+		lut = imgMat.astype(numpy.uint8)
+		lut.flags.writeable = False
+		return lut
 
 	def cut(self, image, sx: int, sy: int, ex: int, ey: int, file: str = None):
 		"""
@@ -914,12 +938,13 @@ class Image(ImageProcessing):
 		return targetImg, tmpImg
 
 	@staticmethod
-	def __check_border(imgShape: tuple, border: list) -> bool:
+	def __check_border(imgShape: tuple, border: list, warn: bool = True) -> bool:
 		"""
 		check if the border of a area is available or not
 		@param:
 			imgShape: shape of image
 			border: a list stores coordinates for a rectangle: [start_x, start_y, end_x, end_y]
+			warn: False for no warning, used in loops which check a lot of candidate areas
 		@return:
 			bool, True means border is available, False means border is not available
 		"""
@@ -930,14 +955,17 @@ class Image(ImageProcessing):
 		width = imgShape[1]
 		height = imgShape[0]
 		if len(b) != 4 and not all([isinstance(x, int) for x in b]):
-			logger.warning(f"coordinates are not available: {b}")
+			if warn:
+				logger.warning(f"coordinates are not available: {b}")
 			return False
 		if (b[0] < 0 or b[1] < 0 or b[2] < 0 or b[3] < 0) \
 			or (b[0] > width or b[2] > width or b[1] > height or b[3] > height):
-			logger.warning(f"border overflowed: {b}")
+			if warn:
+				logger.warning(f"border overflowed: {b}")
 			return False
 		if b[0] >= b[2] or b[1] >= b[3]:
-			logger.warning(f"selected area must be a rectangle")
+			if warn:
+				logger.warning(f"selected area must be a rectangle")
 			return False
 		return True
 
@@ -1022,18 +1050,15 @@ class Image(ImageProcessing):
 		@param:
 			image: absolute path of image or matrix object of image
 		@return:
-			list: a list of histogram
+			numpy.ndarray: count of points for every gray level 0-255
 		"""
 		img = cv.imdecode(numpy.fromfile(image, dtype=numpy.uint8), cv.IMREAD_COLOR) if isinstance(image, str) and os.path.exists(image) else image
 		shape = img.shape
 		if len(shape) == 3:
 			img = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
 
-		# calculate histogram of image
-		Histogram = cv.calcHist([img], [0], None, [256], [0, 255])
-		Histogram = [int(x[0]) for i, x in enumerate(Histogram)]
-
-		return Histogram
+		# calculate histogram of image, upper bound of range is exclusive, so [0, 256] for counting gray level 255 too
+		return cv.calcHist([img], [0], None, [256], [0, 256]).ravel().astype(numpy.int64)
 
 
 if __name__ == "__main__":
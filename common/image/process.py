@@ -17,7 +17,7 @@ import copy
 from skimage import feature
 from skimage import metrics
 from skimage import filters
-from common.image.color import COLOR
+from common.image.color import LABELS, OTHER, classify, color_areas, dominant_colors
 
 
 class ImageProcessing:
@@ -217,6 +217,59 @@ class ImageProcessing:
             ret = display_location[0]
         return ret
 
+    @staticmethod
+    def detect_display_quad(imageMat, resolution: (list, tuple)):
+        """
+        detect the four corners of display, unlike self.detect_display the corners are not aligned to image axes, so the
+        tilt of camera is kept and could be corrected by a perspective transform
+        @param:
+            imageMat: matrix object of image
+            resolution: resolution of real display, not camera resolution
+        @return:
+            numpy.ndarray: 4x2 float32 corners in order of top-left, top-right, bottom-right, bottom-left
+            None: display not found
+        """
+        height, width = imageMat.shape[:2]
+        if len(imageMat.shape) == 3:
+            imageMat = cv.cvtColor(imageMat, cv.COLOR_BGR2GRAY)
+
+        # same morphology as self.detect_display, keep both methods detecting the same area
+        kernel = numpy.ones((20, 20), numpy.uint8)
+        open_img = cv.morphologyEx(imageMat, cv.MORPH_OPEN, kernel)
+        ret, threshold_img = cv.threshold(open_img, 20, 255, cv.THRESH_BINARY)
+        kernel = numpy.ones((30, 30), numpy.uint8)
+        edge_img1 = cv.morphologyEx(threshold_img, cv.MORPH_CLOSE, kernel)
+        edge_img2 = cv.morphologyEx(edge_img1, cv.MORPH_OPEN, kernel)
+        contours, hierarchy = cv.findContours(edge_img2, cv.RETR_TREE, cv.CHAIN_APPROX_SIMPLE)
+
+        for contour in sorted(contours, key=cv.contourArea, reverse=True):
+            if cv.contourArea(contour) / (height * width) < 0.3:
+                break
+            # prefer a real quadrangle, fall back to the rotated bounding box of contour
+            approx = cv.approxPolyDP(contour, 0.02 * cv.arcLength(contour, True), True)
+            if len(approx) == 4:
+                points = approx.reshape(4, 2).astype(numpy.float32)
+            else:
+                points = cv.boxPoints(cv.minAreaRect(contour)).astype(numpy.float32)
+            if points[:, 0].min() < 0 or points[:, 0].max() > width or points[:, 1].min() < 0 or points[:, 1].max() > height:
+                continue
+
+            # order corners: top-left has the smallest x+y, bottom-right the largest, top-right the smallest y-x
+            s = points.sum(axis=1)
+            d = numpy.diff(points, axis=1).ravel()
+            quad = numpy.array([points[numpy.argmin(s)], points[numpy.argmin(d)], points[numpy.argmax(s)], points[numpy.argmax(d)]], dtype=numpy.float32)
+            w = (numpy.linalg.norm(quad[1] - quad[0]) + numpy.linalg.norm(quad[2] - quad[3])) / 2
+            h = (numpy.linalg.norm(quad[3] - quad[0]) + numpy.linalg.norm(quad[2] - quad[1])) / 2
+            if h <= 0 or w <= 0:
+                continue
+            length_width_pct = (h / w) / (resolution[1] / resolution[0])
+            if length_width_pct < 0.2 or length_width_pct > 3:
+                continue
+            return quad
+
+        logger.warning(f"can not locate the corners of display")
+        return None
+
     @staticmethod
     def resize_display(imageMat, resolution: (list, tuple), pt: (list, tuple) = None):
         """
@@ -240,7 +293,7 @@ class ImageProcessing:
         @param:
             targetImgMat: numpy.ndarray, matrix object of target image
             templateImgMat: numpy.ndarray, matrix object of template image
-            threshold: the threshold for color similarity
+            threshold: the threshold for color similarity in percent, 0-100
         @return:
             bool: True if two images have the same color
                 False if two images have different color
@@ -249,18 +302,13 @@ class ImageProcessing:
             logger.error(f"target image and template image must be colored image")
             return 0
         targetImgMatBin, templateImgMatBin, targetImgMatColor, templateImgMatColor = self.auto_resize(targetImgMat, templateImgMat, (200, 200))
-        colorDiffCnt = 0
-        for index1 in range(0, 200, 10):
-            for index2 in range(0, 200, 10):
-                tgBlock = targetImgMatColor[index1: index1 + 10, index2: index2 + 10]
-                tpBlock = templateImgMatColor[index1: index1 + 10, index2: index2 + 10]
-                tgColor = self.get_color(tgBlock, method=2, rmBackground=False)
-                tpColor = self.get_color(tpBlock, method=2, rmBackground=False)
-                if tgColor != tpColor:
-                    colorDiffCnt += 1
-        simi = 1 - round(colorDiffCnt / 400, 4)
+        # main color of every 10x10 block, all pixels are labelled in one pass
+        tgColor = dominant_colors(classify(cv.cvtColor(targetImgMatColor, cv.COLOR_BGR2HSV)), (10, 10))
+        tpColor = dominant_colors(classify(cv.cvtColor(templateImgMatColor, cv.COLOR_BGR2HSV)), (10, 10))
+        colorDiffCnt = int(numpy.count_nonzero(tgColor != tpColor))
+        simi = 1 - round(colorDiffCnt / tgColor.size, 4)
         logger.info(f"color similarity of two images are: {simi}")
-        return simi >= threshold
+        return simi * 100 >= threshold
 
     @staticmethod
     def auto_resize(targetImgMat, templateImgMat, size: tuple = None, rmBackground: bool = False):
@@ -336,79 +384,33 @@ class ImageProcessing:
         if len(imageMat.shape) != 3:
             logger.error(f"image in gray scale could not retrieve color name")
             return None
-        width, height = imageMat.shape[:2]
+        height, width = imageMat.shape[:2]
         if rmBackground:
-            img_mask = copy.deepcopy(imageMat)
-            img_mask = cv.cvtColor(img_mask, cv.COLOR_BGR2GRAY)
+            img_mask = cv.cvtColor(imageMat, cv.COLOR_BGR2GRAY)
             ret, img_mask = cv.threshold(img_mask, threshold, 255, cv.THRESH_BINARY)
             imageMat = cv.bitwise_and(imageMat, imageMat, mask=img_mask)
-        imageMat = cv.cvtColor(imageMat, cv.COLOR_BGR2HSV)
         if scope and all([isinstance(x, int) for x in scope]):
             if len(scope) == 2:
                 x, y = scope
                 if x < 0 or y < 0 or x >= width or y >= height:
                     logger.error(f"specified coordinate overflowed: <image shape={width}x{height}, coordinate={x}x{y}>")
                     return None
-                H, S, V = imageMat[y, x]
-                for c_name, c_value in COLOR.items():
-                    if c_value["H"][0] <= H <= c_value["H"][1] and c_value['S'][0] <= S <= c_value["S"][1] and c_value["V"][0] <= V <= c_value["V"][1]:
-                        return c_name if c_name not in ("Red1", "Red2") else "Red"
-                logger.warning(f"could not match a color name with point: coordinate=<{x}, {y}>, BGR={B},{G},{R}")
-                return None
+                label = classify(cv.cvtColor(imageMat[y: y + 1, x: x + 1], cv.COLOR_BGR2HSV))[0, 0]
+                if label == OTHER:
+                    B, G, R = imageMat[y, x]
+                    logger.warning(f"could not match a color name with point: coordinate=<{x}, {y}>, BGR={B},{G},{R}")
+                    return None
+                return LABELS[label]
             elif len(scope) == 4:
                 x1, y1, x2, y2 = scope
-                if x1 >= x2 or x1 < 0 or x2 < 0 or x1 >= width or x2 >= width:
+                if x1 >= x2 or x1 < 0 or x2 < 0 or x1 >= width or x2 > width:
                     logger.warning(f"specified scope overflowed: <image shape={width}x{height}, scope=({x1}, {y1}), ({x2}, {y2})>")
-                elif y1 >= y2 or y1 < 0 or y2 < 0 or y1 >= height or y2 >= height:
+                elif y1 >= y2 or y1 < 0 or y2 < 0 or y1 >= height or y2 > height:
                     logger.warning(f"specified scope overflowed: <image shape={width}x{height}, scope=({x1}, {y1}), ({x2}, {y2})>")
                 else:
                     imageMat = imageMat[y1: y2, x1: x2]
-                    width, height = imageMat.shape[:2]
-        imgH, imgS, imgV = cv.split(imageMat)
-        colors = COLOR.keys()
-        color_area = []
-        color_location_mat = numpy.zeros((width, height), numpy.uint8)
-        for index, c in enumerate(colors):
-            scopeH, scopeS, scopeV = COLOR[c]["H"], COLOR[c]["S"], COLOR[c]["V"]
-            imgHT = numpy.where((imgH >= scopeH[0]) & (imgH <= scopeH[1]), 1, 0)
-            imgST = numpy.where((imgS >= scopeS[0]) & (imgS <= scopeS[1]), 1, 0)
-            imgVT = numpy.where((imgV >= scopeV[0]) & (imgV <= scopeV[1]), 1, 0)
-            imgT = numpy.bitwise_and(imgHT, imgST)
-            imgT = numpy.bitwise_and(imgT, imgVT)
-            y, x = numpy.where(imgT > 0)
-            if len(x) == 0:
-                # color_area.append([None, c, 0])
-                continue
-            color_area.append([(x[0], y[0]), c, len(x)])
-            color_location_mat[y[0], x[0]] = 1
-        colored_area_sum = sum([x[-1] for x in color_area])
-        if width * height - colored_area_sum > 0:
-            color_area.append([None, "Other", width * height - colored_area_sum])
-        pointY, pointX = numpy.where(color_location_mat > 0)
-        points = list(zip(pointX, pointY))
-        color_area_tmp = []
-        for p in points:
-            for loc, cn, area in color_area:
-                if p == loc:
-                    color_area_tmp.append((loc, cn, area))
-                    break
-        for loc, cn, area in color_area:
-            if (loc, cn, area) not in color_area_tmp:
-                color_area_tmp.append((loc, cn, area))
-        red = []
-        for index in range(len(color_area_tmp)):
-            loc, cn, area = color_area_tmp[index]
-            if cn in ("Red1", "Red2"):
-                red.append([index, (loc, "Red", area)])
-        if len(red) == 0:
-            pass
-        elif len(red) == 1:
-            color_area_tmp = color_area_tmp[:red[0][0]] + red[0][1:] + color_area_tmp[red[0][0] + 1:]
-        elif len(red) == 2:
-            color_area_tmp = color_area_tmp[:red[0][0]] \
-                             + [(red[0][1][0], "Red", red[0][1][2] + red[1][1][2])] \
-                             + color_area_tmp[red[0][0] + 1: red[1][0]] \
-                             + color_area_tmp[red[1][0] + 1:]
+        # label of every pixel by lookup tables, areas in order of first pixel of colors
+        color_area_tmp = color_areas(classify(cv.cvtColor(imageMat, cv.COLOR_BGR2HSV)))
 
         logger.debug(f"color sequence of image: {color_area_tmp}")
         color_area_tmp_tmp = [x[1:] for x in color_area_tmp]
@@ -420,7 +422,7 @@ class ImageProcessing:
         elif method == 2:
             return color_area_tmp_tmp[0][0]
         elif method == 3:
-            return color_area_tmp_tmp[1][0]
+            return color_area_tmp_tmp[1][0] if len(color_area_tmp_tmp) > 1 else None
         elif method == 4:
             for cn, area in color_area_tmp_tmp:
                 if cn != "Black":
@@ -1,25 +1,128 @@
-from PIL import Image, ImageChops
+from PIL import Image
 from common.logger.logger import logger
+from collections import namedtuple
+import functools
 import pytesseract
+import cv2
+import numpy
+import os
+
+
+CompareResult = namedtuple("CompareResult", ["diff", "total", "bbox", "similarity"])
+CompareResult.__doc__ = """
+对比结果
+diff: 存在差异的像素数
+total: 参与对比的像素数
+bbox: 差异区域start_x, start_y, end_x, end_y(不含end),无差异时为None
+similarity: 相同像素占比,0-1
+"""
+
+
+@functools.lru_cache(maxsize=64)
+def _decode(path:str,mtime:int,size:int):
+    """
+    解码图片,按路径、修改时间和大小缓存,图片文件被修改后重新解码
+    """
+    image = cv2.imdecode(numpy.fromfile(path, numpy.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("{}不是可识别的图片".format(path))
+    image.flags.writeable = False #缓存的图片被多个用例共享,不允许修改
+    return image
 
 
 class Images():
     """
     图片相关操作
+    图片可以是图片地址或numpy数组(BGR格式,如CaptureService的截图),同一图片文件只解码一次,参数化用例共用解码结果
+    区域对比在一次向量化运算中完成,对比结果包含差异像素数、差异区域和相似度,可设置像素容差
     """
+    @staticmethod
+    def load(images):
+        """
+        获取图片矩阵,灰度图和带透明通道的图片(如32位bmp)均转为3通道,两张图片总是可以逐像素对比
+        parame: images: 图片地址或numpy数组(BGR、BGRA或灰度)
+        return: image: numpy数组(BGR格式),来自缓存的数组为只读,需要修改时先copy()
+        """
+        if isinstance(images, numpy.ndarray):
+            if images.ndim == 2:
+                return cv2.cvtColor(images, cv2.COLOR_GRAY2BGR)
+            if images.shape[2] == 4:
+                return cv2.cvtColor(images, cv2.COLOR_BGRA2BGR)
+            return images
+        if isinstance(images, Image.Image):
+            return cv2.cvtColor(numpy.asarray(images.convert("RGB")), cv2.COLOR_RGB2BGR)
+        path = os.path.abspath(images)
+        stat = os.stat(path)
+        return _decode(path, stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def cache_info():
+        """
+        return: 图片缓存命中情况,hits, misses, maxsize, currsize
+        """
+        return _decode.cache_info()
+
+    @classmethod
+    def open_image(cls,images):
+        """
+        打开图片
+        parame: images: 图片地址或numpy数组
+        return: image: PIL图片(RGB格式),不论来源是截图还是32位bmp文件
+        """
+        return Image.fromarray(cv2.cvtColor(cls.load(images), cv2.COLOR_BGR2RGB))
+
+    def compare(self,expect_images,actal_images,include:(list, tuple)=None,exclude:(list, tuple)=None,tolerance:int=0):
+        """
+        对比两张图片,只对比include区域内且exclude区域外的像素
+        parame: expect_images: 图片地址或numpy数组
+        parame: actal_images: 图片地址或numpy数组
+        parame: include: 对比的区域,一个区域start_x, start_y, end_x, end_y或多个区域的列表,None为整张图片
+        parame: exclude: 不对比的区域,一个区域或多个区域的列表
+        parame: tolerance: 像素容差,各通道差值均不大于容差的像素视为相同
+        return: compare_result: CompareResult,差异区域为整张图片上的坐标
+        """
+        expect_image = self.load(expect_images)
+        actal_image = self.load(actal_images)
+        if expect_image.shape != actal_image.shape:
+            raise ValueError("图片尺寸不一致:{}和{}".format(expect_image.shape, actal_image.shape))
+        height, width = expect_image.shape[:2]
+        include = self._regions(include) or [(0, 0, width, height)]
+        exclude = self._regions(exclude)
+        # 只在包含所有对比区域的最小矩形内计算
+        x1 = max(0, min(x[0] for x in include))
+        y1 = max(0, min(x[1] for x in include))
+        x2 = min(width, max(x[2] for x in include))
+        y2 = min(height, max(x[3] for x in include))
+        if x1 >= x2 or y1 >= y2:
+            return CompareResult(0, 0, None, 1.0)
+        mask = numpy.zeros((y2 - y1, x2 - x1), bool)
+        for area in include:
+            mask[max(area[1] - y1, 0):max(area[3] - y1, 0), max(area[0] - x1, 0):max(area[2] - x1, 0)] = True
+        for area in exclude:
+            mask[max(area[1] - y1, 0):max(area[3] - y1, 0), max(area[0] - x1, 0):max(area[2] - x1, 0)] = False
+        diff = cv2.absdiff(expect_image[y1:y2, x1:x2], actal_image[y1:y2, x1:x2])
+        if diff.ndim == 3:
+            diff = diff.max(axis=2)
+        different = (diff > tolerance) & mask
+        total = int(numpy.count_nonzero(mask))
+        count = int(numpy.count_nonzero(different))
+        bbox = None
+        if count:
+            rows = numpy.flatnonzero(different.any(axis=1))
+            cols = numpy.flatnonzero(different.any(axis=0))
+            bbox = (x1 + int(cols[0]), y1 + int(rows[0]), x1 + int(cols[-1]) + 1, y1 + int(rows[-1]) + 1)
+        return CompareResult(count, total, bbox, 1 - count / total if total else 1.0)
+
     def compare_by_matrix(self,expect_images:str,actal_images:str):
         """
         对比两张图片是否完全相同
-        parame: expect_images: 图片地址
-        parame: actal_images: 图片地址
+        parame: expect_images: 图片地址或numpy数组
+        parame: actal_images: 图片地址或numpy数组
         return: compare_result: 对比结果若为None则两张图片完全相同,若返回元组则两张图片存在差异
         """
         try:
-            expect_image = Image.open(expect_images)
-            actal_image = Image.open(actal_images)
-            diff = ImageChops.difference(expect_image,actal_image)
-            compare_result = diff.getbbox()
-            logger.info("{}和{}两张图片对比结果为：{}".format(expect_images,actal_images,compare_result))
+            compare_result = self.compare(expect_images,actal_images).bbox
+            logger.info("{}和{}两张图片对比结果为：{}".format(self._name(expect_images),self._name(actal_images),compare_result))
             return compare_result
         except Exception as e:
             logger.error(e)
@@ -27,20 +130,15 @@ class Images():
 
     def compare_by_matrix_exclude(self,expect_images:str,actal_images:str,position:tuple):
         """
-        对比两张图片指定位置以外区域是否完全相同,方法是将不需要区域设置成存白色,再进行对比
-        parame: expect_images: 图片地址
-        parame: actal_images: 图片地址
+        对比两张图片指定位置以外区域是否完全相同
+        parame: expect_images: 图片地址或numpy数组
+        parame: actal_images: 图片地址或numpy数组
         parame: position: 不对比的区域start_x, start_y, end_x, end_y
         return: compare_result: 对比结果若为None则两张图片完全相同,若返回元组则两张图片存在差异
         """
         try:
-            expect_image = Image.open(expect_images)
-            actal_image = Image.open(actal_images)
-            expect_images_exclude=self.set_area_to_white(expect_image,position)
-            actal_images_exclude=self.set_area_to_white(actal_image,position)
-            diff = ImageChops.difference(expect_images_exclude,actal_images_exclude)
-            compare_result = diff.getbbox()
-            logger.info("{}和{}两张图片指定区域{}以外的对比结果为{}".format(expect_images,actal_images,position,compare_result))
+            compare_result = self.compare(expect_images,actal_images,exclude=position).bbox
+            logger.info("{}和{}两张图片指定区域{}以外的对比结果为{}".format(self._name(expect_images),self._name(actal_images),position,compare_result))
             return compare_result
         except Exception as e:
             logger.error(e)
@@ -49,19 +147,16 @@ class Images():
     def compare_by_matrix_in_same_area(self,expect_images:str,actal_images:str,position:tuple):
         """
         对比两张图片指定区域是否完全相同
-        parame: expect_images: 图片地址
-        parame: actal_images: 图片地址
+        parame: expect_images: 图片地址或numpy数组
+        parame: actal_images: 图片地址或numpy数组
         parame: position: 对比的区域start_x, start_y, end_x, end_y
-        return: compare_result: 对比结果若为None则两张图片完全相同,若返回元组则两张图片存在差异
+        return: compare_result: 对比结果若为None则两张图片完全相同,若返回元组则两张图片存在差异,坐标相对于对比区域
         """
         try:
-            expect_image = Image.open(expect_images)
-            actal_image = Image.open(actal_images)
-            expect_images_area=expect_image.crop(position)
-            actal_images_area=actal_image.crop(position)
-            diff = ImageChops.difference(expect_images_area,actal_images_area)
-            compare_result = diff.getbbox()
-            logger.info("{}和{}两张图片指定区域{}的对比结果为{}".format(expect_images,actal_images,position,compare_result))
+            bbox = self.compare(expect_images,actal_images,include=position).bbox
+            x, y = self._regions(position)[0][:2]
+            compare_result = None if bbox is None else (bbox[0] - x, bbox[1] - y, bbox[2] - x, bbox[3] - y)
+            logger.info("{}和{}两张图片指定区域{}的对比结果为{}".format(self._name(expect_images),self._name(actal_images),position,compare_result))
             return compare_result
         except Exception as e:
             logger.error(e)
@@ -70,19 +165,40 @@ class Images():
     def set_area_to_white(self,images:str,position:tuple):
         """
         将指定区域设置成白色
-        parame: images: 图片地址
+        parame: images: 图片地址或numpy数组
         parame: position: 设置成白色背景的区域start_x, start_y, end_x, end_y
+        return: image: 新的numpy数组,原图片不变
         """
         try:
-            image = Image.open(images)
-            white_background = Image.new('RGB', image.size, (255, 255, 255))
-            image.paste(white_background.crop(position), position)
-            image.show()
-            logger.info("{}图片指定区域{}成功设置为白色背景".format(images,position))
+            image = self.load(images).copy()
+            x1, y1, x2, y2 = self._regions(position)[0]
+            image[y1:y2, x1:x2] = 255
+            logger.info("{}图片指定区域{}成功设置为白色背景".format(self._name(images),position))
+            return image
         except Exception as e:
             logger.error(e)
             raise
-        
+
+    @staticmethod
+    def _regions(regions):
+        """
+        区域统一为整数坐标的列表,excel中读取的坐标为浮点数
+        parame: regions: 一个区域start_x, start_y, end_x, end_y或多个区域的列表,None为没有区域
+        return: regions: [(start_x, start_y, end_x, end_y), ...]
+        """
+        if regions is None:
+            return []
+        if numpy.isscalar(regions[0]):
+            regions = [regions]
+        return [tuple(int(x) for x in area) for area in regions]
+
+    @staticmethod
+    def _name(images):
+        """
+        日志中图片的名称,numpy数组只显示尺寸
+        """
+        return "图片{}".format(images.shape) if isinstance(images, numpy.ndarray) else images
+
     def matrix_to_string(self,images:str,tesseract_OCR:str):
         """
         将图片内容转成文字,需要安装Tesseract OCR 引擎
@@ -90,12 +206,12 @@ class Images():
         对于 Windows,您可以从 https://github.com/UB-Mannheim/tesseract/wiki 下载安装程序并进行安装。
         对于 Linux,您可以使用包管理器安装,如 sudo apt-get install tesseract-ocr
         要识别中文还需要下中文语音包放到\ocr\tessdata目录下,下载地址:https://github.com/tesseract-ocr/tessdata/blob/main/chi_sim.traineddata
-        parame: images: 图片地址
+        parame: images: 图片地址或numpy数组
         parame: tesseract_OCR: OCR下的tesseract.exe地址
         return: text_string: 返回识别出来的文字
         """
         try:
-            image = Image.open(images)
+            image = self.open_image(images)
             pytesseract.pytesseract.tesseract_cmd = tesseract_OCR #指定了 Tesseract OCR 引擎的安装路径
             text_string = pytesseract.image_to_string(image,lang='chi_sim')
             logger.info("{}图片文字识别成功文字内容为{},文字识别工具OCR路径为{}".format(images,text_string,tesseract_OCR))
@@ -109,12 +225,12 @@ class Images():
         对于 macOS,您可以使用 Homebrew 安装:brew install tesseract
         对于 Windows,您可以从 https://github.com/UB-Mannheim/tesseract/wiki 下载安装程序并进行安装。
         对于 Linux,您可以使用包管理器安装,如 sudo apt-get install tesseract-ocr
-        parame: images: 图片地址
+        parame: images: 图片地址或numpy数组
         parame: tesseract_OCR: OCR下的tesseract.exe地址
         parame: position: 需要识别的区域start_x, start_y, end_x, end_y
         """
         try:
-            image = Image.open(images)
+            image = self.open_image(images)
             area_images = image.crop(position)
             pytesseract.pytesseract.tesseract_cmd = tesseract_OCR #指定了 Tesseract OCR 引擎的安装路径
             text_string = pytesseract.image_to_string(area_images)
@@ -130,13 +246,13 @@ class Images():
         对于 macOS,您可以使用 Homebrew 安装:brew install tesseract
         对于 Windows,您可以从 https://github.com/UB-Mannheim/tesseract/wiki 下载安装程序并进行安装。
         对于 Linux,您可以使用包管理器安装,如 sudo apt-get install tesseract-ocr
-        parame: images: 图片地址
+        parame: images: 图片地址或numpy数组
         parame: tesseract_OCR: OCR下的tesseract.exe地址
         parame: content: 想要识别的文字
         return: position: 返回文字所在的区域start_x, start_y, end_x, end_y
         """
         try:
-            image = Image.open(images)
+            image = self.open_image(images)
             pytesseract.pytesseract.tesseract_cmd = tesseract_OCR #指定了 Tesseract OCR 引擎的安装路径
             boxes = pytesseract.image_to_boxes(content,output_type=pytesseract.Output.STRING)
             logger.info("{}图片文字识别成功文字内容为{},文字识别工具OCR路径为{}".format(images,boxes,tesseract_OCR))
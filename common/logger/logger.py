@@ -1,5 +1,6 @@
 import os
 import sys
+import configparser
 from typing import List, Tuple, Any, Optional
 
 import yaml
@@ -16,14 +17,43 @@ from loguru import logger as _logger
     2、 在运行代码目录及父目录到根目录的任意目录放置config.yml文件，其中yml中包含level和log_folder用于定义log等级及log存放文件路径
 
     3、 如果找不到配置文件，默认使用info级别输出log，并且不保存log内容到文件
+
+    4、 settings.ini中log_console_level/log_file_level分别设置控制台和文件的log等级，log_backup_count设置保留的log文件数量，
+        log_enqueue=True时log文件由后台线程写入，测试线程不等待磁盘(默认False，log写到慢速磁盘或网络磁盘时打开)，log_json=True时另外写一份json lines格式的log(每行包含
+        time/elapsed等时间字段，可用于统计耗时)
+
+    5、 循环中的log使用loguru的格式化参数，只有该等级的log会被输出时才格式化：
+        logger.debug("msg found: {}", msg)  # 而不是 logger.debug(f"msg found: {msg}")
 """
 
 config_file_name = "./config/settings.ini"
 current_path = os.getcwd()
 log_level_type = "trace", "debug", "info", "warning", "error"
-print(current_path)
 
-def set_logger(level: str = "debug", folder: Optional[str] = None):
+def set_logger(
+        level: str = "debug",
+        folder: Optional[str] = None,
+        consoleLevel: Optional[str] = None,
+        fileLevel: Optional[str] = None,
+        backupCount: Optional[int] = None,
+        enqueue: bool = False,
+        jsonFile: bool = False
+):
+    """
+    :param level: 控制台和文件的默认log等级
+
+    :param folder: log文件夹，None则不保存log到文件
+
+    :param consoleLevel: 控制台log等级，None则使用level
+
+    :param fileLevel: 文件log等级，None则使用level
+
+    :param backupCount: 保留的log文件数量，None则全部保留
+
+    :param enqueue: True则由后台线程写入log文件，用于慢速磁盘或网络磁盘，本地磁盘直接写入更快
+
+    :param jsonFile: True则另外保存json lines格式的log文件
+    """
     # LOG的格式
     formats = "<g>[{time:YYYY-MM-DD HH:mm:ss.SSS}]</g>" \
               "<level>[{level: ^9}]</level>|" \
@@ -34,24 +64,44 @@ def set_logger(level: str = "debug", folder: Optional[str] = None):
     # LOG等级
     # 文件最大存放数量
     rotation = "20 MB"
-    flag = True
-    while flag:
-        try:
-            _logger.remove(0)
-        except ValueError:
-            _logger.trace("There is no existing handler with id")
-            flag = False
+    _logger.remove()
     # 控制台输出
-    _logger.add(sys.stdout, level=level.upper(), format=formats)
+    _logger.add(sys.stdout, level=(consoleLevel or level).upper(), format=formats)
 
     if folder:
         file_path = folder
         # 传入的不是文件夹路径则在当前目录下建立log文件夹，然后再进行文件写入
         if not os.path.isdir(folder):
-            file_path = os.getcwd() + "\\test\\output_logs"
+            file_path = os.path.join(os.getcwd(), "test", "output_logs")
             if not os.path.exists(file_path):
                 os.makedirs(file_path)
-        _logger.add(os.path.join(file_path, "log_{time}.log"), level=level.upper(), format=formats, rotation=rotation)
+        _logger.add(os.path.join(file_path, "log_{time}.log"), level=(fileLevel or level).upper(), format=formats,
+                    rotation=rotation, retention=backupCount, enqueue=enqueue)
+        if jsonFile:
+            _logger.add(os.path.join(file_path, "log_{time}.jsonl"), level=(fileLevel or level).upper(), serialize=True,
+                        rotation=rotation, retention=backupCount, enqueue=enqueue)
+
+
+def read_settings(config_file: str = config_file_name) -> dict:
+    """
+    读取settings.ini中log相关的配置(log_开头)，不能使用common.config，因为它依赖logger
+
+    :param config_file: 配置文件
+
+    :return: {配置名: 值}，找不到配置文件则为空
+    """
+    parser = configparser.ConfigParser(interpolation=None)
+    try:
+        parser.read(config_file, encoding="utf-8")
+    except (configparser.Error, OSError, UnicodeDecodeError):
+        return {}
+    if not parser.has_section("SETTINGS"):
+        return {}
+    return {k: v.split("#")[0].strip() for k, v in parser.items("SETTINGS") if k.startswith("log_")}
+
+
+def _level(value: Optional[str], default: str) -> str:
+    return value.lower() if value and value.lower() in log_level_type else default
 
 
 def get_files(folder: str) -> List[str]:
@@ -140,5 +190,38 @@ set_logger(logger_level, logger_folder)
 # 返回logger对象
 logger = _logger
 """
-set_logger("debug","./test/output_logs")
-logger= _logger
\ No newline at end of file
+settings = read_settings()
+set_logger(
+    "debug",
+    "./test/output_logs",
+    consoleLevel=_level(settings.get("log_console_level"), "debug"),
+    fileLevel=_level(settings.get("log_file_level"), "debug"),
+    backupCount=int(settings["log_backup_count"]) if settings.get("log_backup_count", "").isdigit() else None,
+    enqueue=settings.get("log_enqueue", "false").lower() == "true",
+    jsonFile=settings.get("log_json", "false").lower() == "true"
+)
+logger= _logger
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+    msg = {"message_name": "IPK_0x295", "message_id": 661, "signal_name": "SysPowerMod", "start_bit": 5,
+           "signal_size": 2, "factor": 1, "offset": 0, "values": {str(i): f"value {i}" for i in range(16)}}
+    count = 5000
+
+    def bench(title, func):
+        t1 = time.perf_counter()
+        for i in range(count):
+            func(i)
+        print(f"{title}: {(time.perf_counter() - t1) / count * 1e6:.1f} us per iteration")
+
+    folder = tempfile.mkdtemp()
+    set_logger("debug", folder, consoleLevel="error", enqueue=False)
+    bench("file sink, f-string", lambda i: logger.debug(f"msg found: {msg}"))
+    set_logger("debug", folder, consoleLevel="error", enqueue=True)
+    bench("file sink enqueued, f-string", lambda i: logger.debug(f"msg found: {msg}"))
+    set_logger("debug", folder, consoleLevel="error", fileLevel="info", enqueue=True)
+    bench("debug disabled, f-string", lambda i: logger.debug(f"msg found: {msg}"))
+    bench("debug disabled, lazy arguments", lambda i: logger.debug("msg found: {}", msg))
+    logger.complete()
@@ -0,0 +1,13 @@
+#! /usr/bin/env python
+
+
+
+from common.metrics.metrics import Histogram, Registry, metrics, timed
+
+
+__all__ = [
+    "Histogram",
+    "Registry",
+    "metrics",
+    "timed",
+]
@@ -0,0 +1,295 @@
+#! /usr/bin/env python
+
+
+
+"""
+lightweight metrics of test execution: counters and latency histograms of API actions(camera, image comparison, OCR,
+CAN, power supply, ...), so it's visible where the time of a test case or a suite goes
+
+every measurement is recorded twice, for the current test case and for the whole run. summary of a test case is
+attached to allure report at teardown(API.finish_test), summary of the run is exported to .json and Prometheus text
+format when the process exits.
+histograms keep counts in logarithmic buckets(like HdrHistogram, about 3% relative error), so recording costs the same
+for any number of measurements and percentiles are available without keeping all values.
+
+how to use:
+    from common.metrics import metrics, timed
+
+    @timed("can.send")
+    def send(...):
+        ...
+
+    with metrics.timer("image.match"):
+        ...
+
+    metrics.count("ocr.cache_hit")
+    metrics.start_test("test_xxx")
+    print(metrics.summary_text("test"))
+    metrics.export("D:/xxx/test/metrics")  # metrics.json and metrics.prom
+"""
+
+try:
+    from common.logger.logger import logger
+except (ImportError, ModuleNotFoundError) as e:
+    import logging as logger
+import contextlib
+import functools
+import threading
+import json
+import time
+import os
+import re
+
+
+__all__ = [
+    "Histogram",
+    "Registry",
+    "metrics",
+    "timed",
+]
+
+
+class Histogram:
+    """
+    latency histogram in microseconds, values below 32us are exact, larger values are kept with 5 significant bits
+    """
+
+    SUB_BITS = 5
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def _index(cls, us: int):
+        if us < (1 << cls.SUB_BITS):
+            return us
+        shift = us.bit_length() - cls.SUB_BITS
+        return (shift << (cls.SUB_BITS - 1)) + (us >> shift)
+
+    @classmethod
+    def _value(cls, index: int):
+        """
+        @return:
+            float: middle value(us) of a bucket
+        """
+        if index < (1 << cls.SUB_BITS):
+            return float(index)
+        half = 1 << (cls.SUB_BITS - 1)
+        shift = (index >> (cls.SUB_BITS - 1)) - 1
+        low = ((index & (half - 1)) + half) << shift
+        return low + ((1 << shift) - 1) / 2
+
+    def record(self, seconds: float):
+        us = max(0, int(seconds * 1e6))
+        index = self._index(us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def percentile(self, p: float):
+        """
+        @param:
+            p: 0-100
+        @return:
+            float: seconds, None if nothing recorded
+        """
+        if not self.count:
+            return None
+        rank = max(1, round(p / 100 * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(max(self._value(index) / 1e6, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "min": self.min,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class Registry:
+    def __init__(self):
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._run = ({}, {})
+        self._test = ({}, {})
+        self.test = None
+
+    def count(self, name: str, value: (int, float) = 1):
+        """
+        increase a counter
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            for counters, histograms in (self._run, self._test):
+                counters[name] = counters.get(name, 0) + value
+
+    def record(self, name: str, seconds: float):
+        """
+        record a duration to a histogram
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            for counters, histograms in (self._run, self._test):
+                if name not in histograms:
+                    histograms[name] = Histogram()
+                histograms[name].record(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name: str):
+        """
+        record the duration of a code block, also recorded if an exception raised
+        """
+        start_t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start_t)
+
+    def timed(self, name: str = None):
+        """
+        decorator, record the duration of every call
+        @param:
+            name: name of histogram, default to <module>.<qualified name of function>
+        """
+        def decorator(func):
+            key = name if name else f"{func.__module__}.{func.__qualname__}"
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start_t = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(key, time.perf_counter() - start_t)
+            return wrapper
+        return decorator
+
+    def start_test(self, name: str = None):
+        """
+        clear metrics of the last test case
+        """
+        with self._lock:
+            self._test = ({}, {})
+            self.test = name
+
+    def summary(self, scope: str = "run"):
+        """
+        @param:
+            scope: "run" or "test"
+        @return:
+            dict: {"counters": {name: value}, "histograms": {name: {count, sum, mean, min, p50, p95, p99, max}}}
+        """
+        counters, histograms = self._run if scope == "run" else self._test
+        with self._lock:
+            return {
+                "counters": dict(sorted(counters.items())),
+                "histograms": {k: histograms[k].summary() for k in sorted(histograms)},
+            }
+
+    def summary_text(self, scope: str = "run"):
+        """
+        @return:
+            str: a table of summary, histograms sorted by total time
+        """
+        data = self.summary(scope)
+        lines = [f"{'name':<36}{'count':>8}{'total(s)':>12}{'mean(ms)':>12}{'p95(ms)':>12}{'max(ms)':>12}"]
+        for name, h in sorted(data["histograms"].items(), key=lambda x: -x[1]["sum"]):
+            lines.append(f"{name:<36}{h['count']:>8}{h['sum']:>12.3f}{h['mean'] * 1e3:>12.1f}{h['p95'] * 1e3:>12.1f}"
+                         f"{h['max'] * 1e3:>12.1f}")
+        for name, value in data["counters"].items():
+            lines.append(f"{name:<36}{value:>8}")
+        return "\n".join(lines)
+
+    def attach(self, name: str = "metrics"):
+        """
+        attach summary of current test case to allure report, nothing is done if nothing recorded
+        """
+        if not self._test[0] and not self._test[1]:
+            return
+        try:
+            import allure
+        except (ImportError, ModuleNotFoundError) as e:
+            return
+        allure.attach(self.summary_text("test"), name, allure.attachment_type.TEXT)
+
+    @staticmethod
+    def _prometheus_name(name: str):
+        return "act_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+    def prometheus(self):
+        """
+        @return:
+            str: summary of the run in Prometheus text format
+        """
+        data = self.summary("run")
+        lines = []
+        for name, value in data["counters"].items():
+            metric = self._prometheus_name(name) + "_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, h in data["histograms"].items():
+            metric = self._prometheus_name(name) + "_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for q in ("50", "95", "99"):
+                lines.append(f'{metric}{{quantile="0.{q}"}} {h["p" + q]}')
+            lines += [f"{metric}_sum {h['sum']}", f"{metric}_count {h['count']}"]
+        return "\n".join(lines) + "\n"
+
+    def export(self, folder: str):
+        """
+        write summary of the run to <folder>/metrics.json and <folder>/metrics.prom
+        """
+        if not folder:
+            return
+        data = self.summary("run")
+        if not data["counters"] and not data["histograms"]:
+            return
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, "metrics.json"), 'w', encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        with open(os.path.join(folder, "metrics.prom"), 'w', encoding="utf-8") as f:
+            f.write(self.prometheus())
+        logger.info(f"metrics of the run exported to: {folder}")
+
+
+metrics = Registry()
+timed = metrics.timed
+
+
+if __name__ == "__main__":
+    import random
+    h = Histogram()
+    values = [random.expovariate(1 / 0.05) for _ in range(100000)]
+    t1 = time.perf_counter()
+    for v in values:
+        h.record(v)
+    print(f"record: {(time.perf_counter() - t1) / len(values) * 1e6:.2f} us per value")
+    values.sort()
+    for p in (50, 95, 99):
+        print(f"p{p}: histogram={h.percentile(p):.6f}, exact={values[int(p / 100 * len(values)) - 1]:.6f}")
+
+    @timed("demo.sleep")
+    def sleep():
+        time.sleep(0.001)
+    for _ in range(20):
+        sleep()
+    metrics.count("demo.count", 3)
+    print(metrics.summary_text("test"))
+    print(metrics.prometheus())
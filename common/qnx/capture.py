@@ -0,0 +1,178 @@
+#! /usr/bin/env python
+
+
+
+"""
+screenshots of qnx(cluster) decoded in memory, no .bmp is pulled to local disk
+
+"screenshot" is run in a pooled qnx session(telnet from android), the file written to the folder shared with android
+is renamed to a unique name, streamed by a pooled "adb exec-out" session and removed, then decoded to a numpy array(BGR,
+the same as cv2.imread). frames() takes the next screenshot on qnx while the last one is transferred and decoded, so
+repeated captures are pipelined.
+
+how to use:
+    capture = CaptureService("192.168.7.16:5555", "192.168.118.2", "root", "", "/var/share/", "/data/nfs/nfs_share/")
+    capture = CaptureService(None, "192.168.118.2", "root")  # device of setting "adb_serial"(overridden by rig)
+    image = capture.capture()  # numpy.ndarray
+    for image in capture.frames(10):  # 10 screenshots, pipelined
+        ...
+"""
+
+try:
+    from common.logger.logger import logger
+except (ImportError, ModuleNotFoundError) as e:
+    import logging as logger
+from common.adb.shell import serial, qnx_session, android_session
+from common.metrics import metrics
+import threading
+import posixpath
+import itertools
+import queue
+import uuid
+import cv2 as cv
+import numpy
+
+
+__all__ = [
+    "CaptureService",
+]
+
+
+class CaptureService:
+    def __init__(
+            self,
+            devices: (str, None),
+            ip: str,
+            user: str,
+            passwd: str = "",
+            qnxFolder: str = "/var/share/",
+            androidFolder: str = "/data/nfs/nfs_share/",
+            timeout: (int, float) = 30,
+            depth: int = 2
+    ):
+        """
+        class init
+        @param:
+            devices: serial of android device from "adb devices", None for setting "adb_serial" of current rig
+            ip: ip address of qnx
+            user: user name of qnx
+            passwd: password of qnx, "" if no password is asked
+            qnxFolder: folder shared with android on qnx, "screenshot" writes screenshot.bmp there
+            androidFolder: the same folder on android
+            timeout: seconds to wait for a screenshot or a transfer
+            depth: max number of screenshots taken but not transferred in frames()
+        """
+        self.devices = serial(devices)
+        self.ip = ip
+        self.user = user
+        self.passwd = passwd
+        self.qnxFolder = qnxFolder
+        self.androidFolder = androidFolder
+        self.timeout = timeout
+        self.depth = max(1, int(depth))
+        self._prefix = f"act_{uuid.uuid4().hex[:8]}"
+        self._counter = itertools.count()
+        # connect both sessions now, so the first capture is not slower than others
+        self._qnx, self._android
+
+    @property
+    def _qnx(self):
+        return qnx_session(self.devices, self.ip, self.user, self.passwd)
+
+    @property
+    def _android(self):
+        return android_session(self.devices, raw=True)
+
+    def _take(self):
+        """
+        @return:
+            str: name of screenshot file in shared folder
+        """
+        name = f"{self._prefix}_{next(self._counter)}.bmp"
+        with metrics.timer("qnx.screenshot"):
+            # in a subshell, the pooled session stays in its own folder for other users
+            self._qnx.run(f"(cd {self.qnxFolder} && screenshot && mv screenshot.bmp {name})", self.timeout, check=True)
+        return name
+
+    def _fetch(self, name: str):
+        """
+        @return:
+            numpy.ndarray: decoded screenshot, the file is removed
+        """
+        with metrics.timer("qnx.transfer"):
+            data = self._android.read_file(posixpath.join(self.androidFolder, name), remove=True, timeout=self.timeout)
+        if data is None:
+            raise FileNotFoundError(f"screenshot <{name}> not found in {self.androidFolder}")
+        with metrics.timer("qnx.decode"):
+            image = cv.imdecode(numpy.frombuffer(data, numpy.uint8), cv.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f"screenshot <{name}> could not be decoded, {len(data)} bytes")
+        return image
+
+    def capture(self):
+        """
+        take a screenshot
+        @return:
+            numpy.ndarray: BGR image
+        """
+        image = self._fetch(self._take())
+        logger.info(f"screenshot of qnx captured: {image.shape}")
+        return image
+
+    def frames(self, count: int = None):
+        """
+        take screenshots continuously, the next screenshot is taken while the last one is transferred and decoded
+        @param:
+            count: number of screenshots, endless if None
+        @return:
+            generator: numpy.ndarray of BGR images
+        """
+        names = queue.Queue(self.depth)
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for _ in (range(count) if count is not None else itertools.count()):
+                    if stop.is_set():
+                        return
+                    names.put(self._take())
+            except Exception as e:
+                names.put(e)
+            finally:
+                names.put(None)
+
+        producer = threading.Thread(target=produce, name="qnx-screenshot", daemon=True)
+        producer.start()
+        try:
+            while True:
+                name = names.get()
+                if name is None:
+                    return
+                if isinstance(name, Exception):
+                    raise name
+                yield self._fetch(name)
+        finally:
+            stop.set()
+            # let the producer finish and remove screenshots not transferred
+            while producer.is_alive() or not names.empty():
+                try:
+                    name = names.get(timeout=self.timeout)
+                except queue.Empty:
+                    break
+                if isinstance(name, str):
+                    self._android.run(f"rm -f {posixpath.join(self.androidFolder, name)}")
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    config = dict(zip(["devices", "ip", "user", "passwd"], sys.argv[1:]))
+    capture = CaptureService(**config)
+    t1 = time.time()
+    capture.capture()
+    print(f"single capture: {time.time() - t1:.3f}s")
+    t1 = time.time()
+    for frame in capture.frames(10):
+        pass
+    print(f"pipelined capture: {(time.time() - t1) / 10:.3f}s per frame")
+    print(metrics.summary_text("run"))
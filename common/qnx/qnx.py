@@ -1,57 +1,52 @@
 from common.logger.logger import logger
-import subprocess
-import time
+from common.adb.shell import qnx_session
 
 class qnx():
     """
     qnx相关命令操作,在安卓执行busybox telnet命令进入qnx,再执行qnx命令
+    登录后的会话保存在会话池中,各用例复用同一会话,命令以输出结束标记判断完成,不再固定等待
     """
-    def __init__(self,devices:str,ip:str,user:str,passwd:str):
+    def __init__(self,devices:str,ip:str,user:str,passwd:str,timeout:(int, float)=20):
         """
         #从安卓进入qnx
-        parame: devices: 设备地址通过adb devices获得
+        parame: devices: 设备地址通过adb devices获得,为None时使用当前台架的设置adb_serial
         parame: ip: 目标ip地址,即qnx的ip地址
         parame: user: qnx登录账号
         parame: passwd: qnx登录密码     
+        parame: timeout: 等待登录提示的最长时间(秒)
         """
         try:
-            command = "adb -s {} shell".format(devices)
-            self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            time.sleep(2)
-            self.process.stdin.write("busybox telnet {}\n".format(ip)) #从安卓进入qnx命令
-            self.process.stdin.flush()
-            time.sleep(2)
-            self.process.stdin.write("{}\n".format(user)) #输入用户名
-            self.process.stdin.flush()
-            time.sleep(2)
-            if passwd != "":
-                self.process.stdin.write("{}\n".format(passwd)) #输入密码
-                self.process.stdin.flush()
-                time.sleep(2)
-            status_code=self.process.returncode  #执行状态码，为0表示执行成功，为1表示执行失败
-            #cmd_result=self.process.communicate() #以元组的形式返回执行命令的输出
-            logger.info("执行成功,执行状态码为{}。".format(status_code))
+            self.devices = devices
+            self.ip = ip
+            self.user = user
+            self.passwd = passwd
+            self.timeout = timeout
+            self.session #已有会话时直接复用,否则登录qnx
+            logger.info("qnx会话已就绪: {}".format(ip))
         except Exception as e:
             logger.error(e)
             raise
-        
-    def qnx_screenshot(self,save:str):
+
+    @property
+    def session(self):
+        """
+        return: ShellSession: 已登录qnx的会话,会话断开时重新登录
+        """
+        return qnx_session(self.devices, self.ip, self.user, self.passwd, self.timeout)
+
+    def qnx_screenshot(self,save:str,timeout:(int, float)=30)-> int:
         """
         截取仪表界面图片
         parame: save: 图片保存路径即安卓与qnx的共享目录,注意不要保存到根目录或者系统路径很可能会报错
+        parame: timeout: 等待截图完成的最长时间(秒)
+        return: status_code: 执行状态码,为0表示执行成功
         """
         try:
-            self.process.stdin.write("cd {}\n".format(save)) #切换qnx目录
-            self.process.stdin.flush()
-            time.sleep(2)
-            self.process.stdin.write("screenshot\n") #截图
-            self.process.stdin.flush()
-            time.sleep(4)
-            self.process.stdin.close()
-            self.process.wait()
-            status_code=self.process.returncode  #执行状态码，为0表示执行成功，为1表示执行失败
-            #cmd_result=self.process.communicate() #以元组的形式返回执行命令的输出
+            with self.session as session:
+                #在子shell中切换qnx目录并截图,共用的会话不保留工作目录,命令返回即截图完成
+                output, status_code = session.run("(cd {} && screenshot)".format(save), timeout)
             logger.info("执行成功,执行状态码为{}".format(status_code))
+            return status_code
         except Exception as e:
             logger.error(e)
-            raise
\ No newline at end of file
+            raise
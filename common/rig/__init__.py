@@ -0,0 +1,13 @@
+#! /usr/bin/env python
+
+
+
+from common.rig.rig import Rig, load_rigs
+from common.rig.scheduler import RigScheduler
+
+
+__all__ = [
+    "Rig",
+    "load_rigs",
+    "RigScheduler",
+]
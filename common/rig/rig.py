@@ -0,0 +1,115 @@
+#! /usr/bin/env python
+
+
+
+"""
+inventory of test benches(rigs), each rig has its own camera, CAN channel, power supply and cluster
+
+rigs are listed in a .json file(see settings "rigs" in settings.ini):
+    [
+        {"name": "rig1", "camera_id": 0, "can_channel": 1, "power_port": "COM11", "adb_serial": "192.168.7.16:5555"},
+        {"name": "rig2", "camera_id": 1, "can_channel": 2, "power_port": "COM12", "adb_serial": "192.168.7.17:5555",
+         "settings": {"brightness_ratio": 0.6}}
+    ]
+
+a worker process of a rig gets the overrides of settings from environment variable ACT_RIG, Config applies them
+before all settings are loaded, so the Base of that process uses devices of that rig only(android device of
+"adb_serial" is used by common.adb and common.qnx if no serial is given), and files of a rig like calibration of its
+camera are named after the rig.
+
+how to use:
+    from common.rig import load_rigs
+    rigs = load_rigs("D:/xxx/config/rigs.json")
+    env = rigs[0].environ()  # environment for a worker process of rig1
+"""
+
+import json
+import os
+
+
+__all__ = [
+    "RIG_ENV",
+    "Rig",
+    "load_rigs",
+]
+
+
+# name of environment variable which stores overrides of settings for current rig
+RIG_ENV = "ACT_RIG"
+
+
+class Rig:
+
+    # fields of rig inventory and the settings(settings.ini) they override
+    FIELDS = {
+        "camera_id": "camera_id",
+        "can_channel": "canoe_channel",
+        "can_driver": "driver",
+        "power": "power",
+        "power_port": "power_port",
+        "adb_serial": "adb_serial",
+        "output": "output",
+    }
+
+    def __init__(self, name: str, settings: dict = None, **kwargs):
+        """
+        class init
+        @param:
+            name: name of rig, must be unique
+            settings: any other settings overridden for this rig, names are the same as settings.ini
+            kwargs: camera_id, can_channel, can_driver, power, power_port, adb_serial, output, see self.FIELDS
+        """
+        unknown = [x for x in kwargs if x not in self.FIELDS]
+        if unknown:
+            raise KeyError(f"unknown fields for rig '{name}': {unknown}, available fields: {list(self.FIELDS)}")
+        self.name = str(name)
+        self.fields = {k: v for k, v in kwargs.items() if v is not None}
+        self.settings = dict(settings) if settings else {}
+
+    def __getattr__(self, item):
+        if item in self.FIELDS:
+            return self.__dict__["fields"].get(item)
+        raise AttributeError(item)
+
+    def __repr__(self):
+        return f"Rig({self.name}, {self.fields})"
+
+    def overrides(self):
+        """
+        @return:
+            dict: settings overridden by this rig, name of settings as key
+        """
+        result = {self.FIELDS[k]: v for k, v in self.fields.items()}
+        result.update(self.settings)
+        result["rig"] = self.name
+        return result
+
+    def environ(self, base: dict = None, settings: dict = None):
+        """
+        environment variables for a worker process of this rig
+        @param:
+            base: base environment, default to os.environ
+            settings: more settings overridden, only for this process
+        @return:
+            dict: environment variables
+        """
+        env = dict(os.environ if base is None else base)
+        env[RIG_ENV] = json.dumps({**self.overrides(), **(settings or {})}, ensure_ascii=False)
+        return env
+
+
+def load_rigs(file: str):
+    """
+    load rig inventory from .json file
+    @param:
+        file: absolute path of inventory
+    @return:
+        list: a list of Rig objects
+    """
+    with open(file, 'r', encoding="utf-8") as f:
+        data = json.load(f)
+    rigs = [Rig(**item) for item in data]
+    names = [x.name for x in rigs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"names of rigs must be unique: {names}")
+    return rigs
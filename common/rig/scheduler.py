@@ -0,0 +1,251 @@
+#! /usr/bin/env python
+
+
+
+"""
+run test scripts on several rigs at the same time, one pytest process for each rig
+
+test scripts(or source data files for common.tc.plugin) are distributed to rigs by estimated duration, the longest
+script is always given to the rig with the least work(LPT), durations are measured from junit xml of previous runs and
+saved to a .json file. if a History(common.tc.history) is given, duration of a generated script is the sum of its test
+cases(listed in .manifest.json of the folder), so scripts never run before or regenerated are also estimated well.
+every rig writes its own allure results, junit xml and console log to <output>/<rig name>.
+
+how to use:
+    from common.rig import RigScheduler, load_rigs
+    scheduler = RigScheduler(load_rigs("D:/xxx/config/rigs.json"), output="D:/xxx/test/rigs")
+    result = scheduler.run(["D:/xxx/input/input_case"], pytest_args=["-q"])  # {"rig1": 0, "rig2": 1}
+    print(scheduler.alluredirs)  # allure generate <dir1> <dir2> ... -o report
+
+    or from command line:
+    python -m common.rig.scheduler input/input_case --rigs config/rigs.json
+"""
+
+try:
+    from common.logger.logger import logger
+except (ImportError, ModuleNotFoundError) as e:
+    import logging as logger
+from common.rig.rig import load_rigs
+from common.tc.history import History, test_name
+from common.tc.case import TC
+from common.tc.main import MANIFEST
+import xml.etree.ElementTree as ET
+import subprocess
+import fnmatch
+import heapq
+import json
+import time
+import sys
+import os
+
+
+__all__ = [
+    "RigScheduler",
+]
+
+
+class RigScheduler:
+    def __init__(
+            self,
+            rigs: (list, tuple),
+            output: str,
+            rootdir: str = None,
+            durations: str = None,
+            patterns: (list, tuple) = ("test_*.py", ),
+            defaultDuration: (int, float) = 60,
+            history: History = None
+    ):
+        """
+        class init
+        @param:
+            rigs: a list of Rig objects
+            output: folder for outputs of all rigs
+            rootdir: working directory of pytest processes, default to current working directory
+            durations: .json file which stores durations(s) of test scripts, default to <output>/durations.json
+            patterns: file patterns of test scripts searched in folders, add "test_*.json" for common.tc.plugin
+            defaultDuration: duration(s) of a test script which has never been run
+            history: durations of test cases, updated and saved after each run
+        """
+        if not rigs:
+            raise ValueError(f"at least one rig is needed")
+        self.rigs = list(rigs)
+        self.output = output
+        self.rootdir = rootdir if rootdir else os.getcwd()
+        self.durationsFile = durations if durations else os.path.join(output, "durations.json")
+        self.patterns = patterns
+        self.defaultDuration = defaultDuration
+        self.durations = {}
+        if os.path.exists(self.durationsFile):
+            with open(self.durationsFile, 'r', encoding="utf-8") as f:
+                self.durations = json.load(f)
+        self.alluredirs = []
+        self.history = history
+        self._manifests = {}
+
+    def key(self, path: str):
+        """
+        key of a test script in durations, it's also the prefix of "classname" in junit xml
+        """
+        rel = os.path.relpath(os.path.abspath(path), self.rootdir).replace(os.sep, "/")
+        return rel[:-3].replace("/", ".") if rel.endswith(".py") else rel.replace("/", ".")
+
+    def collect(self, paths: (list, tuple)):
+        """
+        search test scripts in folders
+        @param:
+            paths: test scripts or folders
+        @return:
+            list: absolute paths of test scripts
+        """
+        scripts = []
+        for path in paths:
+            if os.path.isfile(path):
+                scripts.append(os.path.abspath(path))
+                continue
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(x for x in dirs if not x.startswith((".", "__")))
+                for f in sorted(files):
+                    if any(fnmatch.fnmatch(f.lower(), p) for p in self.patterns):
+                        scripts.append(os.path.abspath(os.path.join(root, f)))
+        return scripts
+
+    def estimate(self, path: str):
+        """
+        @return:
+            float: estimated duration(s) of a test script
+        """
+        if self.history is not None:
+            cases = self._cases(path)
+            if cases:
+                return sum(self.history.estimate(test_name(TC.test_id(x))) for x in cases)
+        return self.durations.get(self.key(path), self.defaultDuration)
+
+    def _cases(self, path: str):
+        """
+        @return:
+            list: keys of test cases in a generated script or a source data file(common.tc.plugin), None if unknown
+        """
+        if path.lower().endswith(".json"):
+            try:
+                with open(path, 'r', encoding="utf-8") as f:
+                    return [x["key"] for x in json.load(f) if isinstance(x, dict) and "key" in x]
+            except (OSError, ValueError):
+                return None
+        folder, name = os.path.split(path)
+        if folder not in self._manifests:
+            try:
+                with open(os.path.join(folder, MANIFEST), 'r', encoding="utf-8") as f:
+                    self._manifests[folder] = json.load(f).get("chunks", {})
+            except (OSError, ValueError):
+                self._manifests[folder] = {}
+        chunk = self._manifests[folder].get(name)
+        return [x[0] for x in chunk["cases"] if x[0] is not None] if chunk else None
+
+    def distribute(self, scripts: (list, tuple)):
+        """
+        distribute test scripts to rigs, the longest script first to the rig with the least estimated duration
+        @param:
+            scripts: absolute paths of test scripts
+        @return:
+            dict: {name of rig: [scripts]}, scripts of each rig keep the original order
+        """
+        order = {x: i for i, x in enumerate(scripts)}
+        heap = [(0.0, index) for index in range(len(self.rigs))]
+        buckets = [[] for _ in self.rigs]
+        for script in sorted(scripts, key=lambda x: (-self.estimate(x), order[x])):
+            load, index = heapq.heappop(heap)
+            buckets[index].append(script)
+            heapq.heappush(heap, (load + self.estimate(script), index))
+        for index, rig in enumerate(self.rigs):
+            load = sum(self.estimate(x) for x in buckets[index])
+            logger.info(f"{len(buckets[index])} test scripts distributed to rig '{rig.name}', estimated duration: {load:.0f}s")
+        return {rig.name: sorted(buckets[index], key=order.get) for index, rig in enumerate(self.rigs)}
+
+    def run(self, paths: (list, tuple), pytest_args: (list, tuple) = ()):
+        """
+        distribute test scripts and run them on all rigs at the same time, wait until all rigs finished
+        @param:
+            paths: test scripts or folders
+            pytest_args: other arguments for pytest, e.g. ["-q", "-p", "common.tc.plugin"]
+        @return:
+            dict: {name of rig: exit code of pytest}
+        """
+        scripts = self.collect(paths)
+        if not scripts:
+            logger.error(f"no test script found in: {paths}")
+            return {}
+        plan = self.distribute(scripts)
+
+        start_t = time.time()
+        procs = {}
+        self.alluredirs = []
+        for rig in self.rigs:
+            if not plan[rig.name]:
+                continue
+            folder = os.path.join(self.output, rig.name)
+            os.makedirs(folder, exist_ok=True)
+            alluredir = os.path.join(folder, "allure")
+            self.alluredirs.append(alluredir)
+            cmd = [sys.executable, "-m", "pytest", *plan[rig.name], "--alluredir", alluredir, "--clean-alluredir",
+                   "--junitxml", os.path.join(folder, "junit.xml"), *pytest_args]
+            # outputs(camera photos, videos, ...) of rigs must not overwrite each other
+            env = rig.environ(settings=None if rig.output else {"output": folder})
+            log = open(os.path.join(folder, "console.log"), 'w', encoding="utf-8")
+            procs[rig.name] = (subprocess.Popen(cmd, cwd=self.rootdir, env=env, stdout=log, stderr=subprocess.STDOUT), log)
+            logger.info(f"rig '{rig.name}' started with {len(plan[rig.name])} test scripts, console log: {log.name}")
+
+        result = {}
+        for name, (proc, log) in procs.items():
+            result[name] = proc.wait()
+            log.close()
+            logger.info(f"rig '{name}' finished with exit code {result[name]} after {time.time() - start_t:.0f}s")
+            self.update_durations(os.path.join(self.output, name, "junit.xml"), plan[name])
+            if self.history is not None and os.path.exists(os.path.join(self.output, name, "junit.xml")):
+                self.history.load_junit(os.path.join(self.output, name, "junit.xml"))
+        self.save_durations()
+        if self.history is not None:
+            self.history.save()
+        logger.info(f"all rigs finished in {time.time() - start_t:.0f}s: {result}")
+        return result
+
+    def update_durations(self, junitXml: str, scripts: (list, tuple)):
+        """
+        sum durations of test cases in junit xml for each test script
+        """
+        if not os.path.exists(junitXml):
+            logger.warning(f"junit xml not found: {junitXml}, durations not updated")
+            return
+        times = {}
+        for case in ET.parse(junitXml).getroot().iter("testcase"):
+            classname = case.get("classname", "")
+            times[classname] = times.get(classname, 0.0) + float(case.get("time", 0) or 0)
+        for script in scripts:
+            key = self.key(script)
+            measured = [t for c, t in times.items() if c == key or c.startswith(key + ".")]
+            if measured:
+                self.durations[key] = round(sum(measured), 3)
+
+    def save_durations(self):
+        folder = os.path.dirname(self.durationsFile)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(self.durationsFile + ".tmp", 'w', encoding="utf-8") as f:
+            json.dump(self.durations, f, indent=1, ensure_ascii=False)
+        os.replace(self.durationsFile + ".tmp", self.durationsFile)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="run test scripts on several rigs at the same time")
+    parser.add_argument("paths", nargs="+", help="test scripts or folders")
+    parser.add_argument("--rigs", required=True, help="rig inventory(.json)")
+    parser.add_argument("--output", default=os.path.join("test", "rigs"), help="folder for outputs of all rigs")
+    parser.add_argument("--plugin", action="store_true", help="run test_*.json by common.tc.plugin instead of scripts")
+    parser.add_argument("--history", default=None, help="history of test case durations(.json)")
+    args, others = parser.parse_known_args()
+    patterns = ("test_*.json", ) if args.plugin else ("test_*.py", )
+    pytest_args = ["-p", "common.tc.plugin", *others] if args.plugin else others
+    history = History(args.history) if args.history else None
+    scheduler = RigScheduler(load_rigs(args.rigs), output=os.path.abspath(args.output), patterns=patterns, history=history)
+    codes = scheduler.run(args.paths, pytest_args=pytest_args)
+    sys.exit(max(codes.values()) if codes else 5)
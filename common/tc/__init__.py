@@ -3,8 +3,10 @@
 
 
 from common.tc.main import Gen as TestCaseGenerator
+from common.tc.history import History as TestCaseHistory
 
 
 __all__ = [
-    "TestCaseGenerator"
+    "TestCaseGenerator",
+    "TestCaseHistory",
 ]
@@ -11,8 +11,9 @@ try:
 except (ImportError, ModuleNotFoundError) as e:
     import logging as logger
 from common.tc.conf import ITEMS
-from common.tc.base import *
+from common.tc import base
 import json
+import ast
 import os
 import codecs
 
@@ -31,15 +32,7 @@ class TC:
             # verifying data and trying to convert data into list or tuple
             if j_name not in data:
                 raise KeyError(f"there's no key named: {j_name} in test case data: {data}, please set mapping table correctly")
-            value = data[j_name]
-            if isinstance(value, str):
-                try:
-                    tmp_value = eval(value)
-                except Exception:
-                    tmp_value = None
-
-                if tmp_value and isinstance(tmp_value, (list, tuple, dict)):
-                    value = tmp_value
+            value = self.convert(data[j_name])
 
             # create allure description
             allure_description.append(c_name + ":")
@@ -48,26 +41,58 @@ class TC:
                     if v:
                         allure_description.append(f"    {v}")
             elif isinstance(value, dict):
-                for key_, value_ in value:
+                for key_, value_ in value.items():
                     allure_description.append(f"    {key_} = {value_}")
             else:
                 if value:
                     allure_description.append(f"    {value}")
 
             # set data as one of instance's attribute
+            cls = getattr(base, c_name, None)
+            if not isinstance(cls, type):
+                raise ValueError(f"there's no class named: {c_name} in base.py, please set mapping table correctly")
+            if not isinstance(value, (list, tuple)):
+                value = str(value)
             if not delimiter:
-                if isinstance(value, (list, tuple)):
-                    setattr(self, c_name, eval(f"{c_name}({value}).value"))
-                else:
-                    setattr(self, c_name, eval(f"{c_name}('''{value}''').value"))
+                setattr(self, c_name, cls(value).value)
             else:
-                if isinstance(value, (list, tuple)):
-                    setattr(self, c_name, eval(f"{c_name}({value}, '{delimiter}').value"))
-                else:
-                    setattr(self, c_name, eval(f"{c_name}('''{value}''', '{delimiter}').value"))
+                setattr(self, c_name, cls(value, delimiter).value)
 
         setattr(self, "AllureDescription", allure_description)
 
+    @staticmethod
+    def convert(value):
+        """
+        trying to convert data like "['BAT ON', 'KL15 ON']" into list or tuple or dict
+        """
+        if isinstance(value, str):
+            try:
+                tmp_value = ast.literal_eval(value)
+            except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+                tmp_value = None
+
+            if tmp_value and isinstance(tmp_value, (list, tuple, dict)):
+                return tmp_value
+        return value
+
+    @classmethod
+    def test_id(cls, value):
+        """
+        TestId of a test case from its "key" only, without parsing other columns
+        """
+        value = cls.convert(value)
+        return base.TestId(value if isinstance(value, (list, tuple)) else str(value)).value
+
+    @classmethod
+    def signature(cls, value):
+        """
+        parsed preconditions of a test case from its "precondition" only, test cases with the same signature could be
+        executed one after another without changing power, KL15 and vehicle config
+        """
+        value = cls.convert(value)
+        steps = base.TestPrecondition(value if isinstance(value, (list, tuple)) else str(value)).value
+        return tuple(str(x) for x in steps if x)
+
 key_mapping = {
     "key": "TestId",
     "summary": "TestTitle",
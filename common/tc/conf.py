@@ -41,6 +41,13 @@ ITEMS = (
 
 
 class _Pattern:
+    r"""
+    patterns for parsing steps of test case, and codes created for each type of step
+
+    patterns are tried in the order they are defined(or registered), new types of step could be added without changing
+    this class:
+        Pattern.register("Relay", r"relay\s*(\d+)\s*(on|off)\s*(\(.*?\)|)", lambda a, b, z: f'API.relay({int(a)}, "{b}")  # {z}')
+    """
 
     # operation
     PatternBattery = re.compile(r"(?:bat|battery|power|pow)\s*?(?: |=|)\s*?(on|off|on_nocheck)\s*(\(.*?\)|)", re.IGNORECASE)
@@ -67,6 +74,7 @@ class _Pattern:
         """
         every pattern above mapping a method in current class, for example, you must add a method named "battery" if you
         have added a pattern named "PatternBattery" and method name must be in lower case
+        patterns added by _Pattern.register bring their own code and do not need a method here
         """
         def battery(self, a, z):
             if str(a).lower() in ("on", "off"):
@@ -92,7 +100,7 @@ class _Pattern:
             return f'API.send("{a}", "{b}", "{c}")  # {z}'
 
         def setvoltage(self, a, z):
-            return f'API.ps.set_voltage({float(a)})  # {z}'
+            return f'API.set_voltage({float(a)})  # {z}'
 
         def button(self, a, b, z):
             return f'API.button("{a}", "{b}")  # {z}'
@@ -125,6 +133,42 @@ class _Pattern:
 
     Code = _Code()
 
+    def __init__(self):
+        # precompiled dispatch tables, patterns are tried in the order they are defined above or registered
+        self._patterns = [
+            (attr[len("Pattern"):], pat) for attr, pat in self.__class__.__dict__.items()
+            if str(attr).startswith("Pattern") and isinstance(pat, re.Pattern)
+        ]
+        self._codes = {name.lower(): getattr(self.Code, name.lower()) for name, _ in self._patterns}
+        # arguments of register in order, so other processes(e.g. workers of Gen.run) could register the same
+        self.registered = []
+
+    def register(self, name: str, pattern: (str, re.Pattern), code, before: str = None):
+        """
+        add a new type of step
+        @param:
+            name: name of step type, e.g. "Relay", must be a valid identifier and not registered yet
+            pattern: regex(str, matched case insensitive) or compiled pattern, all groups are passed to code in order
+            code: a callable which gets all groups of pattern and returns one line of code(str) or a list of lines
+            before: name of a registered step type, the new pattern is tried before it, default to be tried last
+        """
+        if not str(name).isidentifier() or name.lower() in self._codes:
+            raise ValueError(f"name of step type must be a valid identifier and not registered yet: {name}")
+        if not callable(code):
+            raise TypeError(f"code for step type {name} must be callable")
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern, re.IGNORECASE)
+        index = len(self._patterns)
+        if before is not None:
+            names = [x[0].lower() for x in self._patterns]
+            if before.lower() not in names:
+                raise KeyError(f"step type {before} is not registered")
+            index = names.index(before.lower())
+        self._patterns.insert(index, (name, pattern))
+        self._codes[name.lower()] = code
+        self.registered.append((name, pattern, code, before))
+        logger.debug(f"new type of step registered: {name}")
+
     def parser(self, value: str):
         """
         match one step in Precondition/Step/Expectation and parse step as slots which could be used for generating .py scripts
@@ -141,14 +185,11 @@ class _Pattern:
             "Pic_发动机水温过高报警=90" -> ('ImageCompare', '发动机水温过高报警', '90', '')
             "OCR_发动机水温过高报警_ocr=发动机水温过高" -> ('OCR', '发动机水温过高报警_ocr', '发动机水温过高', '')
         """
-        if "（" or "：" in value:
-            value = value.replace("（", "(").replace("）", ")").replace("：", ":")
-        for attr in self.__class__.__dict__:
-            if str(attr).startswith("Pattern"):
-                pat = eval(f"self.{attr}")
-                result = pat.match(value.strip())
-                if result:
-                    return tuple([attr[len("Pattern"):]] + list(result.groups()))
+        value = value.replace("（", "(").replace("）", ")").replace("：", ":").strip()
+        for name, pat in self._patterns:
+            result = pat.match(value)
+            if result:
+                return (name, ) + result.groups()
         logger.warning(f"step can not be parsed: {value}, maybe it's just a comment or you need to add some rules to parse this new type of step")
 
     def parse_to_code(self, value: (str, list, tuple)):
@@ -174,8 +215,7 @@ class _Pattern:
         new_value = []
         for item in value:
             if item is not None:
-                params = item[1:]
-                codes = eval(f'self.Code.{item[0].lower()}(*{params})')
+                codes = self._codes[str(item[0]).lower()](*item[1:])
                 if isinstance(codes, str):
                     new_value.append(codes)
                 elif isinstance(codes, (list, tuple)):
@@ -185,3 +225,4 @@ class _Pattern:
 
 
 Pattern = _Pattern()
+
@@ -0,0 +1,212 @@
+#! /usr/bin/env python
+
+
+
+"""
+history of test case durations, fed from allure results or junit xml of previous runs, used for balancing test scripts
+(shard) and ordering test cases(reorder)
+
+durations are stored by name of test function(test_<TestId>) in a .json file, a new measurement is smoothed with the
+old one, so a single slow run does not move a test case too much.
+
+how to use:
+    from common.tc.history import History, shard, reorder
+
+    history = History("D:/xxx/test/history.json")
+    history.load_allure("D:/xxx/test/output_report/data")  # or history.load_junit("D:/xxx/test/junit_xml/junit.xml")
+    history.save()
+    buckets = shard(cases, 4, history)  # 4 lists of test case data with almost the same duration
+    buckets = shard(cases, 4, history, previous)  # test cases stay in their buckets of last time(lists of "key")
+    cases = reorder(cases)  # test cases with the same preconditions(BAT ON, KL15 ON, vehicle config) are neighbors
+"""
+
+try:
+    from common.logger.logger import logger
+except (ImportError, ModuleNotFoundError) as e:
+    import logging as logger
+from common.tc.case import TC
+import xml.etree.ElementTree as ET
+import statistics
+import heapq
+import glob
+import json
+import os
+
+
+__all__ = [
+    "History",
+    "test_name",
+    "shard",
+    "reorder",
+]
+
+
+def test_name(testId: str):
+    """
+    name of test function for a test case, the same as Template.TestCase.test_name and common.tc.plugin
+    @param:
+        testId: TestId of test case(value of "key" after parsed by TC)
+    """
+    testId = str(testId)
+    return testId if testId.lower().startswith("test_") else "test_" + testId
+
+
+class History:
+    def __init__(self, file: str = None, alpha: float = 0.5, default: (int, float) = 10):
+        """
+        class init
+        @param:
+            file: .json file to load and save durations, history is only kept in memory if None
+            alpha: weight of a new measurement, 1 for always using the latest duration
+            default: duration(s) of a test case which has never been run and there's no history at all
+        """
+        self.file = file
+        self.alpha = alpha
+        self.default = default
+        self.durations = {}
+        self.__median = None
+        if file and os.path.exists(file):
+            with open(file, 'r', encoding="utf-8") as f:
+                self.durations = json.load(f)
+
+    def __len__(self):
+        return len(self.durations)
+
+    def record(self, name: str, seconds: (int, float)):
+        """
+        record one measured duration of a test case
+        @param:
+            name: name of test function
+            seconds: duration
+        """
+        old = self.durations.get(name)
+        self.durations[name] = round(seconds if old is None else self.alpha * seconds + (1 - self.alpha) * old, 3)
+        self.__median = None
+
+    def estimate(self, name: str):
+        """
+        @param:
+            name: name of test function
+        @return:
+            float: estimated duration of a test case, median of all test cases if it has never been run
+        """
+        if name in self.durations:
+            return self.durations[name]
+        if self.__median is None:
+            self.__median = statistics.median(self.durations.values()) if self.durations else self.default
+        return self.__median
+
+    def load_allure(self, folder: str):
+        """
+        read durations from allure results(xxx-result.json), test case is identified by label "as_id"(allure.id) or
+        name of test function
+        @return:
+            int: number of durations recorded
+        """
+        count = 0
+        for fn in glob.glob(os.path.join(folder, "*-result.json")):
+            try:
+                with open(fn, 'r', encoding="utf-8") as f:
+                    result = json.load(f)
+                seconds = (result["stop"] - result["start"]) / 1000
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning(f"allure result <{fn}> could not be read: {e}")
+                continue
+            label = next((x.get("value") for x in result.get("labels", []) if x.get("name") == "as_id"), None)
+            name = test_name(label) if label else str(result.get("name", "")).split("[")[0]
+            if name:
+                self.record(name, seconds)
+                count += 1
+        logger.info(f"{count} durations of test cases loaded from allure results: {folder}")
+        return count
+
+    def load_junit(self, file: str):
+        """
+        read durations from junit xml(pytest --junitxml)
+        @return:
+            int: number of durations recorded
+        """
+        count = 0
+        for case in ET.parse(file).getroot().iter("testcase"):
+            name = str(case.get("name", "")).split("[")[0]
+            if name and case.get("time"):
+                self.record(name, float(case.get("time")))
+                count += 1
+        logger.info(f"{count} durations of test cases loaded from junit xml: {file}")
+        return count
+
+    def save(self):
+        if not self.file:
+            return
+        folder = os.path.dirname(self.file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(self.file + ".tmp", 'w', encoding="utf-8") as f:
+            json.dump(self.durations, f, indent=1, ensure_ascii=False)
+        os.replace(self.file + ".tmp", self.file)
+
+
+def _case_name(case):
+    """
+    name of test function for test case data, None if it's not a test case
+    """
+    if not isinstance(case, dict) or "key" not in case:
+        return None
+    return test_name(TC.test_id(case["key"]))
+
+
+def shard(cases: (list, tuple), n: int, history: History, previous: (list, tuple) = None):
+    """
+    divide test cases into n buckets with almost the same duration, the longest test case first to the bucket with the
+    least duration
+    @param:
+        cases: a list of test case data(dict)
+        n: number of buckets
+        history: durations of test cases
+        previous: buckets of last time, n lists of "key" of test cases, test cases keep their buckets and only new test
+            cases are added to the buckets with the least duration, so changed durations do not move test cases. all
+            test cases are divided again if None or the number of buckets changed
+    @return:
+        list: n lists of test case data, test cases in a bucket keep the original order, a bucket may be empty if
+            previous is given and its test cases were removed
+    """
+    n = max(1, min(n, len(cases)))
+    durations = [history.estimate(_case_name(x)) for x in cases]
+    buckets = [[] for _ in range(n)]
+    loads = [0.0] * n
+    pending = range(len(cases))
+    if previous is not None and len(previous) == n:
+        owners = {key: bucket for bucket, keys in enumerate(previous) for key in keys}
+        pending = []
+        for index, case in enumerate(cases):
+            bucket = owners.get(str(case.get("key")) if isinstance(case, dict) else None)
+            if bucket is None:
+                pending.append(index)
+            else:
+                buckets[bucket].append(index)
+                loads[bucket] += durations[index]
+    heap = [(loads[bucket], bucket) for bucket in range(n)]
+    heapq.heapify(heap)
+    for index in sorted(pending, key=lambda x: (-durations[x], x)):
+        load, bucket = heapq.heappop(heap)
+        buckets[bucket].append(index)
+        heapq.heappush(heap, (load + durations[index], bucket))
+    return [[cases[x] for x in sorted(bucket)] for bucket in buckets]
+
+
+def reorder(cases: (list, tuple)):
+    """
+    put test cases with the same preconditions together, groups are ordered by their first test case, so power cycles
+    and vehicle config writes between neighbors are avoided
+    @param:
+        cases: a list of test case data(dict)
+    @return:
+        list: reordered test case data
+    """
+    groups = {}
+    for case in cases:
+        signature = None
+        if isinstance(case, dict) and "precondition" in case:
+            signature = TC.signature(case["precondition"])
+        groups.setdefault(signature, []).append(case)
+    return [case for group in groups.values() for case in group]
@@ -4,12 +4,20 @@
 
 """
 search for file named "test_xxx.json" and parse file and create a .py scripts
+
+every .py script(a chunk of test cases) is generated independently, chunks are generated in a process pool if there
+are many test cases, see Gen.run
+a manifest(.manifest.json) in each folder of test scripts records a hash for every test case, only scripts with changed
+test cases are written again, so unchanged scripts keep their caches(.pyc, pytest cache). scripts balanced by history
+keep their test cases when durations change, test cases are moved only if rebalanced explicitly
 """
 
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import pickle
 import json
 import os
 import time
-import shutil
 try:
     from common.logger.logger import logger
 except (ImportError, ModuleNotFoundError) as e:
@@ -17,6 +25,113 @@ except (ImportError, ModuleNotFoundError) as e:
 from common.tc.template import Template
 from common.tc.conf import Pattern
 from common.tc.case import TC
+from common.tc.history import History, shard, reorder as reorder_cases
+
+
+# generate in a process pool only if there are more test cases than this, starting processes takes some time
+PARALLEL_THRESHOLD = 1000
+
+# increase this version if generated code changed(template.py, conf.py, base.py), then all scripts will be regenerated
+GENERATOR_VERSION = 3
+
+MANIFEST = ".manifest.json"
+
+
+def case_hash(data):
+    """
+    hash of one test case, changed if any field of test case or GENERATOR_VERSION changed
+    @param:
+        data: test case data, normally a dict
+    @return:
+        str: sha1 in hex
+    """
+    content = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(f"{GENERATOR_VERSION}:{content}".encode("utf-8")).hexdigest()
+
+
+def _read_manifest(tc_folder: str):
+    """
+    @return:
+        dict: manifest of test scripts in folder, empty if not exists or generated by another version
+    """
+    path = os.path.join(tc_folder, MANIFEST)
+    try:
+        with open(path, 'r', encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict) or manifest.get("version") != GENERATOR_VERSION:
+        return {}
+    return manifest
+
+
+def _write_manifest(tc_folder: str, manifest: dict):
+    """
+    write manifest to a temp file then replace, so a broken manifest never exists
+    """
+    path = os.path.join(tc_folder, MANIFEST)
+    with open(path + ".tmp", 'w', encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def _write_script(source: str, tc_file: str, cases: list):
+    """
+    create one .py test script with a chunk of test cases, it's a module level function so it could be sent to a process pool
+    @param:
+        source: source data file(.json) of test cases
+        tc_file: absolute path of .py script
+        cases: a list of test case data(dict)
+    @return:
+        int: number of test cases written to script
+    """
+    written = 0
+    with Template(tc_file, atomic=True) as f:
+        # f.module_header()
+        # f.module_doc()
+        f.module_import()
+        # f.module_globals()
+        f.class_name(os.path.split(source)[1])
+        # f.class_doc()
+        # f.class_setup(["API.reset_measurement()", "API.reset_battery()"])
+        f.class_setup(["API.reset_measurement()"])
+        f.class_teardown(["# API.close()"])
+        # f.method_setup(["API.reset_battery()"])
+        f.method_setup()
+        # f.method_teardown(["API.reset_battery()", "API.reset_signals()"])
+        # f.method_teardown(["API.reset_battery()"])
+        f.method_teardown(["API.finish_test()"])
+        for data in cases:
+            if not isinstance(data, dict):
+                logger.error(f"data: '{data}' from: '{source}' could not be parsed, data must be a dict, skipped")
+                continue
+            tc = TC(data)
+            f.TestCase.allure_id(tc.TestId)
+            f.TestCase.allure_title(f"{tc.TestId}({tc.TestTitle})")
+            f.TestCase.allure_description(tc.AllureDescription)
+            f.TestCase.allure_tag(tc.TestTag)
+            # f.TestCase.pytest_mark()
+            f.TestCase.test_name(tc.TestId)
+            # f.TestCase.test_doc()
+            f.TestCase.test_precondition(Pattern.parse_to_code(tc.TestPrecondition))
+            f.TestCase.test_step(Pattern.parse_to_code(tc.TestStep))
+            f.TestCase.test_assert(Pattern.parse_to_code(tc.TestExpectation))
+            written += 1
+    logger.info(f"successfully created test scripts: {tc_file} with test data file: {source}")
+    return written
+
+
+def _init_worker(registered: list):
+    """
+    register types of step added by Pattern.register in parent process, a worker started by spawn(Windows) only has the
+    built-in ones
+    @param:
+        registered: Pattern.registered of parent process
+    """
+    names = [x[0].lower() for x in Pattern.registered]
+    for args in registered:
+        if args[0].lower() not in names:
+            Pattern.register(*args)
 
 
 class Gen:
@@ -82,18 +197,42 @@ class Gen:
                                 break
                             time.sleep(0.01)
 
-    def run(self, count: int = 100):
+    def run(self, count: int = 100, workers: int = None, force: bool = False, history: (str, History) = None,
+            reorder: bool = False, rebalance: bool = False):
         """
         1.clear all test scripts(in format test_xxx_xxx.py) in folders starts with 'test_' if clear is set
         2.read all source data files(in format text_xxx_xxx.json) and load as a list
-        3.create and open a .py file which is in same path with the corresponding .json file
-        4.write file header and import codes to .py file
-        5.read all test data circularly and parsed them into codes and write them to .py file
+        3.divide test data of each file into chunks, one chunk for one .py file which is in same path with the corresponding .json file
+        4.compare hashes of test cases in chunk with manifest, skip the chunk if nothing changed and .py file exists
+        5.write file header and import codes to .py file
+        6.read all test data of the chunk circularly and parsed them into codes and write them to .py file
+        7.remove .py files which are not in manifest any more and update manifest
+        step 5 and 6 are executed in a process pool for each chunk
         @param:
             count: every .py test script contains 'count' test cases, default to 100
+            workers: number of processes, 1 for generating in current process, default to number of cpus if there
+                are more than PARALLEL_THRESHOLD test cases otherwise 1. types of step added by Pattern.register are
+                registered in every process, their code must be picklable(a module level function, not a lambda),
+                otherwise all scripts are generated in current process
+            force: True for regenerating all scripts even if nothing changed
+            history: History object or its .json file, test cases are divided into scripts with almost the same
+                duration instead of by order, number of scripts is still decided by count. scripts are named by
+                index of shard(test_xxx_shard_0.py, ...) and test cases stay in their scripts of last time, only new
+                test cases are added to the scripts with the least duration, so unchanged scripts are not generated again
+            reorder: True for putting test cases with the same preconditions together
+            rebalance: True for dividing all test cases again by the latest durations of history, also done if the
+                number of scripts changed
+        @return:
+            int: number of test cases generated
         """
         # if clear:
         #     self.clear_scripts()
+        start_t = time.perf_counter()
+        if isinstance(history, str):
+            history = History(history)
+        jobs = []
+        manifests = {}
+        skipped = 0
         for source in self.fl:
             # load json file as an object
             tc_folder = source.replace(".json", "")
@@ -104,54 +243,84 @@ class Gen:
                 logger.error(f"source data file: '{source}' has no data for test case, skipped")
                 continue
 
-            # clear folder before regenerate
-            if os.path.exists(tc_folder):
-                shutil.rmtree(tc_folder)
-                for _ in range(100):
-                    if not os.path.exists(tc_folder):
-                        break
-                    time.sleep(0.01)
             if not os.path.exists(tc_folder):
                 os.makedirs(tc_folder)
+            old_manifest = {} if force else _read_manifest(tc_folder)
+            old_chunks = old_manifest.get("chunks", {})
+
+            # divide test data, one chunk for one test script, only changed chunks are generated
+            if reorder:
+                tc_data = reorder_cases(tc_data)
+            shards = None
+            if history is not None:
+                # membership of shards is kept from manifest unless rebalanced, order inside a chunk is kept, so
+                # reordered test cases stay together
+                shards = max(1, min(-(-json_len // count), json_len))
+                previous = None
+                if not rebalance and old_manifest.get("shards") == shards:
+                    previous = [[] for _ in range(shards)]
+                    for chunk in old_chunks.values():
+                        if 0 <= chunk.get("shard", -1) < shards:
+                            previous[chunk["shard"]] = [x[0] for x in chunk["cases"]]
+                parts = shard(tc_data, shards, history, previous)
+            else:
+                parts = [tc_data[num: num + count] for num in range(0, json_len, count)]
+            chunks = {}
+            for index, cases in enumerate(parts):
+                if not cases:
+                    continue
+                if shards is not None:
+                    tc_name = f"{os.path.split(tc_folder)[1]}_shard_{index}.py"
+                else:
+                    num = index * count
+                    tc_name = f"{os.path.split(tc_folder)[1]}_{num}_{num + count - 1}.py"
+                tc_file = os.path.join(tc_folder, tc_name)
+                hashes = [[str(x.get("key")) if isinstance(x, dict) else None, case_hash(x)] for x in cases]
+                chunk_hash = hashlib.sha1("".join(x[1] for x in hashes).encode("utf-8")).hexdigest()
+                chunks[tc_name] = {"hash": chunk_hash, "cases": hashes}
+                if shards is not None:
+                    chunks[tc_name]["shard"] = index
+                if old_chunks.get(tc_name, {}).get("hash") == chunk_hash and os.path.exists(tc_file):
+                    skipped += len(cases)
+                    continue
+                jobs.append((source, tc_file, cases))
+
+            # remove scripts which do not belong to any chunk, e.g. after test cases deleted or count changed
+            prefix = os.path.split(tc_folder)[1] + "_"
+            for f in os.listdir(tc_folder):
+                if f.startswith(prefix) and f.endswith(".py") and f not in chunks:
+                    os.remove(os.path.join(tc_folder, f))
+                    logger.info(f"stale test script removed: {os.path.join(tc_folder, f)}")
+            manifests[tc_folder] = {"version": GENERATOR_VERSION, "source": os.path.split(source)[1], "chunks": chunks}
+            if shards is not None:
+                manifests[tc_folder]["shards"] = shards
+
+        total = sum(len(x[2]) for x in jobs)
+        if workers is None:
+            workers = min(len(jobs), os.cpu_count() or 1) if total > PARALLEL_THRESHOLD else 1
+        workers = max(1, min(workers, len(jobs)))
+        if workers > 1 and Pattern.registered:
+            try:
+                pickle.dumps(Pattern.registered)
+            except (pickle.PicklingError, AttributeError, TypeError) as e:
+                # e.g. code is a lambda, workers could not get the registered types of step
+                logger.warning(f"types of step registered could not be sent to worker processes, generated in current process: {e}")
+                workers = 1
+        if workers > 1:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(Pattern.registered, ))
+            with pool as executor:
+                written = sum(executor.map(_write_script, *zip(*jobs)))
+        else:
+            written = sum(_write_script(*job) for job in jobs)
+        # manifest is only updated after all scripts written, a failed run will be generated again next time
+        for tc_folder, manifest in manifests.items():
+            _write_manifest(tc_folder, manifest)
 
-            # start generate test scripts and divide
-            script_num = json_len // count + 1 if json_len % count else json_len // count
-            for num in range(script_num):
-                tc_file = os.path.join(tc_folder, f"{os.path.split(tc_folder)[1]}_{num * count}_{num * count + count - 1}.py")
-                with Template(tc_file) as f:
-                    # f.module_header()
-                    # f.module_doc()
-                    f.module_import()
-                    # f.module_globals()
-                    f.class_name(os.path.split(source)[1])
-                    # f.class_doc()
-                    # f.class_setup(["API.reset_measurement()", "API.reset_battery()"])
-                    f.class_setup(["API.reset_measurement()"])
-                    f.class_teardown(["# API.close()"])
-                    # f.method_setup(["API.reset_battery()"])
-                    f.method_setup()
-                    # f.method_teardown(["API.reset_battery()", "API.reset_signals()"])
-                    # f.method_teardown(["API.reset_battery()"])
-                    if num == script_num - 1:
-                        s_data = tc_data[num * count:]
-                    else:
-                        s_data = tc_data[num * count: num * count + count]
-                    for data in s_data:
-                        if not isinstance(data, dict):
-                            logger.error(f"data: '{data}' from: '{source}' could not be parsed, data must be a dict, skipped")
-                            continue
-                        tc = TC(data)
-                        f.TestCase.allure_id(tc.TestId)
-                        f.TestCase.allure_title(f"{tc.TestId}({tc.TestTitle})")
-                        f.TestCase.allure_description(tc.AllureDescription)
-                        f.TestCase.allure_tag(tc.TestTag)
-                        # f.TestCase.pytest_mark()
-                        f.TestCase.test_name(tc.TestId)
-                        # f.TestCase.test_doc()
-                        f.TestCase.test_precondition(Pattern.parse_to_code(tc.TestPrecondition))
-                        f.TestCase.test_step(Pattern.parse_to_code(tc.TestStep))
-                        f.TestCase.test_assert(Pattern.parse_to_code(tc.TestExpectation))
-                logger.info(f"successfully created test scripts: {tc_file} with test data file: {source}")
+        elapsed = time.perf_counter() - start_t
+        logger.info(f"{written} test cases in {len(jobs)} scripts generated in {elapsed:.3f}s "
+                    f"({written / elapsed if elapsed else 0:.1f} cases/s) with {workers} process(es), "
+                    f"{skipped} unchanged test cases skipped")
+        return written
 
 
 if __name__ == "__main__":
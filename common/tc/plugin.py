@@ -0,0 +1,127 @@
+#! /usr/bin/env python
+
+
+
+"""
+pytest plugin, collect test cases directly from source data files("test_xxx.json") and execute them without generating
+.py scripts
+
+steps of each test case are parsed once at collection by Pattern(see conf.py) and converted to the same code as the
+generated scripts(Pattern.parse_to_code), the code is compiled once and executed against api.API, so a test case
+behaves the same in both ways, and new types of step registered by Pattern.register work without anything else.
+a test file is collected as one class of generated scripts: API.reset_measurement() before the first test case of file,
+API.finish_test() after every test case.
+
+how to use:
+    pytest -p common.tc.plugin input/input_case
+    (a source data file with generated scripts(folder "test_xxx" next to "test_xxx.json") is collected only if it is
+    given explicitly, the generated scripts are collected instead)
+    pytest -p common.tc.plugin input/input_case/test_tell1.json -k Position_indicator
+"""
+
+try:
+    from common.logger.logger import logger
+except (ImportError, ModuleNotFoundError) as e:
+    import logging as logger
+try:
+    import allure
+except (ImportError, ModuleNotFoundError) as e:
+    allure = None
+from common.tc.case import TC
+from common.tc.conf import Pattern
+import pytest
+import json
+
+
+__all__ = [
+    "JsonFile",
+    "CaseItem",
+    "compile_steps",
+]
+
+
+def compile_steps(steps: (list, tuple), name: str = "<steps>"):
+    """
+    convert parsed steps of TC(TestPrecondition/TestStep/TestExpectation) to the code of generated scripts and compile
+    it, steps which could not be parsed(None) are dropped as comments like generated scripts do
+    @param:
+        steps: parsed steps
+        name: name of code shown in tracebacks
+    @return:
+        code: compiled code, executed with API in its globals
+    """
+    steps = [x for x in steps if x]
+    lines = Pattern.parse_to_code(steps) if steps else []
+    return compile("\n".join(lines), name, "exec")
+
+
+class JsonFile(pytest.File):
+    """
+    one source data file, every test case in it is collected as a CaseItem
+    """
+    def collect(self):
+        with open(self.path, 'r', encoding="utf-8") as f:
+            data = json.load(f)
+        for case in data:
+            if not isinstance(case, dict):
+                logger.error(f"data: '{case}' from: '{self.path}' could not be parsed, data must be a dict, skipped")
+                continue
+            tc = TC(case)
+            name = tc.TestId if str(tc.TestId).lower().startswith("test_") else f"test_{tc.TestId}"
+            yield CaseItem.from_parent(self, name=name, tc=tc)
+
+    def setup(self):
+        logger.info(f"{'=' * 30} class setup {'=' * 30}")
+        self.api.reset_measurement()
+
+    def teardown(self):
+        logger.info(f"{'=' * 30} class teardown {'=' * 30}")
+
+    @property
+    def api(self):
+        # imported at the first test case, collecting does not need any device
+        from api import API
+        return API
+
+
+class CaseItem(pytest.Item):
+    def __init__(self, *, tc: TC, **kwargs):
+        super().__init__(**kwargs)
+        self.tc = tc
+        self.precondition = compile_steps(tc.TestPrecondition, f"<{self.name}: precondition>")
+        self.step = compile_steps(tc.TestStep, f"<{self.name}: step>")
+        self.expectation = compile_steps(tc.TestExpectation, f"<{self.name}: assert>")
+
+    def runtest(self):
+        tc = self.tc
+        if allure is not None:
+            allure.dynamic.id(tc.TestId)
+            allure.dynamic.title(f"{tc.TestId}({tc.TestTitle})")
+            allure.dynamic.description("\n".join(tc.AllureDescription))
+            if tc.TestTag:
+                allure.dynamic.tag(*sorted(tc.TestTag))
+        namespace = {"API": self.parent.api}
+        logger.info(f"{'*' * 10} method setup: {self.name} {'*' * 10}")
+        logger.info(">>>test preconditions:")
+        exec(self.precondition, namespace)
+        logger.info(">>>test steps:")
+        exec(self.step, namespace)
+        logger.info(">>>test assert:")
+        exec(self.expectation, namespace)
+
+    def teardown(self):
+        # evidences of this test case are attached before allure closes it
+        self.parent.api.finish_test()
+
+    def reportinfo(self):
+        return self.path, None, f"{self.name}({self.tc.TestTitle})"
+
+
+def pytest_collect_file(file_path, parent):
+    if file_path.name.lower().startswith("test_") and file_path.suffix.lower() == ".json":
+        # scripts generated from this file(folder "test_xxx" next to it) are collected by pytest already, the file is
+        # collected only if it is given explicitly, otherwise every test case would run twice
+        if file_path.with_suffix("").is_dir() and not parent.session.isinitpath(file_path):
+            logger.debug(f"{file_path.name} skipped, scripts generated from it are collected")
+            return None
+        return JsonFile.from_parent(parent, path=file_path)
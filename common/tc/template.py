@@ -36,14 +36,25 @@ def add_linebreak(data: (str, list, tuple), ch: str = "\n"):
 
 
 class Template:
-    def __init__(self, filename: str, mode: str = "w"):
+    def __init__(self, filename: str, mode: str = "w", atomic: bool = False):
+        """
+        class init
+        @param:
+            filename: absolute path of .py file
+            mode: mode to open file
+            atomic: True for writing to a temp file and replacing filename after all written, so a half written test
+                script never exists
+        """
         self.fn = filename
         self.mode = mode
+        self.atomic = atomic and mode == "w"
+        # buffer of test cases belongs to this file only, so several files could be generated at the same time
+        self.TestCase = self._TestCase()
         logger.info(f"start generating test scripts for pytest, file name is : {filename}")
 
     def __enter__(self):
         if self.fn.endswith(".py"):
-            self.f = open(self.fn, mode=self.mode, encoding="utf-8")
+            self.f = open(self.fn + ".tmp" if self.atomic else self.fn, mode=self.mode, encoding="utf-8")
             self.TestCase.clear_buffer()
             return self
         else:
@@ -52,6 +63,11 @@ class Template:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.f.writelines(self.TestCase.buffer)
         self.f.close()
+        if self.atomic:
+            if exc_type is None:
+                os.replace(self.fn + ".tmp", self.fn)
+            else:
+                os.remove(self.fn + ".tmp")
 
     def module_header(self, header: (list, tuple) = None):
         pass
@@ -179,8 +195,6 @@ class Template:
             steps = [f'\n{SPACE_8}logger.info(">>>test assert:")'] + [SPACE_8 + x for x in steps] + [""]
             self.buffer.extend(add_linebreak(steps))
 
-    TestCase = _TestCase()
-
 
 if __name__ == "__main__":
     pass
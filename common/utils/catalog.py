@@ -0,0 +1,205 @@
+#! /usr/bin/env python
+
+
+
+"""
+catalog of template images, maps name of image to path and location("name(x1, y1, x2, y2).png")
+
+all search dirs are scanned once and the result is saved to an index file, next time the index is loaded if no dir
+has been modified(checked by modification time of dirs, files are not listed again). a file removed after indexing or a
+name not found while some dir has been modified triggers one rescan, so new template images are found without deleting
+the index. a name not found is not scanned for again until a dir is modified.
+
+how to use:
+	from common.utils.catalog import TemplateCatalog
+
+	catalog = TemplateCatalog("D:/xxx/config/template_index.json")
+	path, location = catalog.lookup("发动机水温过高报警", ["D:/xxx/input/input_images", "D:/xxx/test"])
+"""
+
+try:
+	from common.logger.logger import logger
+except (ImportError, ModuleNotFoundError) as e:
+	import logging as logger
+import threading
+import json
+import os
+import re
+
+
+__all__ = [
+	"TemplateCatalog",
+]
+
+
+# increase this version if the format of index file or the way to parse names changed
+CATALOG_VERSION = 1
+
+PatternName = re.compile(r"(.+?)\(.*")
+PatternLocation = re.compile(r".*?\((\d+),\s*?(\d+),\s*?(\d+),\s*?(\d+)\)")
+
+
+def parse_location(fileName: str):
+	"""
+	@param:
+		fileName: name of template image, e.g. "name(10, 20, 110, 60).png"
+	@return:
+		list: [x1, y1, x2, y2], None if there's no location in name
+	"""
+	res = PatternLocation.match(fileName)
+	return [int(x) for x in res.groups()] if res else None
+
+
+class TemplateCatalog:
+	def __init__(self, indexFile: str = None):
+		"""
+		class init
+		@param:
+			indexFile: .json file to save index, index is only kept in memory if None
+		"""
+		self.indexFile = indexFile
+		self._catalogs = {}
+		self._lock = threading.Lock()
+		self._saved = None
+		if indexFile and os.path.exists(indexFile):
+			try:
+				with open(indexFile, 'r', encoding="utf-8") as f:
+					data = json.load(f)
+				if data.get("version") == CATALOG_VERSION:
+					self._saved = data.get("catalogs", {})
+			except (OSError, ValueError) as e:
+				logger.warning(f"index of template images <{indexFile}> could not be read and will be rebuilt: {e}")
+
+	@staticmethod
+	def _key(searchList: (list, tuple)):
+		return "|".join(os.path.abspath(x) for x in searchList if x)
+
+	@staticmethod
+	def _unchanged(dirs: dict):
+		"""
+		check saved dirs by modification time only, a file or sub-dir added/removed/renamed changes mtime of its dir
+		@param:
+			dirs: {dir: modification time} saved in index
+		"""
+		try:
+			return all(os.stat(d).st_mtime_ns == mtime for d, mtime in dirs.items())
+		except OSError:
+			return False
+
+	@staticmethod
+	def _scan(searchList: (list, tuple)):
+		"""
+		list all files once, the first file found in the order of os.walk wins for the same name, like searching one by one
+		@return:
+			dict: {"dirs": {dir: mtime}, "exact": {file name: path}, "fuzzy": {name: path}}
+		"""
+		dirs, exact, fuzzy = {}, {}, {}
+		for path in searchList:
+			if not path:
+				logger.error(f"[template] or [resource] or [root] not found in settings.ini, please set path first")
+				continue
+			for root_, subs, files in os.walk(path):
+				dirs[root_] = os.stat(root_).st_mtime_ns
+				for f in files:
+					exact.setdefault(f.lower(), os.path.join(root_, f))
+					res = PatternName.match(f)
+					if res:
+						fuzzy.setdefault(res.group(1).lower(), os.path.join(root_, f))
+		return {"dirs": dirs, "exact": exact, "fuzzy": fuzzy}
+
+	def _catalog(self, searchList: (list, tuple), refresh: bool = False):
+		key = self._key(searchList)
+		with self._lock:
+			if not refresh and key in self._catalogs:
+				return self._catalogs[key]
+			saved = None if refresh or not self._saved else self._saved.get(key)
+			if saved and self._unchanged(saved.get("dirs", {})):
+				catalog = saved
+				logger.info(f"index of {len(catalog['exact'])} template images loaded from <{self.indexFile}>")
+			else:
+				catalog = self._scan(searchList)
+				logger.info(f"{len(catalog['exact'])} template images indexed in: {searchList}")
+				if catalog != (self._saved or {}).get(key):
+					self._save(key, catalog)
+			self._catalogs[key] = catalog
+			return catalog
+
+	def _save(self, key: str, catalog: dict):
+		if not self.indexFile:
+			return
+		self._saved = dict(self._saved or {})
+		self._saved[key] = catalog
+		try:
+			folder = os.path.dirname(self.indexFile)
+			if folder:
+				os.makedirs(folder, exist_ok=True)
+			with open(self.indexFile + ".tmp", 'w', encoding="utf-8") as f:
+				json.dump({"version": CATALOG_VERSION, "catalogs": self._saved}, f, ensure_ascii=False)
+			os.replace(self.indexFile + ".tmp", self.indexFile)
+		except OSError as e:
+			logger.warning(f"index of template images could not be saved to <{self.indexFile}>: {e}")
+
+	def find(self, name: str, searchList: (list, tuple), match: bool = False):
+		"""
+		@param:
+			name: the full name(match=True) or the name before location of the image
+			searchList: a list of dirs used for searching template images
+			match: True: name of file must be fully matched(case insensitive), False: name before "(" matched
+		@return:
+			str: absolute path of image, None if not found
+		"""
+		table = "exact" if match else "fuzzy"
+		catalog = self._catalog(searchList)
+		path = catalog[table].get(name.lower())
+		if path is None and self._unchanged(catalog["dirs"]):
+			# no image added since indexing, scanning again finds nothing new
+			return None
+		if path is None or not os.path.exists(path):
+			# new image added or image removed after indexing
+			path = self._catalog(searchList, refresh=True)[table].get(name.lower())
+		return path
+
+	def lookup(self, name: str, searchList: (list, tuple), match: bool = False):
+		"""
+		@return:
+			tuple: (absolute path of image, [x1, y1, x2, y2] or None), see self.find
+		"""
+		path = self.find(name, searchList, match)
+		if path is None:
+			return None, None
+		return path, parse_location(os.path.split(path)[1])
+
+	def refresh(self):
+		"""
+		forget all catalogs in memory, dirs are checked or scanned again at next lookup
+		"""
+		with self._lock:
+			self._catalogs.clear()
+
+
+if __name__ == "__main__":
+	import tempfile
+	import time
+	folder = tempfile.mkdtemp()
+	for i in range(5000):
+		sub = os.path.join(folder, f"dir{i % 50}")
+		os.makedirs(sub, exist_ok=True)
+		open(os.path.join(sub, f"icon{i}({i}, 0, {i + 10}, 10).png"), 'w').close()
+	index = os.path.join(tempfile.mkdtemp(), "index.json")
+	t1 = time.time()
+	print(TemplateCatalog(index).lookup("icon4999", [folder]), f"first lookup with scan: {time.time() - t1:.3f}s")
+	t1 = time.time()
+	catalog = TemplateCatalog(index)
+	catalog.lookup("icon0", [folder])
+	print(f"first lookup from index: {time.time() - t1:.3f}s")
+	t1 = time.time()
+	for i in range(1000):
+		catalog.lookup(f"icon{i}", [folder])
+	print(f"1000 lookups: {time.time() - t1:.3f}s")
+	mtime = os.stat(index).st_mtime_ns
+	t1 = time.time()
+	for i in range(100):
+		catalog.lookup(f"missing{i}", [folder])
+	print(f"100 lookups not found: {time.time() - t1:.3f}s, index written again: {os.stat(index).st_mtime_ns != mtime}")
+	open(os.path.join(folder, "dir0", "missing0(0, 0, 10, 10).png"), 'w').close()
+	print(catalog.lookup("missing0", [folder]), "found after added")
@@ -5,8 +5,8 @@ try:
 	from common.logger.logger import logger
 except (ImportError, ModuleNotFoundError) as e:
 	import logging as logger
+from common.utils.catalog import TemplateCatalog
 import os
-import re
 import shutil
 import time
 
@@ -20,8 +20,15 @@ class Utils:
 			cls.__instance = super().__new__(cls)
 		return cls.__instance
 
-	def __init__(self):
+	def __init__(self, templateIndex: str = None):
+		"""
+		class init
+		@param:
+			templateIndex(optional): .json file to save index of template images, see common.utils.catalog
+		"""
 		logger.info(f"initialize utils")
+		if templateIndex or not hasattr(self, "catalog"):
+			self.catalog = TemplateCatalog(templateIndex)
 
 	def clear_test_scripts(self, path: str, clear: bool = True):
 		"""
@@ -99,7 +106,8 @@ class Utils:
 
 	def template_image(self, name: str, searchList: (list, tuple), match: bool = False):
 		"""
-		search an image from resource and project and return the absolute path of image
+		search an image from resource and project and return the absolute path of image, dirs are indexed once by
+		self.catalog, so searching again is only a dict lookup
 		@param:
 			name: the full name or part of the name of the image
 			match: True: object must be fully matched in character and case sensitive
@@ -108,21 +116,23 @@ class Utils:
 		@return:
 			str, the absolute path of image or raise error
 		"""
-		pat = re.compile(r"(.+?)\(.*")
-		for path in searchList:
-			if not path:
-				logger.error(f"[template] or [resource] or [root] not found in settings.ini, please set path first")
-				continue
-			for root_, dirs, files in os.walk(path):
-				for f in files:
-					if match:
-						if name.lower() == f.lower():
-							return os.path.join(root_, f)
-					else:
-						res = re.match(pat, f)
-						if res and res.group(1).lower() == name.lower():
-							return os.path.join(root_, f)
-		raise FileNotFoundError(f"image not found, 1. <searchList={searchList}> must be set properly for searching, 2.there's no image found")
+		path = self.catalog.find(name, searchList, match)
+		if path is None:
+			raise FileNotFoundError(f"image not found, 1. <searchList={searchList}> must be set properly for searching, 2.there's no image found")
+		return path
+
+	def template_location(self, name: str, searchList: (list, tuple), match: bool = False):
+		"""
+		search an image like self.template_image and return its location parsed from file name
+		@return:
+			tuple: (the absolute path of image, [x1, y1, x2, y2]) or raise error
+		"""
+		path, location = self.catalog.lookup(name, searchList, match)
+		if path is None:
+			raise FileNotFoundError(f"image not found, 1. <searchList={searchList}> must be set properly for searching, 2.there's no image found")
+		if location is None:
+			raise ValueError(f"no location found in name of image: <{path}>, name(x1, y1, x2, y2).png expected")
+		return path, location
 
 
 if __name__ == "__main__":
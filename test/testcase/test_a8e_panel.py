@@ -1,5 +1,4 @@
-from common.adb.adb import adb
-from common.qnx.qnx import qnx
+from common.qnx.capture import CaptureService
 from common.can.can import CANoe
 from common.utils import read_yaml
 from common.utils import read_excel
@@ -8,6 +7,8 @@ from common.utils import case_fail
 import pytest
 import allure
 import time
+import posixpath
+import cv2
 
 class TestUint_Panel():
 
@@ -18,13 +19,11 @@ class TestUint_Panel():
         # self.app.open_cfg(self.config_data["cfg_path"]) #导入某个CANoe congif
         # self.app.start_Measurement()
         # time.sleep(3)
-        self.test_qnx = qnx(self.config_data["devices"],self.config_data["qnx_ip"],self.config_data["qnx_user"],self.config_data["qnx_passwd"])
-
-
-    
-    def teardown_class(self):
-        adb.del_iviimage() #删除qnx侧截图
-        adb.del_qnximage() #删除ivi侧截图
+        #截图在内存中解码,不再拉取到本地,传输后即删除共享目录下的截图
+        #设备地址为None时使用当前台架的设置adb_serial(见config/rigs.json)
+        self.capture = CaptureService(None,self.config_data["qnx_ip"],self.config_data["qnx_user"],
+                                      self.config_data["qnx_passwd"],self.config_data["qnx_screenshot_path"],
+                                      posixpath.dirname(self.config_data["adb_pull_source"]))
 
 
     @case_fail.execut_failed_cases
@@ -35,10 +34,7 @@ class TestUint_Panel():
         print(f"sig_msg={sig_msg}")
         #发送信号
         # 获取仪表截图
-        self.test_qnx.qnx_screenshot(self.config_data["qnx_screenshot_path"])
-        get_act_images = adb.adb_pull_image(self.config_data["devices"],
-                           self.config_data["adb_pull_source"],
-                           self.config_data["adb_pull_dest"])
+        get_act_images = self.capture.capture()
         # 获取预期图坐标
         position = (test_data["startx"],test_data["starty"],test_data["endx"],test_data["endy"])
         # 实际图与预期图进行对比
@@ -51,5 +47,5 @@ class TestUint_Panel():
         reset_signal = (test_data["msgId"], test_data["sigName"], 0)
         print(f"reset_signal={reset_signal}")
         allure.attach.file(test_data["预期结果"], name="预期结果", attachment_type=allure.attachment_type.BMP)
-        allure.attach.file(get_act_images, name="实际结果", attachment_type=allure.attachment_type.BMP)
+        allure.attach(cv2.imencode(".png", get_act_images)[1].tobytes(), name="实际结果", attachment_type=allure.attachment_type.PNG)
         assert test_result == None
\ No newline at end of file
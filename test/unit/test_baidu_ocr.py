@@ -0,0 +1,180 @@
+#! /usr/bin/env python
+
+
+
+"""
+BaiduOcr against a local stub server of baidu OCR: access token, background refresh, retries and batches, no baidu
+account needed
+
+how to use:
+    python -m pytest test/unit/test_baidu_ocr.py
+"""
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from common.OCR.baiduOcr import baiduOcr
+from common.OCR.baiduOcr.baiduOcr import BaiduOcr
+import threading
+import base64
+import pytest
+import numpy
+import json
+import time
+import cv2 as cv
+
+
+class Stub(ThreadingHTTPServer):
+    """
+    a new token("token-1", "token-2", ...) for every request of token, an OCR request gets the next scripted reply if
+    there is one, otherwise the width of posted image as words
+    """
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.tokens = 0
+        self.expires = 2592000
+        self.replies = []
+        self.used = []
+        self.block = threading.Event()
+        self.block.set()
+        self.blocking = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        with self.server.lock:
+            self.server.tokens += 1
+            token = f"token-{self.server.tokens}"
+        if not self.server.block.is_set():
+            self.server.blocking.set()
+            self.server.block.wait(10)
+        self.reply({"access_token": token, "expires_in": self.server.expires})
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+        with self.server.lock:
+            self.server.used.append(parse_qs(urlparse(self.path).query)["access_token"][0])
+            scripted = self.server.replies.pop(0) if self.server.replies else None
+        if scripted is not None:
+            return self.reply(scripted)
+        image = cv.imdecode(numpy.frombuffer(base64.b64decode(form["image"][0]), numpy.uint8), cv.IMREAD_COLOR)
+        self.reply({"words_result": [{"words": str(image.shape[1])}]})
+
+    def reply(self, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = Stub()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.block.set()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def accounts(tmp_path):
+    file = tmp_path / "baidu_ocr_accounts.json"
+    file.write_text(json.dumps({"stub": {"APIkey": "key", "secretKey": "secret", "accessToken": "", "expiresIn": 0}}))
+    return file
+
+
+@pytest.fixture
+def ocr(stub, accounts):
+    engine = BaiduOcr(searchList=[str(accounts.parent)], baseUrl=stub.url, timeout=5, retries=3)
+    yield engine
+    engine.close()
+
+
+def crop(width: int):
+    return numpy.full((20, width, 3), 255, numpy.uint8)
+
+
+def test_token_requested_once_and_saved(ocr, stub, accounts):
+    assert ocr.image_to_string(crop(10)) == "10"
+    assert ocr.image_to_string(crop(11)) == "11"
+    assert stub.tokens == 1
+    assert json.loads(accounts.read_text())["stub"]["accessToken"] == "token-1"
+
+
+def test_batch_keeps_order(ocr, stub):
+    widths = list(range(10, 50))
+    assert ocr.image_to_strings([crop(x) for x in widths]) == [str(x) for x in widths]
+    assert stub.tokens == 1
+    assert set(stub.used) == {"token-1"}
+
+
+@pytest.mark.parametrize("code", [110, 111])
+def test_rejected_token_requested_again(ocr, stub, code):
+    stub.replies.append({"error_code": code, "error_msg": "Access token invalid or no longer valid"})
+    assert ocr.image_to_string(crop(12)) == "12"
+    assert stub.tokens == 2
+    assert stub.used == ["token-1", "token-2"]
+
+
+def test_qps_limit_retried(ocr, stub):
+    stub.replies.append({"error_code": 18, "error_msg": "Open api qps request limit reached"})
+    assert ocr.image_to_string(crop(13)) == "13"
+    assert len(stub.used) == 2
+    assert stub.tokens == 1
+
+
+def test_qps_limit_gives_up(stub, accounts):
+    engine = BaiduOcr(searchList=[str(accounts.parent)], baseUrl=stub.url, retries=1)
+    stub.replies.append({"error_code": 18, "error_msg": "Open api qps request limit reached"})
+    try:
+        assert engine.image_to_string(crop(13)) is None
+    finally:
+        engine.close()
+
+
+def test_other_error_not_retried(ocr, stub):
+    stub.replies.append({"error_code": 216201, "error_msg": "image format error"})
+    assert ocr.image_to_string(crop(14)) is None
+    assert len(stub.used) == 1
+
+
+def test_background_refresh(stub, accounts, monkeypatch):
+    # token is always due for refreshing, the refresher requests a new one every 0.05s
+    monkeypatch.setattr(baiduOcr, "REFRESH_INTERVAL", 0.05)
+    engine = BaiduOcr(searchList=[str(accounts.parent)], baseUrl=stub.url, refreshBefore=stub.expires + 3600)
+    try:
+        assert engine.image_to_string(crop(15)) == "15"
+        deadline = time.time() + 5
+        while stub.tokens < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        assert stub.tokens >= 3
+        assert engine.image_to_string(crop(16)) == "16"
+        assert stub.used[-1] != "token-1"
+    finally:
+        engine.close()
+
+
+def test_recognition_not_blocked_by_refresh(stub, accounts, monkeypatch):
+    monkeypatch.setattr(baiduOcr, "REFRESH_INTERVAL", 0.05)
+    engine = BaiduOcr(searchList=[str(accounts.parent)], baseUrl=stub.url, refreshBefore=stub.expires + 3600)
+    try:
+        assert engine.image_to_string(crop(17)) == "17"
+        # the next request of token hangs until released, the current token is still valid
+        stub.block.clear()
+        assert stub.blocking.wait(5)
+        t1 = time.time()
+        assert engine.image_to_string(crop(18)) == "18"
+        assert time.time() - t1 < 2
+        assert stub.used[-1] == "token-1"
+    finally:
+        stub.block.set()
+        engine.close()
@@ -0,0 +1,45 @@
+#! /usr/bin/env python
+
+
+
+"""
+Excel_To_JSON against a small workbook written by openpyxl, no Excel application needed
+
+how to use:
+    python -m pytest test/unit/test_excel_to_json.py
+"""
+
+from common.excel.excel_to_json import Excel_To_JSON
+import pytest
+import json
+
+
+openpyxl = pytest.importorskip("openpyxl")
+
+HEADS = ["key", "summary", "step", "expect"]
+ROWS = [
+    ["TC_001", "demo", "1.wait=1", "Pic_a=90"],
+    ["TC_002", "demo", 2, None],
+    [None, None, None, None],
+    ["TC_003", "last", "1.BAT ON", "Pic_c=90"],
+]
+
+
+def test_all_rows_and_columns(tmp_path):
+    book = openpyxl.Workbook()
+    sht = book.active
+    sht.title = "_demo"
+    for row in [HEADS] + ROWS:
+        sht.append(row)
+    # only formatted, the sheet reports a larger dimension but the cells are empty
+    sht.cell(row=10, column=8).number_format = "0.00"
+    book.save(tmp_path / "cases.xlsx")
+
+    Excel_To_JSON(str(tmp_path / "cases.xlsx")).excel2json()
+
+    result = json.loads((tmp_path / "test_demo.json").read_text(encoding="utf-8"))
+    assert result == [
+        {"key": "TC_001", "summary": "demo", "step": "1.wait=1", "expect": "Pic_a=90"},
+        {"key": "TC_002", "summary": "demo", "step": 2.0, "expect": None},
+        {"key": "TC_003", "summary": "last", "step": "1.BAT ON", "expect": "Pic_c=90"},
+    ]
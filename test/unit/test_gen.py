@@ -0,0 +1,71 @@
+#! /usr/bin/env python
+
+
+
+"""
+generation of test scripts by common.tc.main.Gen, in current process and in a process pool started by spawn(like Windows)
+
+how to use:
+    python -m pytest test/unit/test_gen.py
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from common.tc.conf import Pattern
+from common.tc import main
+import multiprocessing
+import functools
+import pytest
+import json
+
+
+CASE = {"key": "TC_Relay_{}", "summary": "relay", "desc": "relay", "precondition": "BAT ON", "step": "1.relay 2 on",
+        "expect": "", "type": "HMI", "tag": "A02", "priority": "P1"}
+
+
+def relay(a, b, z):
+    # code of a registered type of step, module level so it could be sent to worker processes
+    return f'API.relay({int(a)}, "{b}")  # {z}'
+
+
+@pytest.fixture
+def registered():
+    patterns, codes, count = list(Pattern._patterns), dict(Pattern._codes), len(Pattern.registered)
+    Pattern.register("Relay", r"relay\s*(\d+)\s*(on|off)\s*(\(.*?\)|)", relay)
+    yield
+    Pattern._patterns[:], Pattern._codes = patterns, codes
+    del Pattern.registered[count:]
+
+
+@pytest.fixture
+def source(tmp_path):
+    cases = [dict(CASE, key=CASE["key"].format(i)) for i in range(6)]
+    (tmp_path / "test_relay.json").write_text(json.dumps(cases), encoding="utf-8")
+    return tmp_path
+
+
+def scripts(folder):
+    return "".join(x.read_text(encoding="utf-8") for x in sorted((folder / "test_relay").glob("test_relay_*.py")))
+
+
+def test_registered_step_serial(registered, source):
+    assert main.Gen(str(source)).run(count=2, workers=1) == 6
+    assert scripts(source).count('API.relay(2, "on")') == 6
+
+
+def test_registered_step_in_spawned_workers(registered, source, monkeypatch):
+    spawn = functools.partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context("spawn"))
+    monkeypatch.setattr(main, "ProcessPoolExecutor", spawn)
+    assert main.Gen(str(source)).run(count=2, workers=3) == 6
+    assert scripts(source).count('API.relay(2, "on")') == 6
+
+
+def test_lambda_generated_in_current_process(source, monkeypatch):
+    patterns, codes, count = list(Pattern._patterns), dict(Pattern._codes), len(Pattern.registered)
+    Pattern.register("Relay", r"relay\s*(\d+)\s*(on|off)\s*(\(.*?\)|)", lambda a, b, z: f'API.relay({int(a)}, "{b}")')
+    try:
+        monkeypatch.setattr(main, "ProcessPoolExecutor", None)  # never started
+        assert main.Gen(str(source)).run(count=2, workers=3) == 6
+        assert scripts(source).count('API.relay(2, "on")') == 6
+    finally:
+        Pattern._patterns[:], Pattern._codes = patterns, codes
+        del Pattern.registered[count:]
@@ -0,0 +1,59 @@
+#! /usr/bin/env python
+
+
+
+"""
+results of OCR cached by common.OCR.cache, images of different text must never share a result
+
+how to use:
+    python -m pytest test/unit/test_ocr_cache.py
+"""
+
+from common.OCR.cache import OcrCache
+import numpy
+import cv2 as cv
+
+
+def crop(text: str, noise: float = 0, seed: int = 0, shape: tuple = (50, 1200)):
+    # light text on a dark wide strip, like a line of the cluster display
+    image = numpy.full(shape + (3, ), 20, numpy.uint8)
+    cv.putText(image, text, (20, 36), cv.FONT_HERSHEY_SIMPLEX, 1, (230, 230, 230), 2)
+    if noise:
+        image = numpy.random.default_rng(seed).normal(0, noise, image.shape) + image
+        image = numpy.clip(image, 0, 255).astype(numpy.uint8)
+    return image
+
+
+def test_one_digit_changed():
+    # every cached image is a candidate by hash, pixels decide
+    cache = OcrCache(distance=256)
+    cache.put(cache.key(crop("Range 345 km"), "eng"), "Range345km")
+    assert cache.get(cache.key(crop("Range 346 km"), "eng")) is None
+    cache.put(cache.key(crop("Range 346 km"), "eng"), "Range346km")
+    assert cache.get(cache.key(crop("Range 345 km"), "eng")) == "Range345km"
+    assert cache.get(cache.key(crop("Range 346 km"), "eng")) == "Range346km"
+
+
+def test_noise_of_camera():
+    cache = OcrCache()
+    cache.put(cache.key(crop("Range 345 km"), "eng"), "Range345km")
+    assert all(cache.get(cache.key(crop("Range 345 km", 8, seed), "eng")) == "Range345km" for seed in range(20))
+    assert cache.get(cache.key(crop("Range 346 km", 8), "eng")) is None
+
+
+def test_shape_and_options():
+    cache = OcrCache()
+    cache.put(cache.key(crop("Range 345 km"), "eng", psm=6), "Range345km")
+    assert cache.get(cache.key(crop("Range 345 km", shape=(50, 1000)), "eng", psm=6)) is None
+    assert cache.get(cache.key(crop("Range 345 km"), "chi_sim", psm=6)) is None
+    assert cache.get(cache.key(crop("Range 345 km"), "eng", psm=7)) is None
+    assert cache.stats()["misses"] == 3
+
+
+def test_lru():
+    cache = OcrCache(maxsize=2)
+    for text in ("1 km", "2 km", "3 km"):
+        cache.put(cache.key(crop(text), "eng"), text)
+    assert cache.get(cache.key(crop("1 km"), "eng")) is None
+    assert cache.get(cache.key(crop("3 km"), "eng")) == "3 km"
+    assert cache.stats()["size"] == 2
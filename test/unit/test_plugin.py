@@ -0,0 +1,126 @@
+#! /usr/bin/env python
+
+
+
+"""
+collection of source data files by common.tc.plugin, and execution of test cases against a fake API which records
+the calls made
+
+how to use:
+    python -m pytest test/unit/test_plugin.py
+"""
+
+from common.tc.conf import Pattern
+import pytest
+import types
+import json
+import sys
+
+
+pytest_plugins = "pytester"
+
+CASES = [
+    {"key": "TC_Demo_001", "summary": "demo", "desc": "demo", "precondition": "BAT ON", "step": "1.wait=1", "expect": "", "type": "HMI", "tag": "A02", "priority": "P1"},
+    {"key": "TC_Demo_002", "summary": "demo", "desc": "demo", "precondition": "BAT ON", "step": "1.wait=2", "expect": "", "type": "HMI", "tag": "A02", "priority": "P1"},
+]
+
+
+def _source(pytester, generated: bool):
+    pytester.makefile(".json", test_demo=json.dumps(CASES))
+    if generated:
+        folder = pytester.mkdir("test_demo")
+        folder.joinpath("test_demo_0_1.py").write_text(
+            "class TestDemo:\n"
+            "    def test_TC_Demo_001(self):\n        pass\n\n"
+            "    def test_TC_Demo_002(self):\n        pass\n"
+        )
+
+
+def test_json_collected(pytester):
+    _source(pytester, generated=False)
+    result = pytester.runpytest("-p", "common.tc.plugin", "--collect-only", "-q")
+    result.stdout.fnmatch_lines(["test_demo.json::test_TC_Demo_001", "test_demo.json::test_TC_Demo_002"])
+    result.stdout.fnmatch_lines(["2 tests collected*"])
+
+
+def test_json_skipped_with_generated_scripts(pytester):
+    _source(pytester, generated=True)
+    result = pytester.runpytest("-p", "common.tc.plugin", "--collect-only", "-q")
+    result.stdout.no_fnmatch_line("test_demo.json::*")
+    result.stdout.fnmatch_lines(["2 tests collected*"])
+
+
+def test_json_collected_explicitly(pytester):
+    _source(pytester, generated=True)
+    result = pytester.runpytest("-p", "common.tc.plugin", "--collect-only", "-q", "test_demo.json")
+    result.stdout.fnmatch_lines(["test_demo.json::test_TC_Demo_001", "test_demo.json::test_TC_Demo_002"])
+    result.stdout.fnmatch_lines(["2 tests collected*"])
+
+
+class FakeAPI:
+    """
+    records every call as (name, args, kwargs), results of compare/get are those expected by the test case
+    """
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            if name == "image_compare":
+                return 1.0, None, None
+            if name == "ocr_compare":
+                return kwargs["ocrExpect"], None
+            if name == "get":
+                return 2
+        return call
+
+
+@pytest.fixture
+def api(monkeypatch):
+    fake = FakeAPI()
+    module = types.ModuleType("api")
+    module.API = fake
+    monkeypatch.setitem(sys.modules, "api", module)
+    return fake
+
+
+@pytest.fixture
+def relay():
+    patterns, codes, count = list(Pattern._patterns), dict(Pattern._codes), len(Pattern.registered)
+    Pattern.register("Relay", r"relay\s*(\d+)\s*(on|off)\s*(\(.*?\)|)", lambda a, b, z: f'API.relay({int(a)}, "{b}")  # {z}')
+    yield
+    Pattern._patterns[:], Pattern._codes = patterns, codes
+    del Pattern.registered[count:]
+
+
+def test_json_executed(pytester, api, relay):
+    case = {
+        "key": "TC_Demo_003", "summary": "demo", "desc": "demo", "precondition": "1.BAT ON\n2.KL15 ON",
+        "step": "1.Send 0x371:EngClntTempWarn=1\n2.wait=1\n3.relay 2 off\n4.just a comment",
+        "expect": "1.Pic_warning=90\n2.OCR_warning_text=hot\n3.signal_0x371:EngClntTempWarn=2",
+        "type": "HMI", "tag": "A02", "priority": "P1",
+    }
+    pytester.makefile(".json", test_demo=json.dumps([case]))
+    result = pytester.runpytest("-p", "common.tc.plugin", "-q")
+    result.assert_outcomes(passed=1)
+    assert api.calls == [
+        ("reset_measurement", (), {}),
+        ("battery", ("ON", ), {}),
+        ("kl15", ("on", ), {}),
+        ("send", ("0x371", "EngClntTempWarn", "1"), {}),
+        ("wait", (1, ), {}),
+        ("relay", (2, "off"), {}),
+        ("image_compare", ("warning", ), {"threshold": 90.0, "gray": True}),
+        ("ocr_compare", ("warning_text", ), {"ocrExpect": "hot"}),
+        ("get", ("0x371", "EngClntTempWarn"), {}),
+        ("finish_test", (), {}),
+    ]
+
+
+def test_json_failed_assert(pytester, api):
+    case = dict(CASES[0], expect="1.signal_0x371:EngClntTempWarn=3")
+    pytester.makefile(".json", test_demo=json.dumps([case]))
+    result = pytester.runpytest("-p", "common.tc.plugin", "-q")
+    result.assert_outcomes(failed=1)
+    assert api.calls[-1] == ("finish_test", (), {})
@@ -0,0 +1,94 @@
+#! /usr/bin/env python
+
+
+
+"""
+ShellSession and telnet_login against a local "sh" and a fake telnet(a shell script asking for user and password, then
+echoing every command line like a terminal), no device is needed
+
+how to use:
+    python -m pytest test/unit/test_shell.py
+"""
+
+from common.adb.shell import ShellSession, telnet_login
+import shutil
+import pytest
+import os
+
+
+pytestmark = pytest.mark.skipif(shutil.which("sh") is None, reason="sh is not available")
+
+FAKE_TELNET = "printf 'login: '; read user; printf 'Password: '; read passwd; echo \"welcome $user\"; exec sh -v 2>&1\n"
+
+
+@pytest.fixture
+def folder(tmp_path):
+    # names of files are the same as commands listed in this folder
+    path = tmp_path / "files"
+    path.mkdir()
+    for name in ("ls", "tools", "readme"):
+        (path / name).write_text(name)
+    return path
+
+
+@pytest.fixture
+def shell():
+    session = ShellSession(["sh"], name="local sh")
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def telnet(tmp_path):
+    fake = tmp_path / "telnet.sh"
+    fake.write_text(FAKE_TELNET)
+    session = telnet_login(ShellSession(["sh"], name="local sh"), "127.0.0.1", "root", "passwd", timeout=5, telnet=f"sh {fake}")
+    yield session
+    session.close()
+
+
+def test_run(shell):
+    assert shell.run("echo hello") == ("hello", 0)
+    assert shell.run("echo hello; false") == ("hello", 1)
+    assert shell.run("printf 'a\\nb\\n'") == ("a\nb", 0)
+
+
+def test_run_check(shell):
+    with pytest.raises(RuntimeError):
+        shell.run("exit_code() { return 3; }; exit_code", check=True)
+    assert shell.alive
+
+
+def test_run_keeps_output_like_command(shell, folder):
+    output, code = shell.run(f"cd {folder} && ls")
+    assert code == 0
+    assert shell.run("ls") == ("ls\nreadme\ntools", 0)
+
+
+def test_expect_timeout(shell):
+    shell.send("echo waiting\n")
+    with pytest.raises(TimeoutError):
+        shell.expect("never printed", timeout=0.2)
+
+
+def test_read_file(shell, tmp_path):
+    content = os.urandom(1 << 16) + b"\r\n"
+    (tmp_path / "data.bin").write_bytes(content)
+    assert shell.read_file(str(tmp_path / "data.bin"), remove=True) == content
+    # "rm" runs after content is sent, the next command waits for it
+    shell.run("true")
+    assert not (tmp_path / "data.bin").exists()
+    assert shell.read_file(str(tmp_path / "data.bin")) is None
+
+
+def test_telnet_login(telnet):
+    assert telnet.echo
+    assert "telnet 127.0.0.1" in telnet.name
+    assert telnet.run("echo $((1 + 2))") == ("3", 0)
+
+
+def test_telnet_echo_removed_once(telnet, folder):
+    telnet.run(f"cd {folder}", check=True)
+    assert telnet.run("ls") == ("ls\nreadme\ntools", 0)
+    assert telnet.run("echo ls") == ("ls", 0)
+    assert telnet.run("echo tools; false") == ("tools", 1)
@@ -0,0 +1,67 @@
+#! /usr/bin/env python
+
+
+
+"""
+measure import time of modules with "python -X importtime" in a fresh interpreter, and check that heavy dependencies
+(opencv, tensorflow, win32com, ...) are not imported by modules which do not need them
+
+how to use:
+    python tool/import_time.py                       # default modules
+    python tool/import_time.py common.tc api --top 20
+"""
+
+import subprocess
+import argparse
+import sys
+import os
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("cv2", "tensorflow", "skimage", "win32com", "matplotlib", "requests", "serial")
+DEFAULT = ("common", "common.tc", "common.rig", "common.OCR", "common.image", "api")
+
+
+def import_time(module: str):
+    """
+    @param:
+        module: module to import
+    @return:
+        tuple: (total import time(us), {top level package: cumulative time(us)}, [(cumulative time(us), module)])
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise ImportError(f"import {module} failed:\n{proc.stderr.splitlines()[-1] if proc.stderr else ''}")
+    rows = []
+    packages = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        # nested imports are indented by 2 spaces for each level after the separator
+        name = name[1:].rstrip()
+        rows.append((int(cumulative), name))
+        packages.setdefault(name.strip().split(".")[0], int(cumulative))
+    total = sum(t for t, name in rows if not name.startswith(" "))
+    return total, packages, sorted(((t, x.strip()) for t, x in rows), reverse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="measure import time of modules")
+    parser.add_argument("modules", nargs="*", default=DEFAULT, help="modules to import")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports listed for each module")
+    args = parser.parse_args()
+    for module in args.modules:
+        try:
+            total, packages, rows = import_time(module)
+        except ImportError as e:
+            print(f"{module}: {e}\n")
+            continue
+        heavy = [x for x in HEAVY if x in packages]
+        print(f"{module}: {total / 1000:.1f} ms, heavy dependencies imported: {heavy if heavy else 'none'}")
+        for t, name in rows[:args.top]:
+            print(f"    {t / 1000:>9.1f} ms  {name}")
+        print()